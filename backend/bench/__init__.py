@@ -0,0 +1 @@
+# offline performance benchmarks (python -m backend.bench.<name>)
@@ -0,0 +1,97 @@
+"""
+bench/backends.py
+Latency, throughput and accuracy of the PyTorch model vs. its exported CPU
+backends (ONNX FP32/INT8, OpenVINO FP32/INT8) on the validation split.
+
+Backends without an exported file next to best.pt are skipped; create them
+with backend/model/export.py. The report recommends the fastest backend
+whose mAP50-95 drop vs. PyTorch stays within --max-map-drop.
+
+Example usage:
+    python -m backend.bench.backends --weights runs/train/microplastic_experiment/weights/best.pt \\
+        --backends pytorch,onnx,onnx-int8 --out results/backends.json
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from backend.inference.model_registry import BACKENDS, get_model, resolve_weights
+
+MODEL_DIR = Path(__file__).resolve().parents[1] / "model"
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000.0, 3)
+
+
+def bench_backend(weights, backend, images, data, imgsz, batch, repeats):
+    model = get_model(weights, backend)
+    model.predict(source=images[0], imgsz=imgsz, verbose=False)  # warmup
+
+    latencies = []
+    for _ in range(repeats):
+        for img in images:
+            t0 = time.perf_counter()
+            model.predict(source=img, imgsz=imgsz, verbose=False)
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    for start in range(0, len(images), batch):
+        model.predict(source=images[start:start + batch], imgsz=imgsz, verbose=False)
+    batch_s = time.perf_counter() - t0
+
+    metrics = model.val(data=str(data), imgsz=imgsz, batch=batch, split="val", plots=False, verbose=False)
+    return {
+        "backend": backend,
+        "path": str(resolve_weights(weights, backend)),
+        "latency_p50_ms": percentile_ms(latencies, 50),
+        "latency_p95_ms": percentile_ms(latencies, 95),
+        "throughput_img_s": round(len(images) / batch_s, 2) if batch_s else None,
+        "map50": round(float(metrics.box.map50), 4),
+        "map50_95": round(float(metrics.box.map), 4),
+    }
+
+
+def recommend(rows, max_map_drop):
+    ref = next((r for r in rows if r["backend"] == "pytorch"), None)
+    for r in rows:
+        r["map_drop"] = round(ref["map50_95"] - r["map50_95"], 4) if ref else None
+    ok = [r for r in rows if r["map_drop"] is None or r["map_drop"] <= max_map_drop]
+    return min(ok, key=lambda r: r["latency_p50_ms"])["backend"] if ok else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", type=str, default="runs/train/microplastic_experiment/weights/best.pt")
+    parser.add_argument("--backends", type=str, default=",".join(BACKENDS))
+    parser.add_argument("--data", type=str, default=str(MODEL_DIR / "dataset.yaml"))
+    parser.add_argument("--images", type=str, default=str(MODEL_DIR / "data/valid/images"))
+    parser.add_argument("--limit", type=int, default=50, help="images used for latency/throughput")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--max-map-drop", type=float, default=0.01, help="allowed mAP50-95 drop vs pytorch")
+    parser.add_argument("--out", type=str, default=None)
+    args = parser.parse_args()
+
+    images = [cv2.imread(str(p)) for p in sorted(Path(args.images).glob("*.jpg"))[:args.limit]]
+    rows = []
+    for backend in args.backends.split(","):
+        if not resolve_weights(args.weights, backend).exists():
+            print(f"[WARN] skipping {backend}: {resolve_weights(args.weights, backend)} not found")
+            continue
+        rows.append(bench_backend(args.weights, backend, images, args.data, args.imgsz, args.batch, args.repeats))
+
+    report = {"config": vars(args), "results": rows, "recommended": recommend(rows, args.max_map_drop)}
+    print(f"{'backend':<15}{'p50 ms':>9}{'p95 ms':>9}{'img/s':>9}{'mAP50':>8}{'mAP':>8}{'drop':>8}")
+    for r in rows:
+        print(f"{r['backend']:<15}{r['latency_p50_ms']:>9}{r['latency_p95_ms']:>9}{r['throughput_img_s']:>9}"
+              f"{r['map50']:>8}{r['map50_95']:>8}{r['map_drop'] if r['map_drop'] is not None else '-':>8}")
+    print(f"recommended: {report['recommended']}")
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
@@ -0,0 +1,123 @@
+"""
+bench/contours.py
+Per-frame latency of the live classical pipeline vs. number of particles.
+
+Compares the original per-contour loop (findContours + boundingRect /
+rectangle / putText per contour) with ContourDetector on synthetic frames.
+--check instead verifies that both give the same object count and boxes on
+every image in --images and on the synthetic frames; exits 1 on a mismatch.
+
+Example usage:
+    python -m backend.bench.contours --width 640 --height 480 --frames 50
+    python -m backend.bench.contours --check --images backend/model/data/valid/images
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from backend.inference.contours import ContourDetector, DILATE_KERNEL
+from backend.server.fake_mjpeg import make_frame
+
+MM_PER_PIXEL = 0.05
+BASE_DIR = Path(__file__).resolve().parents[2]
+
+
+def legacy_contours(frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    canny = cv2.Canny(cv2.GaussianBlur(gray, (11, 11), 0), 30, 150)
+    dilated = cv2.dilate(canny, DILATE_KERNEL, iterations=2)
+    cnt, _ = cv2.findContours(dilated.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    return cnt
+
+
+def legacy_detect_and_draw(frame):
+    cnt = legacy_contours(frame)
+    for c in cnt:
+        x, y, w, h = cv2.boundingRect(c)
+        if w > 5 and h > 5:
+            size_mm = round((w + h) / 2 * MM_PER_PIXEL, 2)
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            cv2.putText(frame, f"{size_mm} mm", (x, y - 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    return len(cnt)
+
+
+def check(frames):
+    """
+    (checked, mismatches): frames where ContourDetector's object count or
+    sorted boxes differ from the findContours(RETR_EXTERNAL) loop.
+    """
+    detector = ContourDetector(mm_per_pixel=MM_PER_PIXEL)
+    mismatches = []
+    for name, frame in frames:
+        cnt = legacy_contours(frame)
+        rects = [cv2.boundingRect(c) for c in cnt]
+        legacy_boxes = sorted(r for r in rects if r[2] > 5 and r[3] > 5)
+        result = detector.detect(frame)
+        boxes = sorted(tuple(b) for b in result["boxes"].tolist())
+        if result["objects"] != len(cnt) or boxes != legacy_boxes:
+            mismatches.append((name, len(cnt), result["objects"]))
+    return len(frames), mismatches
+
+
+def time_per_frame(fn, frames):
+    times = []
+    for f in frames:
+        f = f.copy()
+        t0 = time.perf_counter()
+        fn(f)
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times)) * 1000.0
+
+
+def run(width, height, n_frames, particle_counts, labels):
+    detector = ContourDetector(mm_per_pixel=MM_PER_PIXEL)
+
+    def vectorized(frame):
+        result = detector.detect(frame)
+        detector.draw(frame, result, labels=labels)
+        return result["objects"]
+
+    rows = []
+    for particles in particle_counts:
+        frames = [make_frame(i, width, height, particles) for i in range(n_frames)]
+        objects = vectorized(frames[0].copy())
+        legacy_ms = time_per_frame(legacy_detect_and_draw, frames)
+        new_ms = time_per_frame(vectorized, frames)
+        rows.append({"particles": particles, "objects": objects,
+                     "legacy_ms": round(legacy_ms, 3), "vectorized_ms": round(new_ms, 3),
+                     "speedup": round(legacy_ms / new_ms, 2) if new_ms else None})
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--particles", type=str, default="10,50,100,250,500,1000")
+    parser.add_argument("--no-labels", action="store_true", help="skip per-box putText in the new path")
+    parser.add_argument("--check", action="store_true", help="verify counts and boxes against the legacy loop")
+    parser.add_argument("--images", type=str, default=str(BASE_DIR / "backend/model/data/valid/images"))
+    args = parser.parse_args()
+
+    if args.check:
+        frames = [(p.name, cv2.imread(str(p))) for p in sorted(Path(args.images).glob("*.jpg"))]
+        frames += [(f"synthetic_{p}_{i}", make_frame(i, args.width, args.height, int(p)))
+                   for p in args.particles.split(",") for i in range(args.frames)]
+        checked, mismatches = check([(n, f) for n, f in frames if f is not None])
+        for name, legacy, new in mismatches:
+            print(f"MISMATCH {name}: legacy {legacy} objects, new {new}")
+        print(f"{checked - len(mismatches)}/{checked} frames match")
+        sys.exit(1 if mismatches else 0)
+
+    counts = [int(p) for p in args.particles.split(",")]
+    print(f"{'particles':>9} {'objects':>8} {'legacy ms':>10} {'vector ms':>10} {'speedup':>8}")
+    for row in run(args.width, args.height, args.frames, counts, not args.no_labels):
+        print(f"{row['particles']:>9} {row['objects']:>8} {row['legacy_ms']:>10} "
+              f"{row['vectorized_ms']:>10} {row['speedup']:>8}")
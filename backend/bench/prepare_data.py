@@ -0,0 +1,135 @@
+"""
+bench/prepare_data.py
+CSV -> YOLO label conversion on a large synthetic Roboflow-style export.
+
+Writes a synthetic dataset (train/valid splits, ~1% degenerate boxes) and
+times:
+    legacy    the original iterrows + append-per-row converter, on the first
+              --legacy-rows rows (extrapolated to the full size)
+    serial    prepare_dataset with one process
+    parallel  prepare_dataset with one process per split
+    warm      a rerun on unchanged CSVs (manifest hit, nothing written)
+and checks that a forced rerun produces byte-identical label files.
+
+Example usage:
+    python -m backend.bench.prepare_data --rows 1000000 --images 20000
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from backend.model.utils import prepare_dataset
+
+SPLITS = {"train": 0.8, "valid": 0.2}
+
+
+def synthesize(root, rows, images, bad_rate=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    first_image = 0
+    for split, share in SPLITS.items():
+        n, n_images = int(rows * share), max(1, int(images * share))
+        image = rng.integers(first_image, first_image + n_images, n)
+        first_image += n_images
+        width = np.where(image % 2, 1280, 640)
+        height = np.where(image % 2, 960, 480)
+        bw, bh = rng.uniform(3, 40, n), rng.uniform(3, 40, n)
+        # boxes near the right/bottom edge run past the image and get clipped
+        xmin, ymin = rng.uniform(0, 1, n) * width, rng.uniform(0, 1, n) * height
+        df = pd.DataFrame({
+            "filename": [f"{i}_jpg.rf.{i:08x}.jpg" for i in image.tolist()],
+            "width": width, "height": height, "class": "Microplastic",
+            "xmin": xmin.round(), "ymin": ymin.round(),
+            "xmax": (xmin + bw).round(), "ymax": (ymin + bh).round(),
+        })
+        bad = rng.random(n) < bad_rate
+        df.loc[bad, "xmax"] = df.loc[bad, "xmin"]          # zero-width boxes
+        out = Path(root) / split
+        out.mkdir(parents=True, exist_ok=True)
+        df.to_csv(out / "_annotations.csv", index=False)
+
+
+def legacy_convert(csv_file, output_dir):
+    # the original converter, kept for comparison
+    df = pd.read_csv(csv_file)
+    labels_dir = os.path.join(output_dir, "labels")
+    os.makedirs(labels_dir, exist_ok=True)
+    for _, row in df.iterrows():
+        width, height = row['width'], row['height']
+        xmin, ymin, xmax, ymax = row['xmin'], row['ymin'], row['xmax'], row['ymax']
+        x_center = (xmin + xmax) / 2 / width
+        y_center = (ymin + ymax) / 2 / height
+        w = (xmax - xmin) / width
+        h = (ymax - ymin) / height
+        label_file = os.path.join(labels_dir, row['filename'].rsplit(".", 1)[0] + ".txt")
+        with open(label_file, "a") as f:
+            f.write(f"0 {x_center} {y_center} {w} {h}\n")
+
+
+def labels_digest(root):
+    h = hashlib.sha256()
+    for p in sorted(Path(root).glob("*/labels/*.txt")):
+        h.update(p.name.encode())
+        h.update(p.read_bytes())
+    return h.hexdigest()
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return time.perf_counter() - t0, out
+
+
+def run(rows, images, legacy_rows, workdir=None):
+    root = Path(tempfile.mkdtemp(prefix="prepare_bench_", dir=workdir))
+    try:
+        synthesize(root, rows, images)
+        results = {"rows": rows, "images": images}
+
+        sample = root / "legacy"
+        sample.mkdir()
+        pd.read_csv(root / "train/_annotations.csv", nrows=legacy_rows).to_csv(sample / "_annotations.csv", index=False)
+        legacy_s, _ = timed(legacy_convert, sample / "_annotations.csv", sample)
+        shutil.rmtree(sample)
+        results["legacy_rows_per_s"] = round(legacy_rows / legacy_s)
+        results["legacy_est_s"] = round(rows / results["legacy_rows_per_s"], 1)
+
+        results["serial_s"], stats = timed(prepare_dataset, root, workers=1, force=True)
+        first = labels_digest(root)
+        results["parallel_s"], _ = timed(prepare_dataset, root, force=True)
+        results["warm_s"], warm = timed(prepare_dataset, root)
+        results["identical_rerun"] = labels_digest(root) == first
+        results["warm_skipped"] = all(r["skipped"] for r in warm)
+        results["files"] = sum(r["files"] for r in stats)
+        results["dropped"] = sum(r["dropped"] for r in stats)
+        results["rows_per_s"] = round(rows / results["parallel_s"])
+        results["speedup"] = round(results["legacy_est_s"] / results["parallel_s"], 1)
+        for k in ("serial_s", "parallel_s", "warm_s"):
+            results[k] = round(results[k], 3)
+        return results
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--images", type=int, default=20_000)
+    parser.add_argument("--legacy-rows", type=int, default=20_000, help="rows timed with the legacy converter")
+    parser.add_argument("--workdir", type=str, default=None, help="where the synthetic dataset is written")
+    args = parser.parse_args()
+
+    r = run(args.rows, args.images, args.legacy_rows, args.workdir)
+    print(f"rows {r['rows']}, images {r['images']}, label files {r['files']}, dropped boxes {r['dropped']}")
+    print(f"legacy    {r['legacy_rows_per_s']:>10} rows/s  (~{r['legacy_est_s']} s for all rows)")
+    print(f"serial    {r['serial_s']:>10} s")
+    print(f"parallel  {r['parallel_s']:>10} s  ({r['rows_per_s']} rows/s, {r['speedup']}x legacy)")
+    print(f"warm      {r['warm_s']:>10} s  (unchanged splits skipped: {r['warm_skipped']})")
+    print(f"forced rerun identical: {r['identical_rerun']}")
@@ -0,0 +1,154 @@
+"""
+bench/serial_loopback.py
+Serial JPEG ingestion throughput over a pseudo-terminal loopback.
+
+A writer thread plays the ESP32: it sends synthetic JPEGs framed as
+<IMG>...</IMG> into the master side of a pty, in randomly sized chunks so
+frames straddle reads. SerialIngester reads the slave side through pyserial
+exactly as it would a real /dev/ttyUSB0. The report gives frames/s, MB/s and
+checks every frame arrived intact and in order.
+
+--parse-only also times the framing on an in-memory byte stream: the original
+`buf += data` / find-from-the-start loop vs. FrameParser.
+
+Linux/macOS only (needs pty).
+
+Example usage:
+    python -m backend.bench.serial_loopback --frames 500 --width 640 --height 480
+    python -m backend.bench.serial_loopback --parse-only --frames 500 --frame-kb 60 --max-chunk 4096
+"""
+
+import argparse
+import os
+import pty
+import random
+import threading
+import time
+import tty
+
+from backend.server.fake_mjpeg import encode_jpeg, make_frame
+from backend.server.serial_ingest import END_MARKER, START_MARKER, FrameParser, SerialIngester
+
+
+def make_payloads(n, width, height, distinct=16, frame_kb=None):
+    """
+    n frame payloads: synthetic JPEGs, or random bytes of frame_kb KB (the
+    synthetic frames compress far better than real camera images).
+    """
+    if frame_kb:
+        rng = random.Random(1)
+        jpegs = [rng.randbytes(int(frame_kb * 1024)) for _ in range(distinct)]
+    else:
+        jpegs = [encode_jpeg(make_frame(i, width, height)) for i in range(distinct)]
+    # append the frame index so integrity and ordering can be checked
+    return [jpegs[i % distinct] + i.to_bytes(4, "big") for i in range(n)]
+
+
+def framed_stream(payloads):
+    return b"".join(START_MARKER + p + END_MARKER for p in payloads)
+
+
+def chunked(data, min_chunk, max_chunk, seed=0):
+    rng = random.Random(seed)
+    pos = 0
+    while pos < len(data):
+        n = rng.randint(min_chunk, max_chunk)
+        yield data[pos:pos + n]
+        pos += n
+
+
+def legacy_parse(chunks):
+    # the original esp32_handler.read_images_from_serial loop, minus the file writes
+    buf = b""
+    frames = 0
+    for data in chunks:
+        buf += data
+        while True:
+            start = buf.find(START_MARKER)
+            end = buf.find(END_MARKER)
+            if start != -1 and end != -1 and end > start:
+                frames += 1
+                buf = buf[end + len(END_MARKER):]
+            else:
+                break
+    return frames
+
+
+def parser_parse(chunks):
+    parser = FrameParser()
+    frames = 0
+    for data in chunks:
+        frames += len(parser.feed(data))
+    return frames
+
+
+def bench_parse(payloads, min_chunk, max_chunk):
+    chunks = list(chunked(framed_stream(payloads), min_chunk, max_chunk))
+    rows = []
+    for name, fn in (("legacy", legacy_parse), ("FrameParser", parser_parse)):
+        t0 = time.perf_counter()
+        frames = fn(chunks)
+        elapsed = time.perf_counter() - t0
+        rows.append((name, frames, elapsed))
+        print(f"{name:<12} {frames} frames in {elapsed * 1000:.1f} ms  ({frames / elapsed:.0f} frames/s)")
+    return rows
+
+
+def bench_loopback(payloads, min_chunk, max_chunk, timeout):
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    port = os.ttyname(slave)
+
+    received = []
+    done = threading.Event()
+
+    def on_frame(jpeg, seq):
+        received.append(jpeg)
+        if len(received) == len(payloads):
+            done.set()
+
+    ingester = SerialIngester(port, 921600, on_frame=on_frame, queue_size=len(payloads))
+    ingester.start()
+    time.sleep(0.2)  # let the reader open the port
+
+    data = framed_stream(payloads)
+
+    def writer():
+        for chunk in chunked(data, min_chunk, max_chunk):
+            view = memoryview(chunk)
+            while len(view):
+                view = view[os.write(master, view):]
+
+    t0 = time.perf_counter()
+    threading.Thread(target=writer, daemon=True).start()
+    done.wait(timeout)
+    elapsed = time.perf_counter() - t0
+    stats = ingester.stats()
+    ingester.stop()
+    os.close(master)
+    os.close(slave)
+
+    intact = sum(a == b for a, b in zip(received, payloads))
+    print(f"port {port}: {len(received)}/{len(payloads)} frames, {intact} intact, "
+          f"{len(received) / elapsed:.1f} frames/s, {len(data) / elapsed / 1e6:.2f} MB/s")
+    print(f"ingester stats: {stats}")
+    return {"frames": len(received), "intact": intact, "seconds": elapsed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--width", type=int, default=320)
+    parser.add_argument("--height", type=int, default=240)
+    parser.add_argument("--frame-kb", type=float, default=None, help="random payloads of this size instead of JPEGs")
+    parser.add_argument("--min-chunk", type=int, default=64)
+    parser.add_argument("--max-chunk", type=int, default=8192)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--parse-only", action="store_true", help="only time in-memory framing")
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.frames, args.width, args.height, frame_kb=args.frame_kb)
+    if args.parse_only:
+        bench_parse(payloads, args.min_chunk, args.max_chunk)
+    else:
+        bench_loopback(payloads, args.min_chunk, args.max_chunk, args.timeout)
@@ -0,0 +1,436 @@
+"""
+bench/suite.py
+Reusable benchmark suite for the inference and live pipelines.
+
+run      times each stage offline on data/valid/images (+ input.jpg) and
+         writes one JSON report:
+           model_load   cold YOLO() load of the weights
+           predict      model.predict per batch size and imgsz, split into
+                        ultralytics' preprocess / inference / postprocess
+           annotate     draw_boxes_on_image at each image size
+           encode       cv2.imencode of the annotated image
+           contours     ContourDetector detect + draw (classical path)
+           live         one live frame: motion gate, contours, tracker, encode
+         Each case reports p50/p95/p99/mean latency, throughput and the
+         process's peak RSS after the case.
+compare  flags cases whose p50 (or p95) got slower than a stored baseline
+         by more than --tolerance; exits 1 on regressions so CI can gate on it.
+load     drives /upload and /detect concurrently through FastAPI's
+         TestClient (uploads and results go to a temp dir).
+
+Example usage:
+    python -m backend.bench.suite run --out results/bench.json --batch-sizes 1,4,8 --imgsz 320,640
+    python -m backend.bench.suite run --stages contours,live --baseline results/bench_base.json
+    python -m backend.bench.suite compare results/bench.json results/bench_base.json --tolerance 0.15
+    python -m backend.bench.suite load --concurrency 8 --requests 200
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+MODEL_DIR = BASE_DIR / "backend/model"
+DEFAULT_WEIGHTS = BASE_DIR / "runs/train/microplastic_experiment/weights/best.pt"
+STAGES = ("model_load", "predict", "annotate", "encode", "contours", "live")
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB on Linux
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def summarize(name, params, samples_s, items, wall_s, unit="img"):
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    return {
+        "name": name,
+        "params": params,
+        "n": len(ms),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "throughput": round(items / wall_s, 2) if wall_s else None,
+        "unit": f"{unit}/s",
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def measure(fn, items, warmup=1):
+    """
+    Call fn(item) for every item after `warmup` untimed calls.
+    Returns (per-call seconds, total wall seconds).
+    """
+    for item in items[:warmup]:
+        fn(item)
+    samples = []
+    t_start = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - t0)
+    return samples, time.perf_counter() - t_start
+
+
+def case_key(row):
+    return row["name"] + "".join(f" {k}={v}" for k, v in sorted(row["params"].items()))
+
+
+def load_images(images_dir, limit, extra=()):
+    paths = sorted(Path(images_dir).glob("*.jpg"))[:limit] + [Path(p) for p in extra if Path(p).exists()]
+    images = [cv2.imread(str(p)) for p in paths]
+    return [img for img in images if img is not None]
+
+
+def resize_width(img, width):
+    h, w = img.shape[:2]
+    return cv2.resize(img, (width, round(h * width / w)), interpolation=cv2.INTER_LINEAR)
+
+
+# ----------------------------------------------------------------------
+# stages
+# ----------------------------------------------------------------------
+def bench_model_load(weights, repeats):
+    from ultralytics import YOLO
+    samples, wall = measure(lambda _: YOLO(str(weights)), list(range(repeats)), warmup=0)
+    return [summarize("model_load", {}, samples, repeats, wall, unit="load")]
+
+
+def bench_predict(weights, images, batch_sizes, imgsizes, conf):
+    from backend.inference.model_registry import get_model
+    model = get_model(weights)
+    rows = []
+    for imgsz in imgsizes:
+        for bs in batch_sizes:
+            batches = [images[i:i + bs] for i in range(0, len(images), bs)]
+            speeds = {"preprocess": [], "inference": [], "postprocess": []}
+
+            def predict(batch):
+                results = model.predict(source=batch, imgsz=imgsz, conf=conf, verbose=False)
+                for k in speeds:
+                    # ultralytics reports per-image ms for the batch
+                    speeds[k].append(results[0].speed[k] / 1000.0)
+
+            samples, wall = measure(predict, batches)
+            params = {"batch": bs, "imgsz": imgsz}
+            rows.append(summarize("predict", params, samples, len(images), wall))
+            for k, values in speeds.items():
+                values = values[1:]  # drop the warmup call
+                if not values:
+                    continue
+                rows.append(summarize(k, params, values, len(values), sum(values)))
+    return rows
+
+
+def detections_for(weights, images, conf):
+    from backend.inference.model_registry import get_model
+    from backend.inference.utils import results_to_detections
+    model = get_model(weights)
+    return [results_to_detections(model.predict(source=img, conf=conf, verbose=False)[0]) for img in images], model.names
+
+
+def bench_annotate_encode(images, detections, names, sizes, stages):
+    from backend.inference.utils import draw_boxes_on_image
+    rows = []
+    for width in sizes:
+        scaled = []
+        for img, dets in zip(images, detections):
+            s = width / img.shape[1]
+            dets = [{**d, "xyxy": [v * s for v in d["xyxy"]]} for d in dets]
+            scaled.append((resize_width(img, width), dets))
+        annotated = [draw_boxes_on_image(img, dets, class_names=names) for img, dets in scaled]
+        if "annotate" in stages:
+            samples, wall = measure(lambda item: draw_boxes_on_image(item[0], item[1], class_names=names), scaled)
+            rows.append(summarize("annotate", {"width": width}, samples, len(scaled), wall))
+        if "encode" in stages:
+            samples, wall = measure(lambda img: cv2.imencode(".jpg", img), annotated)
+            rows.append(summarize("encode", {"width": width}, samples, len(annotated), wall))
+    return rows
+
+
+def bench_contours(images, sizes, mm_per_pixel):
+    from backend.inference.contours import ContourDetector
+    rows = []
+    for width in sizes:
+        detector = ContourDetector(mm_per_pixel=mm_per_pixel)
+        frames = [resize_width(img, width) for img in images]
+
+        def detect_draw(frame):
+            frame = frame.copy()
+            detector.draw(frame, detector.detect(frame))
+
+        samples, wall = measure(detect_draw, frames)
+        rows.append(summarize("contours", {"width": width}, samples, len(frames), wall))
+    return rows
+
+
+def bench_live(frames_n, width, height, particles, mm_per_pixel):
+    """
+    The fetch_esp32_frame path on synthetic camera frames (no camera needed).
+    """
+    from backend.inference.contours import ContourDetector
+    from backend.inference.motion import MotionGate
+    from backend.inference.tracker import ParticleTracker
+    from backend.server.fake_mjpeg import make_frame
+
+    detector = ContourDetector(mm_per_pixel=mm_per_pixel)
+    frames = [make_frame(i, width, height, particles) for i in range(frames_n)]
+    rows = []
+    for gated in (False, True):
+        gate = MotionGate(threshold=0.2 if gated else 0)
+        tracker = ParticleTracker(mm_per_pixel=mm_per_pixel)
+
+        def live_frame(frame):
+            frame = frame.copy()
+            result, detected = gate.run(frame, detector.detect)
+            detector.draw(frame, result)
+            if detected:
+                tracker.update(result["boxes"])
+            cv2.imencode(".jpg", frame)
+
+        samples, wall = measure(live_frame, frames)
+        rows.append(summarize("live", {"width": width, "particles": particles, "gated": gated},
+                              samples, len(frames), wall, unit="frame"))
+    return rows
+
+
+def run_suite(args):
+    stages = set(args.stages.split(","))
+    unknown = stages - set(STAGES)
+    if unknown:
+        raise SystemExit(f"unknown stages {sorted(unknown)}, expected {STAGES}")
+    batch_sizes = [int(x) for x in args.batch_sizes.split(",")]
+    imgsizes = [int(x) for x in args.imgsz.split(",")]
+    sizes = [int(x) for x in args.sizes.split(",")]
+    images = load_images(args.images, args.limit, extra=[BASE_DIR / "input.jpg"])
+    if not images:
+        raise SystemExit(f"no images found in {args.images}")
+    have_model = Path(args.weights).exists()
+    model_stages = {"model_load", "predict", "annotate", "encode"} & stages
+    if model_stages and not have_model:
+        print(f"[WARN] {args.weights} not found: skipping {sorted(model_stages)}")
+
+    rows = []
+    if have_model and "model_load" in stages:
+        rows += bench_model_load(args.weights, args.load_repeats)
+    if have_model and "predict" in stages:
+        rows += bench_predict(args.weights, images, batch_sizes, imgsizes, args.conf)
+    if have_model and {"annotate", "encode"} & stages:
+        detections, names = detections_for(args.weights, images, args.conf)
+        rows += bench_annotate_encode(images, detections, names, sizes, stages)
+    if "contours" in stages:
+        rows += bench_contours(images, sizes, args.mm_per_pixel)
+    if "live" in stages:
+        rows += bench_live(args.live_frames, 640, 480, args.particles, args.mm_per_pixel)
+
+    return {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "images": len(images),
+            "config": {k: str(v) for k, v in vars(args).items() if k != "func"},
+        },
+        "results": rows,
+    }
+
+
+# ----------------------------------------------------------------------
+# compare
+# ----------------------------------------------------------------------
+def compare(current, baseline, tolerance, metrics=("p50_ms", "p95_ms")):
+    """
+    Match cases by name + params. Returns (rows, regressions); a case
+    regresses when any metric exceeds baseline * (1 + tolerance).
+    """
+    base = {case_key(r): r for r in baseline["results"]}
+    rows, regressions = [], []
+    for r in current["results"]:
+        key = case_key(r)
+        b = base.get(key)
+        if b is None:
+            rows.append({"case": key, "status": "new"})
+            continue
+        ratios = {m: round(r[m] / b[m], 3) if b[m] else None for m in metrics}
+        bad = [m for m, x in ratios.items() if x is not None and x > 1 + tolerance]
+        row = {"case": key, "status": "REGRESSION" if bad else "ok",
+               **{f"{m}_base": b[m] for m in metrics}, **{m: r[m] for m in metrics},
+               **{f"{m}_ratio": x for m, x in ratios.items()}}
+        rows.append(row)
+        if bad:
+            regressions.append(row)
+    return rows, regressions
+
+
+def print_compare(rows):
+    print(f"{'case':<48}{'p50 base':>10}{'p50':>10}{'ratio':>8}{'p95 ratio':>10}  status")
+    for r in rows:
+        if r["status"] == "new":
+            print(f"{r['case']:<48}{'-':>10}{'-':>10}{'-':>8}{'-':>10}  new")
+            continue
+        print(f"{r['case']:<48}{r['p50_ms_base']:>10}{r['p50_ms']:>10}{str(r['p50_ms_ratio']):>8}"
+              f"{str(r['p95_ms_ratio']):>10}  {r['status']}")
+
+
+def print_results(report):
+    print(f"{'case':<48}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'thruput':>16}{'rss MB':>9}")
+    for r in report["results"]:
+        print(f"{case_key(r):<48}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+              f"{str(r['throughput']) + ' ' + r['unit']:>16}{str(r['peak_rss_mb'] or '-'):>9}")
+
+
+# ----------------------------------------------------------------------
+# load generation
+# ----------------------------------------------------------------------
+def run_load(args):
+    from fastapi.testclient import TestClient
+    import backend.server.app as server
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_load_"))
+    server.UPLOAD_DIR = tmp / "uploads"
+    server.RESULTS_DIR = tmp / "results"
+    server.UPLOAD_DIR.mkdir()
+    server.RESULTS_DIR.mkdir()
+    if not server.MODEL_PATH.exists():
+        print(f"[WARN] {server.MODEL_PATH} not found: /upload only saves, /detect returns 500")
+
+    paths = sorted(Path(args.images).glob("*.jpg"))[:args.limit]
+    payloads = [p.read_bytes() for p in paths]
+
+    def one_request(i):
+        data = payloads[i % len(payloads)]
+        if args.unique:
+            # bytes after the JPEG end marker are ignored by decoders but defeat the result cache
+            data = data + i.to_bytes(4, "little")
+        name = f"load_{i}.jpg"
+        out = {}
+        t0 = time.perf_counter()
+        r = client.post("/upload", files={"file": (name, data, "image/jpeg")})
+        out["upload"] = (time.perf_counter() - t0, r.status_code, None)
+        # uploads are stored under their content hash
+        stored = r.json()["filename"] if r.status_code == 200 else name
+        t0 = time.perf_counter()
+        r = client.post("/detect", params={"filename": stored, "conf": args.conf})
+        cache = r.json().get("result", {}).get("cache") if r.status_code == 200 else None
+        out["detect"] = (time.perf_counter() - t0, r.status_code, cache)
+        return out
+
+    with TestClient(server.app) as client:
+        one_request(0)  # warm the model and the routes
+        t_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(one_request, range(1, args.requests + 1)))
+        wall = time.perf_counter() - t_start
+        scheduler_stats = client.get("/inference/stats").json()
+
+    rows = []
+    for endpoint in ("upload", "detect"):
+        samples = [r[endpoint][0] for r in results]
+        row = summarize(endpoint, {"concurrency": args.concurrency}, samples, len(samples), wall, unit="req")
+        codes = {}
+        for r in results:
+            codes[str(r[endpoint][1])] = codes.get(str(r[endpoint][1]), 0) + 1
+        row["status_codes"] = codes
+        if endpoint == "detect":
+            caches = {}
+            for r in results:
+                caches[str(r[endpoint][2])] = caches.get(str(r[endpoint][2]), 0) + 1
+            row["cache"] = caches
+        rows.append(row)
+    return {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "wall_s": round(wall, 3),
+            "tmp_dir": str(tmp),
+        },
+        "results": rows,
+        "scheduler": scheduler_stats,
+    }
+
+
+def write_report(report, out):
+    if out:
+        Path(out).parent.mkdir(parents=True, exist_ok=True)
+        Path(out).write_text(json.dumps(report, indent=2))
+        print(f"wrote {out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p_run = sub.add_parser("run", help="benchmark pipeline stages offline")
+    p_run.add_argument("--weights", type=str, default=str(DEFAULT_WEIGHTS))
+    p_run.add_argument("--images", type=str, default=str(MODEL_DIR / "data/valid/images"))
+    p_run.add_argument("--limit", type=int, default=50)
+    p_run.add_argument("--stages", type=str, default=",".join(STAGES))
+    p_run.add_argument("--batch-sizes", type=str, default="1,4,8")
+    p_run.add_argument("--imgsz", type=str, default="320,640")
+    p_run.add_argument("--sizes", type=str, default="640,1280,1920", help="image widths for annotate/encode/contours")
+    p_run.add_argument("--conf", type=float, default=0.25)
+    p_run.add_argument("--mm-per-pixel", type=float, default=0.05)
+    p_run.add_argument("--load-repeats", type=int, default=3)
+    p_run.add_argument("--live-frames", type=int, default=100)
+    p_run.add_argument("--particles", type=int, default=50)
+    p_run.add_argument("--out", type=str, default=None)
+    p_run.add_argument("--baseline", type=str, default=None, help="compare against this report when done")
+    p_run.add_argument("--tolerance", type=float, default=0.1)
+
+    p_cmp = sub.add_parser("compare", help="flag regressions vs. a baseline report")
+    p_cmp.add_argument("current", type=str)
+    p_cmp.add_argument("baseline", type=str)
+    p_cmp.add_argument("--tolerance", type=float, default=0.1, help="allowed slowdown, 0.1 = 10%%")
+
+    p_load = sub.add_parser("load", help="concurrent /upload + /detect through TestClient")
+    p_load.add_argument("--images", type=str, default=str(MODEL_DIR / "data/valid/images"))
+    p_load.add_argument("--limit", type=int, default=50)
+    p_load.add_argument("--requests", type=int, default=100)
+    p_load.add_argument("--concurrency", type=int, default=8)
+    p_load.add_argument("--conf", type=float, default=0.25)
+    p_load.add_argument("--unique", action="store_true", help="make every upload unique (no result-cache hits)")
+    p_load.add_argument("--out", type=str, default=None)
+    args = parser.parse_args()
+
+    if args.mode == "run":
+        report = run_suite(args)
+        print_results(report)
+        write_report(report, args.out)
+        if args.baseline:
+            rows, regressions = compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+            print_compare(rows)
+            sys.exit(1 if regressions else 0)
+    elif args.mode == "compare":
+        rows, regressions = compare(json.loads(Path(args.current).read_text()),
+                                    json.loads(Path(args.baseline).read_text()), args.tolerance)
+        print_compare(rows)
+        print(f"{len(regressions)} regression(s) above {args.tolerance:.0%}")
+        sys.exit(1 if regressions else 0)
+    else:
+        report = run_load(args)
+        print_results(report)
+        for r in report["results"]:
+            print(f"{r['name']}: status {r['status_codes']}" + (f", cache {r['cache']}" if "cache" in r else ""))
+        write_report(report, args.out)
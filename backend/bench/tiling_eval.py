@@ -0,0 +1,134 @@
+"""
+bench/tiling_eval.py
+Throughput and recall of sliced (tiled) vs single-pass inference on the
+`valid` split.
+
+The validation images are only ~560 px, so --scale upsamples them (e.g. 4x
+gives ~2200 px captures) to mimic high-resolution microscope images while
+keeping the ground-truth boxes valid.
+
+Example usage:
+    python -m backend.bench.tiling_eval --model runs/train/microplastic_experiment/weights/best.pt \\
+        --scale 4 --tile 640 --overlap 0.2 --batch 8
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from backend.inference.detections import Detections
+from backend.inference.model_registry import get_model
+from backend.inference.tiling import predict_tiled
+
+VALID_DIR = Path(__file__).resolve().parents[1] / "model/data/valid"
+
+
+def load_labels(label_path, width, height):
+    """
+    Read a YOLO label file into an (N, 4) xyxy pixel array.
+    """
+    if not label_path.exists():
+        return np.zeros((0, 4), dtype=np.float32)
+    rows = np.loadtxt(label_path, ndmin=2, dtype=np.float32)
+    if rows.size == 0:
+        return np.zeros((0, 4), dtype=np.float32)
+    xc, yc, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    return np.stack([xc - w / 2, yc - h / 2, xc + w / 2, yc + h / 2], axis=1)
+
+
+def box_iou(a, b):
+    """
+    Pairwise IoU between (N, 4) and (M, 4) xyxy arrays.
+    """
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def matched(gt, pred, iou_thresh=0.5):
+    """
+    Number of ground-truth boxes matched by a prediction (greedy, one-to-one).
+    """
+    ious = box_iou(gt, pred)
+    hits = 0
+    while ious.size and ious.max() >= iou_thresh:
+        i, j = np.unravel_index(np.argmax(ious), ious.shape)
+        hits += 1
+        ious[i, :] = 0
+        ious[:, j] = 0
+    return hits
+
+
+def evaluate(model, samples, mode, args):
+    gt_total = hits = pred_total = 0
+    t0 = time.perf_counter()
+    for img, gt in samples:
+        if mode == "tiled":
+            dets = predict_tiled(model, img, args.tile, args.overlap, args.batch, args.conf, args.iou)
+        else:
+            res = model.predict(source=img, conf=args.conf, iou=args.iou, imgsz=args.imgsz, max_det=300, verbose=False)
+            dets = Detections.from_results(res[0])
+        pred = dets.xyxy
+        gt_total += len(gt)
+        pred_total += len(pred)
+        hits += matched(gt, pred)
+    elapsed = time.perf_counter() - t0
+    return {
+        "mode": mode,
+        "images": len(samples),
+        "images_per_s": round(len(samples) / elapsed, 3) if elapsed else None,
+        "recall@0.5": round(hits / gt_total, 4) if gt_total else None,
+        "precision@0.5": round(hits / pred_total, 4) if pred_total else None,
+        "predictions": pred_total,
+        "ground_truth": gt_total,
+    }
+
+
+def load_samples(valid_dir, scale, limit):
+    samples = []
+    for img_path in sorted((valid_dir / "images").glob("*.jpg"))[:limit]:
+        img = cv2.imread(str(img_path))
+        if img is None:
+            continue
+        h, w = img.shape[:2]
+        gt = load_labels(valid_dir / "labels" / (img_path.stem + ".txt"), w, h)
+        if scale != 1:
+            img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_CUBIC)
+            gt = gt * scale
+        samples.append((img, gt))
+    return samples
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, required=True)
+    parser.add_argument("--data", type=str, default=str(VALID_DIR))
+    parser.add_argument("--scale", type=float, default=4.0, help="upsample factor applied to valid images")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--imgsz", type=int, default=640, help="single-pass input size")
+    parser.add_argument("--tile", type=int, default=640)
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--iou", type=float, default=0.45)
+    parser.add_argument("--out", type=str, default=None, help="write the report as JSON")
+    args = parser.parse_args()
+
+    model = get_model(args.model)
+    samples = load_samples(Path(args.data), args.scale, args.limit)
+    report = {
+        "config": vars(args),
+        "results": [evaluate(model, samples, "single", args), evaluate(model, samples, "tiled", args)],
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
@@ -0,0 +1,105 @@
+"""
+bench/tracker.py
+Per-frame cost and counting accuracy of ParticleTracker vs. particle count.
+
+Synthetic particles drift across the frame with a little jitter; a particle
+that leaves the frame is replaced by a new one at the opposite edge. Each
+frame's detections miss some particles and add a few false blobs, like the
+classical detector does. Reports update time (median / p95, and the fps that
+allows on one core), the tracked count vs. the raw per-frame count against
+the true number in view, and unique particles counted vs. the true total.
+
+Example usage:
+    python -m backend.bench.tracker --particles 50,200,500,1000 --frames 300
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from backend.inference.tracker import ParticleTracker
+
+
+def simulate(particles, n_frames, width, height, miss_rate, false_rate, jitter, speed, seed):
+    """
+    Yield (boxes, n_visible) per frame and return the total number of distinct
+    particles that appeared (via StopIteration.value).
+    """
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(0, 1, (particles, 2)) * (width, height)
+    vel = rng.uniform(-speed, speed, (particles, 2))
+    size = rng.uniform(6, 16, particles)
+    total = particles
+    for _ in range(n_frames):
+        pos += vel
+        out = (pos[:, 0] < 0) | (pos[:, 0] > width) | (pos[:, 1] < 0) | (pos[:, 1] > height)
+        if out.any():
+            # a new particle enters where the old one left
+            pos[out] %= (width, height)
+            size[out] = rng.uniform(6, 16, out.sum())
+            total += int(out.sum())
+        seen = rng.random(particles) >= miss_rate
+        centres = pos[seen] + rng.normal(0, jitter, (seen.sum(), 2))
+        wh = np.repeat(size[seen, None], 2, axis=1) + rng.normal(0, 0.5, (seen.sum(), 2))
+        n_false = rng.poisson(false_rate * particles)
+        if n_false:
+            centres = np.concatenate([centres, rng.uniform(0, 1, (n_false, 2)) * (width, height)])
+            wh = np.concatenate([wh, rng.uniform(6, 12, (n_false, 2))])
+        boxes = np.concatenate([centres - wh / 2.0, wh], axis=1)
+        yield boxes, particles
+    return total
+
+
+def run(particles, n_frames, width, height, miss_rate, false_rate, jitter, speed, seed=0):
+    tracker = ParticleTracker()
+    times, tracked_err, raw_err = [], [], []
+    sim = simulate(particles, n_frames, width, height, miss_rate, false_rate, jitter, speed, seed)
+    total = particles
+    while True:
+        try:
+            boxes, visible = next(sim)
+        except StopIteration as stop:
+            total = stop.value
+            break
+        t0 = time.perf_counter()
+        tracker.update(boxes)
+        times.append(time.perf_counter() - t0)
+        # skip warm-up frames before tracks can be confirmed
+        if tracker.frames > tracker.min_hits:
+            tracked_err.append(abs(tracker.active_count - visible))
+            raw_err.append(abs(len(boxes) - visible))
+    times_ms = np.array(times) * 1000.0
+    median = float(np.median(times_ms))
+    return {
+        "particles": particles,
+        "median_ms": round(median, 3),
+        "p95_ms": round(float(np.percentile(times_ms, 95)), 3),
+        "max_fps": round(1000.0 / median, 1) if median else None,
+        "raw_count_err": round(float(np.mean(raw_err)), 2),
+        "tracked_count_err": round(float(np.mean(tracked_err)), 2),
+        "unique_true": total,
+        "unique_counted": tracker.unique_count,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--particles", type=str, default="50,100,250,500,1000")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--miss-rate", type=float, default=0.05, help="chance a particle is not detected")
+    parser.add_argument("--false-rate", type=float, default=0.01, help="false blobs per particle per frame")
+    parser.add_argument("--jitter", type=float, default=0.7, help="detection centre noise (px)")
+    parser.add_argument("--speed", type=float, default=2.0, help="max drift per frame (px)")
+    args = parser.parse_args()
+
+    print(f"{'particles':>9} {'median ms':>10} {'p95 ms':>8} {'max fps':>8} {'raw err':>8} "
+          f"{'tracked err':>12} {'unique true':>12} {'counted':>8}")
+    for p in [int(x) for x in args.particles.split(",")]:
+        r = run(p, args.frames, args.width, args.height, args.miss_rate, args.false_rate,
+                args.jitter, args.speed)
+        print(f"{r['particles']:>9} {r['median_ms']:>10} {r['p95_ms']:>8} {r['max_fps']:>8} "
+              f"{r['raw_count_err']:>8} {r['tracked_count_err']:>12} {r['unique_true']:>12} "
+              f"{r['unique_counted']:>8}")
@@ -0,0 +1,148 @@
+"""
+bench/train_data.py
+Training data pipeline: the current setup (full images, JPEG decode per
+sample) against build_dataset.py tiles with the images.npy cache.
+
+Modes:
+    loader  sample-loading throughput only (no ultralytics needed): builds
+            the tiled dataset, then times, single-threaded,
+                full     cv2.imread of a source image + resize to --img
+                         (what YOLODataset.load_image does per sample)
+                tiles    cv2.imread of a tile
+                mmap     copy of a tile out of images.npy
+            Reports samples/s and pixels/s (tiles are smaller than images).
+    train   trains both setups for --epochs (runs train.py) and reports
+            epoch wall-time from results.csv, plus mAP50 / mAP50-95 of both
+            models on the original validation images at --img.
+
+Example usage:
+    python -m backend.bench.train_data --mode loader --tile 320
+    python -m backend.bench.train_data --mode train --tile 320 --epochs 10 --oversample 2
+"""
+
+import argparse
+import csv
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from backend.model.build_dataset import IMAGE_SUFFIXES, build, load_data_cfg
+
+MODEL_DIR = Path(__file__).resolve().parent.parent / "model"
+
+
+def _rate(fn, items, seconds):
+    # loop over items until `seconds` have passed; returns (samples/s, pixels/s)
+    n = px = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        for item in items:
+            im = fn(item)
+            n += 1
+            px += im.shape[0] * im.shape[1]
+    dt = time.perf_counter() - t0
+    return round(n / dt, 1), round(px / dt / 1e6, 1)
+
+
+def bench_loader(data_cfg, tile, img_size, seconds, out_dir=None):
+    tiled_cfg = build(data_cfg, out_dir, tile_size=tile)
+    images_dir = load_data_cfg(data_cfg)["train"]
+    images = sorted(str(p) for p in images_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    split_dir = Path(tiled_cfg).parent / "train"
+    tiles = sorted(str(p) for p in (split_dir / "images").iterdir())
+    cache = np.load(split_dir / "images.npy", mmap_mode="r")
+
+    def full(path):
+        im = cv2.imread(path)
+        h, w = im.shape[:2]
+        r = img_size / max(h, w)
+        return cv2.resize(im, (round(w * r), round(h * r)), interpolation=cv2.INTER_LINEAR) if r != 1 else im
+
+    np.asarray(cache).sum()   # warm the page cache, as after the first epoch
+    results = {"images": len(images), "tiles": len(tiles), "tile": tile, "img": img_size}
+    for name, fn, items in (("full", full, images),
+                            ("tiles", cv2.imread, tiles),
+                            ("mmap", lambda i: np.array(cache[i]), range(len(cache)))):
+        results[f"{name}_per_s"], results[f"{name}_mpx_per_s"] = _rate(fn, items, seconds)
+    return results
+
+
+def read_epochs(run_dir):
+    with open(Path(run_dir) / "results.csv") as f:
+        rows = [{k.strip(): v for k, v in row.items()} for row in csv.DictReader(f)]
+    times = [float(r["time"]) for r in rows if r.get("time")]
+    return rows, np.diff([0.0] + times).tolist() if times else []
+
+
+def run_training(data_cfg, project, name, epochs, batch, img_size, model, workers, extra):
+    cmd = [sys.executable, "train.py", "--data", str(Path(data_cfg).resolve()), "--epochs", str(epochs),
+           "--batch", str(batch), "--img", str(img_size), "--model", model, "--workers", str(workers),
+           "--project", str(Path(project) / name)] + extra
+    t0 = time.perf_counter()
+    subprocess.run(cmd, cwd=MODEL_DIR, check=True)
+    wall = time.perf_counter() - t0
+    run_dir = Path(project) / name / "microplastic_experiment"
+    _, epoch_s = read_epochs(run_dir)
+    return run_dir / "weights" / "best.pt", {
+        "wall_s": round(wall, 1),
+        # older ultralytics versions have no time column; fall back to the average
+        "epoch_s": round(float(np.median(epoch_s)), 2) if epoch_s else round(wall / epochs, 2),
+    }
+
+
+def bench_train(data_cfg, tile, img_size, epochs, batch, model, workers, oversample, project):
+    from ultralytics import YOLO
+    setups = {
+        "baseline": [],
+        "tiled_mmap": ["--tile", str(tile), "--cache", "mmap", "--oversample", str(oversample)],
+    }
+    results = {}
+    for name, extra in setups.items():
+        best, r = run_training(data_cfg, project, name, epochs, batch, img_size, model, workers, extra)
+        # both models are scored on the original validation images; tiles keep
+        # the pixel scale, so the tiled model runs on full images unchanged
+        metrics = YOLO(str(best)).val(data=str(Path(data_cfg).resolve()), imgsz=img_size, batch=batch,
+                                      project=str(Path(project) / name), verbose=False)
+        r["map50"] = round(float(metrics.box.map50), 4)
+        r["map50_95"] = round(float(metrics.box.map), 4)
+        results[name] = r
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["loader", "train"], default="loader")
+    parser.add_argument("--data", type=str, default=str(MODEL_DIR / "dataset.yaml"))
+    parser.add_argument("--tile", type=int, default=320)
+    parser.add_argument("--img", type=int, default=640)
+    parser.add_argument("--seconds", type=float, default=3.0, help="loader: time per variant")
+    parser.add_argument("--out", type=str, default=None, help="loader: tiled dataset directory")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--model", type=str, default="yolov8n.pt")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--oversample", type=int, default=2)
+    parser.add_argument("--project", type=str, default=None, help="train: run directory (default: temp dir)")
+    parser.add_argument("--json", type=str, default=None, help="also write the results here")
+    args = parser.parse_args()
+
+    if args.mode == "loader":
+        r = bench_loader(args.data, args.tile, args.img, args.seconds, args.out)
+        print(f"{r['images']} images, {r['tiles']} tiles of {r['tile']}px, resize to {r['img']}px")
+        for name in ("full", "tiles", "mmap"):
+            print(f"{name:<6} {r[name + '_per_s']:>9} samples/s  {r[name + '_mpx_per_s']:>7} Mpx/s")
+    else:
+        project = args.project or tempfile.mkdtemp(prefix="train_bench_")
+        r = bench_train(args.data, args.tile, args.img, args.epochs, args.batch, args.model, args.workers,
+                        args.oversample, project)
+        for name, v in r.items():
+            print(f"{name:<11} epoch {v['epoch_s']:>7} s  total {v['wall_s']:>7} s  "
+                  f"mAP50 {v['map50']:.4f}  mAP50-95 {v['map50_95']:.4f}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(r, indent=2))
@@ -0,0 +1,171 @@
+"""
+bench/workers.py
+Throughput of the production launcher (backend/server/serve.py) by worker count.
+
+For each worker count the server is started on a free port and driven by
+--clients client processes (one keep-alive connection each, so the client
+side does not become the bottleneck) for --duration seconds:
+    latest   GET /api/latest (shared state read, no model)
+    detect   POST /upload + POST /detect of a unique image per request
+             (trailing bytes defeat the result cache, so every request predicts)
+Reports req/s, p50/p95 latency, the workers that answered and the scaling
+efficiency relative to one worker.
+
+Example usage:
+    python -m backend.bench.workers --workers 1,2,4 --mode latest --duration 10
+    python -m backend.bench.workers --workers 1,2 --mode detect --image input.jpg --clients 8
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def multipart(name, data):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{name}\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def one_request(conn, mode, payload, i):
+    if mode == "latest":
+        conn.request("GET", "/api/latest")
+        r = conn.getresponse()
+        r.read()
+        return r.status
+    body, ctype = multipart(f"bench_{i}.jpg", payload + i.to_bytes(8, "little"))
+    conn.request("POST", "/upload", body=body, headers={"Content-Type": ctype})
+    r = conn.getresponse()
+    data = r.read()
+    if r.status != 200:
+        return r.status
+    conn.request("POST", f"/detect?filename={json.loads(data)['filename']}")
+    r = conn.getresponse()
+    r.read()
+    return r.status
+
+
+def client(args):
+    index, port, mode, image, duration = args
+    payload = Path(image).read_bytes() if image else b""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    latencies, codes, workers = [], {}, set()
+    conn.request("GET", "/worker")
+    workers.add(json.loads(conn.getresponse().read())["index"])
+    end = time.perf_counter() + duration
+    i = index << 32
+    while time.perf_counter() < end:
+        t0 = time.perf_counter()
+        status = one_request(conn, mode, payload, i)
+        latencies.append(time.perf_counter() - t0)
+        codes[status] = codes.get(status, 0) + 1
+        i += 1
+    conn.close()
+    return latencies, codes, workers
+
+
+def wait_ready(port, proc, timeout=120):
+    end = time.time() + timeout
+    while time.time() < end:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/worker")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("server did not start")
+
+
+def run(workers, args):
+    port = free_port()
+    env = dict(os.environ)
+    env.setdefault("STATE_STORE", f"sqlite:///{Path(args.tmp) / f'state_{workers}.db'}")
+    cmd = [sys.executable, "-m", "backend.server.serve", "--workers", str(workers), "--port", str(port),
+           "--host", "127.0.0.1", "--log-level", "warning"]
+    if args.threads:
+        cmd += ["--threads", str(args.threads)]
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=env)
+    try:
+        wait_ready(port, proc)
+        time.sleep(args.settle)   # let every worker finish loading
+        jobs = [(i, port, args.mode, args.image, args.duration) for i in range(args.clients)]
+        t0 = time.perf_counter()
+        with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+            results = pool.map(client, jobs)
+        wall = time.perf_counter() - t0
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+    latencies = np.array([x for r in results for x in r[0]])
+    codes = {}
+    for r in results:
+        for k, v in r[1].items():
+            codes[str(k)] = codes.get(str(k), 0) + v
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "req_s": round(len(latencies) / wall, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 2),
+        "status_codes": codes,
+        "answered_by": sorted(set().union(*(r[2] for r in results))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=str, default="1,2,4")
+    parser.add_argument("--mode", choices=("latest", "detect"), default="latest")
+    parser.add_argument("--image", type=str, default=str(BASE_DIR / "input.jpg"))
+    parser.add_argument("--clients", type=int, default=None, help="client processes (default: 2 x max workers)")
+    parser.add_argument("--threads", type=int, default=None, help="intra-op threads per worker")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--settle", type=float, default=2.0)
+    parser.add_argument("--out", type=str, default=None)
+    args = parser.parse_args()
+    counts = [int(n) for n in args.workers.split(",")]
+    args.clients = args.clients or 2 * max(counts)
+    if args.mode == "latest":
+        args.image = None
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench_workers_") as args.tmp:
+        for n in counts:
+            row = run(n, args)
+            rows.append(row)
+            base = rows[0]["req_s"] / rows[0]["workers"]
+            row["efficiency"] = round(row["req_s"] / (base * n), 2) if base else None
+            print(f"{n:>3} workers  {row['req_s']:>9} req/s  p50 {row['p50_ms']:>7} ms  p95 {row['p95_ms']:>7} ms  "
+                  f"efficiency {row['efficiency']}  answered by {row['answered_by']}  {row['status_codes']}")
+    if args.out:
+        Path(args.out).write_text(json.dumps({"mode": args.mode, "clients": args.clients, "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
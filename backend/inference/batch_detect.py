@@ -0,0 +1,310 @@
+"""
+batch_detect.py
+Bulk detection over a folder, glob, or zip/tar archive of images.
+
+Images are decoded by a pool of worker threads, fed to the model in fixed-size
+batches, and written as they are produced: one line per image (with its list
+of detections) to JSONL, or one row per detection to a directory of Parquet
+part files (needs pyarrow), where images without detections get a single row
+with empty box fields. Either way an image is written whole or not at all, so
+re-running with the same --out skips exactly the images already present.
+
+Example usage:
+    python -m backend.inference.batch_detect --model runs/train/microplastic_experiment/weights/best.pt \\
+        --source uploads/ --out results/batch.jsonl --batch 16 --workers 4
+    python -m backend.inference.batch_detect --model best.pt --source "captures/*.jpg" --out out.parquet
+    python -m backend.inference.batch_detect --model best.pt --source serial_dump.zip --out dump.jsonl \\
+        --annotate-dir results/batch
+"""
+
+import argparse
+import fnmatch
+import glob
+import json
+import sys
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from backend.inference.detections import Detections
+from backend.inference.model_registry import get_model
+from backend.inference.tiling import predict_tiled
+from backend.inference.utils import draw_boxes_on_image
+
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png", "*.bmp")
+ROW_FIELDS = ["image", "det", "x1", "y1", "x2", "y2", "conf", "class", "size_px", "size_mm"]
+# Parquet column types of ROW_FIELDS (pyarrow type names, the ones inferred from a batch
+# with detections); every part shares them, even a batch whose box columns are all null
+ROW_TYPES = {"image": "string", "det": "int64", "x1": "float64", "y1": "float64", "x2": "float64",
+             "y2": "float64", "conf": "float64", "class": "int64", "size_px": "float64", "size_mm": "float64"}
+
+
+# ================================
+# Sources
+# ================================
+def _is_image(name):
+    name = name.lower()
+    return any(fnmatch.fnmatch(name, p) for p in IMAGE_PATTERNS)
+
+
+def iter_sources(source):
+    """
+    Yield (image_id, read_bytes) for every image in a directory, glob,
+    single file, or zip/tar archive. read_bytes() returns the encoded image.
+    """
+    p = Path(source)
+    if p.is_dir():
+        for f in sorted(x for x in p.rglob("*") if x.is_file() and _is_image(x.name)):
+            yield str(f), f.read_bytes
+    elif p.is_file() and zipfile.is_zipfile(p):
+        zf = zipfile.ZipFile(p)
+        for name in sorted(n for n in zf.namelist() if _is_image(n)):
+            yield f"{p}::{name}", (lambda n=name: zf.read(n))
+    elif p.is_file() and tarfile.is_tarfile(p):
+        # tar members are read sequentially from one handle; not thread safe,
+        # so read the bytes eagerly (decode still runs in parallel)
+        with tarfile.open(p) as tf:
+            for member in tf:
+                if member.isfile() and _is_image(member.name):
+                    data = tf.extractfile(member).read()
+                    yield f"{p}::{member.name}", (lambda d=data: d)
+    elif p.is_file():
+        yield str(p), p.read_bytes
+    else:
+        for f in sorted(glob.glob(source, recursive=True)):
+            if _is_image(f):
+                yield f, Path(f).read_bytes
+
+
+def decode(item):
+    image_id, read_bytes = item
+    try:
+        buf = np.frombuffer(read_bytes(), dtype=np.uint8)
+        return image_id, cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    except Exception as e:
+        print(f"[WARN] could not read {image_id}: {e}", file=sys.stderr)
+        return image_id, None
+
+
+# ================================
+# Writers
+# ================================
+class JsonlWriter:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._drop_partial_line()
+        self._f = open(self.path, "a", buffering=1 << 16)
+
+    def _drop_partial_line(self):
+        # an interrupted run can leave a half-written last line; cut it so the
+        # next append starts on a fresh line
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(-1, 2)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            data = f.read()
+            f.truncate(data.rfind(b"\n") + 1)
+
+    def done_images(self):
+        done = set()
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        done.add(json.loads(line)["image"])
+                    except (ValueError, KeyError):
+                        continue  # partial last line from an interrupted run
+        return done
+
+    def write(self, rows):
+        # one line per image: an interrupted write loses whole images, never part of one
+        images = {}
+        for r in rows:
+            dets = images.setdefault(r["image"], [])
+            if r["det"] is not None:
+                dets.append({k: v for k, v in r.items() if k != "image"})
+        self._f.write("".join(json.dumps({"image": image_id, "detections": dets}) + "\n"
+                              for image_id, dets in images.items()))
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+class ParquetWriter:
+    """
+    Writes each flushed batch as a new part file in the <out> directory, so an
+    interrupted job keeps everything flushed before it stopped.
+    """
+
+    def __init__(self, path):
+        import pyarrow  # fail early with a clear ImportError
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        # after the highest existing part, so a gap in the numbering never overwrites one
+        parts = [int(p.stem.split("-")[1]) for p in self.path.glob("part-*.parquet")]
+        self._part = max(parts, default=-1) + 1
+        self._schema = pyarrow.schema([(k, getattr(pyarrow, ROW_TYPES[k])()) for k in ROW_FIELDS])
+
+    def done_images(self):
+        import pyarrow.parquet as pq
+        done = set()
+        for part in self.path.glob("part-*.parquet"):
+            done.update(pq.read_table(part, columns=["image"]).column("image").to_pylist())
+        return done
+
+    def write(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if not rows:
+            return
+        table = pa.table({k: [r[k] for r in rows] for k in ROW_FIELDS}, schema=self._schema)
+        tmp = self.path / f".part-{self._part:06d}.tmp"
+        pq.write_table(table, tmp)
+        tmp.rename(self.path / f"part-{self._part:06d}.parquet")
+        self._part += 1
+
+    def close(self):
+        pass
+
+
+def open_writer(out):
+    return ParquetWriter(out) if str(out).endswith(".parquet") else JsonlWriter(out)
+
+
+# ================================
+# Batch loop
+# ================================
+def detections_to_rows(image_id, detections, mm_per_pixel=None):
+    if not len(detections):
+        return [dict.fromkeys(ROW_FIELDS, None) | {"image": image_id}]
+    cols = detections.to_columns(mm_per_pixel)
+    sizes_mm = cols["size_mm"] or [None] * len(detections)
+    return [{"image": image_id, "det": i, "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+             "conf": conf, "class": c, "size_px": px, "size_mm": mm}
+            for i, ((x1, y1, x2, y2), conf, c, px, mm)
+            in enumerate(zip(cols["xyxy"], cols["conf"], cols["class"], cols["size_px"], sizes_mm))]
+
+
+def decode_ahead(pool, items, depth):
+    """
+    Decode items on `pool`, keeping at most `depth` decodes in flight, and
+    yield (image_id, img) in source order.
+    """
+    window = deque()
+    for item in items:
+        window.append(pool.submit(decode, item))
+        if len(window) >= depth:
+            yield window.popleft().result()
+    while window:
+        yield window.popleft().result()
+
+
+def annotated_name(image_id):
+    """
+    File name of the annotated rendering. The source extension stays in the
+    stem (a/x.png -> annotated_a_x.png.jpg) so a/x.png and a/x.jpg do not collide.
+    """
+    flat = image_id.replace("::", "__").replace("/", "_").replace("\\", "_").lstrip("._")
+    return f"annotated_{flat}.jpg"
+
+
+def run_batch(model_path, source, out, batch_size=16, workers=4, conf_thresh=0.25, iou=0.45,
+              mm_per_pixel=None, annotate_dir=None, tile_size=None, tile_overlap=0.2, progress_every=2.0,
+              backend=None):
+    """
+    Detect every image in `source` and stream rows to `out`. Returns a dict
+    with images processed / skipped and throughput.
+    """
+    model = get_model(model_path, backend)
+    writer = open_writer(out)
+    done = writer.done_images()
+    if annotate_dir:
+        Path(annotate_dir).mkdir(parents=True, exist_ok=True)
+
+    pending = (item for item in iter_sources(source) if item[0] not in done)
+    processed = skipped_unreadable = 0
+    t_start = last_report = time.perf_counter()
+
+    def flush(batch):
+        ids = [image_id for image_id, _ in batch]
+        imgs = [img for _, img in batch]
+        if tile_size:
+            all_dets = [predict_tiled(model, img, tile_size, tile_overlap, batch_size, conf_thresh, iou) for img in imgs]
+        else:
+            results = model.predict(source=imgs, conf=conf_thresh, iou=iou, max_det=300, verbose=False)
+            all_dets = [Detections.from_results(r) for r in results]
+        rows = []
+        for image_id, img, dets in zip(ids, imgs, all_dets):
+            rows.extend(detections_to_rows(image_id, dets, mm_per_pixel))
+            if annotate_dir:
+                out_path = Path(annotate_dir) / annotated_name(image_id)
+                cv2.imwrite(str(out_path), draw_boxes_on_image(img, dets, model.names, inplace=True))
+        writer.write(rows)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode") as pool:
+            batch = []
+            for image_id, img in decode_ahead(pool, pending, depth=batch_size * 2):
+                if img is None:
+                    skipped_unreadable += 1
+                    continue
+                batch.append((image_id, img))
+                if len(batch) == batch_size:
+                    flush(batch)
+                    processed += len(batch)
+                    batch = []
+                now = time.perf_counter()
+                if now - last_report >= progress_every:
+                    last_report = now
+                    print(f"[INFO] {processed} images, {processed / (now - t_start):.1f} img/s", file=sys.stderr)
+            if batch:
+                flush(batch)
+                processed += len(batch)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - t_start
+    return {
+        "processed": processed,
+        "already_done": len(done),
+        "unreadable": skipped_unreadable,
+        "seconds": round(elapsed, 2),
+        "images_per_s": round(processed / elapsed, 2) if elapsed else None,
+        "out": str(out),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, required=True)
+    parser.add_argument("--source", type=str, required=True, help="directory, glob, image, or .zip/.tar archive")
+    parser.add_argument("--out", type=str, required=True, help=".jsonl file or .parquet directory")
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4, help="decode threads")
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--iou", type=float, default=0.45)
+    parser.add_argument("--mmperpx", type=float, default=None)
+    parser.add_argument("--annotate-dir", type=str, default=None, help="also write annotated images here")
+    parser.add_argument("--tile", type=int, default=None, help="tile size in px for sliced inference")
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--backend", type=str, default=None, help="pytorch, onnx, onnx-int8, openvino, openvino-int8")
+    args = parser.parse_args()
+
+    summary = run_batch(
+        args.model, args.source, args.out,
+        batch_size=args.batch, workers=args.workers, conf_thresh=args.conf, iou=args.iou,
+        mm_per_pixel=args.mmperpx, annotate_dir=args.annotate_dir,
+        tile_size=args.tile, tile_overlap=args.overlap, backend=args.backend,
+    )
+    print(json.dumps(summary))
@@ -0,0 +1,129 @@
+"""
+inference/contours.py
+Classical (non-YOLO) particle detection used by the live camera feeds.
+
+Pipeline: gray -> Gaussian blur -> Canny -> dilate -> fill holes ->
+connected components. Blobs are what the original live loop counted as outer
+contours (findContours with RETR_EXTERNAL): flood-filling the background from
+the border fills every hole, so a blob inside another blob's hole merges into
+it, and one connectedComponentsWithStats call then returns all bounding boxes
+as an array, with no Python loop over contours. The size filter, the
+px -> mm conversion and drawing are vectorized as well.
+`python -m backend.bench.contours --check` verifies counts and boxes against
+the original loop. All per-frame buffers are allocated once per frame size
+and reused between frames.
+
+Example usage:
+    detector = ContourDetector(mm_per_pixel=0.05)
+    result = detector.detect(frame)         # counts, boxes, sizes as arrays
+    detector.draw(frame, result)            # in-place annotation
+"""
+
+import cv2
+import numpy as np
+
+from backend.inference.utils import draw_rects, label_glyphs
+
+# cv2.dilate(img, (1, 1)) in the original live loop turns the tuple into a
+# 2x1 kernel; keep that exact kernel so counts do not change.
+DILATE_KERNEL = np.ones((2, 1), dtype=np.uint8)
+
+
+class ContourDetector:
+    def __init__(self, mm_per_pixel=None, min_size=5, blur_ksize=11, canny_low=30, canny_high=150,
+                 dilate_iterations=2):
+        self.mm_per_pixel = mm_per_pixel
+        self.min_size = min_size
+        self.blur_ksize = (blur_ksize, blur_ksize)
+        self.canny_low = canny_low
+        self.canny_high = canny_high
+        self.dilate_iterations = dilate_iterations
+        self._shape = None
+
+    def _ensure_buffers(self, shape):
+        if self._shape == shape:
+            return
+        h, w = shape
+        self._gray = np.empty((h, w), dtype=np.uint8)
+        self._blur = np.empty((h, w), dtype=np.uint8)
+        self._edges = np.empty((h, w), dtype=np.uint8)
+        self._dilated = np.empty((h, w), dtype=np.uint8)
+        self._padded = np.empty((h + 2, w + 2), dtype=np.uint8)
+        self._filled = np.empty((h, w), dtype=np.uint8)
+        self._labels = np.empty((h, w), dtype=np.int32)
+        self._shape = shape
+
+    def edges(self, frame):
+        """
+        Run the gray/blur/Canny/dilate stages into the reusable buffers and
+        return the dilated edge map (valid until the next call).
+        """
+        self._ensure_buffers(frame.shape[:2])
+        if frame.ndim == 3:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray)
+            gray = self._gray
+        else:
+            gray = frame
+        cv2.GaussianBlur(gray, self.blur_ksize, 0, dst=self._blur)
+        cv2.Canny(self._blur, self.canny_low, self.canny_high, edges=self._edges)
+        cv2.dilate(self._edges, DILATE_KERNEL, dst=self._dilated, iterations=self.dilate_iterations)
+        return self._dilated
+
+    def detect(self, frame):
+        """
+        Detect blobs in a BGR (or gray) frame.
+        Returns dict:
+            objects   - number of blobs found (before the size filter)
+            boxes     - (N, 4) int32 x, y, w, h of blobs passing the size filter
+            sizes_px  - (N,) float32 mean of w and h
+            sizes_mm  - (N,) float32 sizes in mm, or None without calibration
+        """
+        # mark the background reachable from outside the frame (4-connected, like
+        # findContours' background); everything else is a blob or a hole in one
+        cv2.copyMakeBorder(self.edges(frame), 1, 1, 1, 1, cv2.BORDER_CONSTANT, dst=self._padded, value=0)
+        cv2.floodFill(self._padded, None, (0, 0), 1)
+        cv2.compare(self._padded[1:-1, 1:-1], 1, cv2.CMP_NE, dst=self._filled)
+        # Grana's block-based labeling: CCL_DEFAULT picks a ~3x slower one for 32-bit labels
+        n, _, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(
+            self._filled, 8, cv2.CV_32S, cv2.CCL_GRANA, labels=self._labels)
+        rects = stats[1:, :4]   # label 0 is the background
+        keep = (rects[:, 2] > self.min_size) & (rects[:, 3] > self.min_size)
+        boxes = rects[keep].astype(np.int32)
+        sizes_px = (boxes[:, 2] + boxes[:, 3]).astype(np.float32) / 2.0
+        return {
+            "objects": n - 1,
+            "boxes": boxes,
+            "sizes_px": sizes_px,
+            "sizes_mm": sizes_px * self.mm_per_pixel if self.mm_per_pixel else None,
+        }
+
+    def draw(self, frame, result, labels=True):
+        """
+        Draw result boxes (and mm labels when calibrated) onto frame in place.
+        Labels are stamped from pre-rendered masks (see inference/utils.py).
+        """
+        boxes = result["boxes"]
+        if len(boxes) == 0:
+            return frame
+        draw_rects(frame, np.concatenate([boxes[:, :2], boxes[:, :2] + boxes[:, 2:]], axis=1), (0, 255, 0), 2)
+        if labels and result["sizes_mm"] is not None:
+            # round in float64: float32 sizes would print as 0.699999988 mm
+            texts = [f"{size_mm} mm" for size_mm in np.round(result["sizes_mm"].astype(np.float64), 2).tolist()]
+            origins = boxes[:, :2] - (0, 5)
+            label_glyphs(0.5).draw(frame, texts, origins.tolist(), (0, 0, 255))
+        return frame
+
+
+def water_stats(objects, water_ml):
+    """
+    Live stats derived from a particle count, as shown on /esp32/stats.
+    """
+    grams_per_ml = objects / water_ml if water_ml > 0 else 0
+    percent_plastic = (objects / (objects + water_ml)) * 100 if (objects + water_ml) > 0 else 0
+    return {
+        "objects": objects,
+        "grams_per_ml": round(grams_per_ml, 3),
+        "percent_plastic": round(percent_plastic, 2),
+        "percent_water": round(100 - percent_plastic, 2),
+        "water_ml": water_ml
+    }
@@ -4,59 +4,94 @@ Use a trained YOLOv8 model to run inference on images and save visualized result
 
 Example usage:
     python detect.py --model runs/train/microplastic_experiment/weights/best.pt --image input.jpg --out output.jpg
+
+For whole folders or archives use batch_detect.py, which loads the model once.
 """
 
 import argparse
-from ultralytics import YOLO
+import time
 import cv2
-from pathlib import Path
-from backend.inference.utils import draw_boxes_on_image, detections_to_summary
+from backend.inference.detections import Detections
+from backend.inference.utils import draw_boxes_on_image
+from backend.inference.tiling import predict_tiled
+from backend.inference.model_registry import get_model
+from backend.inference import metrics
 
 # Set WATER_ML globally or pass as argument if needed
 WATER_ML = 100  # Adjust to your sample size
 
-def run_inference(model_path, image_path, output_image_path=None, conf_thresh=0.25, iou=0.45, mm_per_pixel=None):
-    model = YOLO(model_path)
-    results = model.predict(source=str(image_path), conf=conf_thresh, iou=iou, max_det=300, verbose=False)
-    
-    # ultralytics returns list of Results, take first
-    res = results[0]
-    boxes = res.boxes.xyxy.cpu().numpy() if hasattr(res, 'boxes') else []
-    confs = res.boxes.conf.cpu().numpy() if hasattr(res, 'boxes') else []
-    cls = res.boxes.cls.cpu().numpy().astype(int) if hasattr(res, 'boxes') else []
-
-    detections = []
-    for b, c, cf in zip(boxes, cls, confs):
-        x1, y1, x2, y2 = b.tolist()
-        detections.append({"xyxy": [x1, y1, x2, y2], "class": int(c), "conf": float(cf)})
-
-    # read image with OpenCV
-    img = cv2.imread(str(image_path))
-    annotated = draw_boxes_on_image(img, detections, class_names=model.names)
+def build_result(detections, img, class_names=None, output_image_path=None, mm_per_pixel=None, timings=None,
+                 layout="records"):
+    """
+    Build the detections/summary dict returned by run_inference from
+    `detections` (Detections, records or columns). With `output_image_path`
+    the annotated `img` (BGR) is also written there; without it nothing is
+    drawn (the server renders annotated images on request, see
+    server/annotations.py). Stage times are recorded in inference/metrics.py
+    and, when given, in the `timings` dict.
+    layout: "records" (one dict per box, with per-box sizes also listed in
+            the summary) or "columns" (struct of arrays, see
+            inference/detections.py; the summary keeps only the aggregates).
+    """
+    detections = Detections.from_any(detections)
     if output_image_path:
-        cv2.imwrite(str(output_image_path), annotated)
+        with metrics.span("annotate", into=timings):
+            annotated = draw_boxes_on_image(img, detections, class_names=class_names)
+        with metrics.span("imwrite", into=timings):
+            cv2.imwrite(str(output_image_path), annotated)
 
     # Generate summary
-    summary = detections_to_summary(detections, mm_per_pixel)
-    summary["count"] = len(detections)
+    with metrics.span("summary", into=timings):
+        summary = detections.summary(mm_per_pixel, per_box=layout == "records")
 
     # Calculate percent plastic and water
     total = WATER_ML + summary["count"]
     summary["percent_plastic"] = round((summary["count"] / total) * 100, 2) if total > 0 else 0
     summary["percent_water"] = round((WATER_ML / total) * 100, 2) if total > 0 else 0
 
-    # attach per-detection sizes
-    for det, px, mm in zip(detections, summary["sizes_px"], summary["sizes_mm"]):
-        det['size_px'] = px
-        det['size_mm'] = mm
-
     return {
-        "detections": detections,
+        "detections": detections.to_layout(layout, mm_per_pixel),
         "summary": summary,
         "annotated_image": str(output_image_path) if output_image_path else None
     }
 
 
+def run_inference(model_path, image_path, output_image_path=None, conf_thresh=0.25, iou=0.45, mm_per_pixel=None, model=None,
+                  tile_size=None, tile_overlap=0.2, tile_batch=8, backend=None, layout="records"):
+    """
+    Run detection on one image. If `model` is given it is used as-is, otherwise
+    the model for `model_path` is fetched from the process-wide registry
+    (loaded once, reloaded when the weights file changes); `backend` selects
+    an exported variant of it (e.g. "onnx", "openvino-int8").
+    With `tile_size` set, the image is predicted as overlapping tiles (see
+    inference/tiling.py) so small particles in large images keep their detail.
+    `layout` selects the shape of result["detections"] (see build_result).
+    """
+    t0 = time.perf_counter()
+    if model is None:
+        model = get_model(model_path, backend)
+    # load_s is ~0 when the model was already cached (warm call)
+    timings = {"load_s": round(time.perf_counter() - t0, 4)}
+
+    # read image with OpenCV
+    with metrics.span("imread", into=timings):
+        img = cv2.imread(str(image_path))
+    if img is None:
+        raise FileNotFoundError(f"could not read image {image_path}")
+
+    with metrics.span("predict", into=timings):
+        if tile_size:
+            detections = predict_tiled(model, img, tile_size, tile_overlap, tile_batch, conf_thresh, iou)
+        else:
+            results = model.predict(source=img, conf=conf_thresh, iou=iou, max_det=300, verbose=False)
+            # ultralytics returns list of Results, take first
+            detections = Detections.from_results(results[0])
+
+    out = build_result(detections, img, model.names, output_image_path, mm_per_pixel, timings, layout)
+    out["timings"] = timings
+    return out
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--model", type=str, required=True)
@@ -64,6 +99,9 @@ if __name__ == "__main__":
     parser.add_argument("--out", type=str, default="out.jpg")
     parser.add_argument("--conf", type=float, default=0.25)
     parser.add_argument("--mmperpx", type=float, default=None)
+    parser.add_argument("--tile", type=int, default=None, help="tile size in px for sliced inference")
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--backend", type=str, default=None, help="pytorch, onnx, onnx-int8, openvino, openvino-int8")
     args = parser.parse_args()
 
     out = run_inference(
@@ -71,7 +109,10 @@ if __name__ == "__main__":
         image_path=args.image,
         output_image_path=args.out,
         conf_thresh=args.conf,
-        mm_per_pixel=args.mmperpx
+        mm_per_pixel=args.mmperpx,
+        tile_size=args.tile,
+        tile_overlap=args.overlap,
+        backend=args.backend
     )
 
     print(out)
@@ -0,0 +1,181 @@
+"""
+inference/detections.py
+Columnar detection results.
+
+`Detections` keeps one image's boxes as NumPy columns instead of one dict per
+box:
+    xyxy  (N, 4) float32  xmin, ymin, xmax, ymax
+    conf  (N,)   float32
+    cls   (N,)   int32
+Sizes, mm conversion, filtering, shifting (tiling) and summary statistics are
+whole-array operations, and the per-box dicts are only built when a caller
+asks for them.
+
+Output layouts:
+    records  list of {"xyxy", "class", "conf", "size_px", "size_mm"} dicts,
+             the original API shape (default everywhere)
+    columns  struct of arrays: {"xyxy": [[...], ...], "class": [...],
+             "conf": [...], "size_px": [...], "size_mm": [...] or None}
+    binary   like columns, but every column is {"dtype", "shape", "data"}
+             with the raw little-endian bytes (for msgpack responses);
+             decode with np.frombuffer(data, dtype).reshape(shape)
+
+Example usage:
+    dets = Detections.from_results(results[0])
+    dets = dets.filter(0.4)
+    dets.summary(mm_per_pixel=0.05)
+    dets.to_records(mm_per_pixel=0.05)     # or to_columns() / to_binary()
+    Detections.from_any(cached["detections"])   # records or columns
+"""
+
+import numpy as np
+
+LAYOUTS = ("records", "columns")
+
+
+class Detections:
+    __slots__ = ("xyxy", "conf", "cls")
+
+    def __init__(self, xyxy=None, conf=None, cls=None):
+        self.xyxy = np.asarray(xyxy if xyxy is not None else (), dtype=np.float32).reshape(-1, 4)
+        n = len(self.xyxy)
+        self.conf = np.asarray(conf if conf is not None else np.zeros(n), dtype=np.float32).reshape(-1)
+        self.cls = np.asarray(cls if cls is not None else np.zeros(n), dtype=np.int32).reshape(-1)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def __repr__(self):
+        return f"Detections(n={len(self)})"
+
+    # ------------------------------------------------------------------
+    # construction
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_results(cls, res):
+        """
+        From one ultralytics Results object (no per-box Python objects).
+        """
+        boxes = getattr(res, "boxes", None)
+        if boxes is None:
+            return cls()
+        return cls(boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy())
+
+    @classmethod
+    def from_records(cls, records):
+        if not records:
+            return cls()
+        return cls([d["xyxy"] for d in records], [d.get("conf", 0.0) for d in records],
+                   [d.get("class", 0) for d in records])
+
+    @classmethod
+    def from_columns(cls, columns):
+        return cls(columns.get("xyxy"), columns.get("conf"), columns.get("class"))
+
+    @classmethod
+    def from_any(cls, detections):
+        """
+        Accept a Detections, a records list or a columns dict.
+        """
+        if isinstance(detections, cls):
+            return detections
+        if isinstance(detections, dict):
+            return cls.from_columns(detections)
+        return cls.from_records(detections)
+
+    @classmethod
+    def concat(cls, parts):
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls()
+        return cls(np.concatenate([p.xyxy for p in parts]), np.concatenate([p.conf for p in parts]),
+                   np.concatenate([p.cls for p in parts]))
+
+    # ------------------------------------------------------------------
+    # array operations
+    # ------------------------------------------------------------------
+    def select(self, index):
+        return Detections(self.xyxy[index], self.conf[index], self.cls[index])
+
+    def filter(self, conf):
+        """
+        Keep detections with confidence >= conf.
+        """
+        return self.select(self.conf >= conf)
+
+    def shifted(self, dx, dy):
+        return Detections(self.xyxy + np.array([dx, dy, dx, dy], dtype=np.float32), self.conf, self.cls)
+
+    def sizes_px(self):
+        """
+        Mean of box width and height, the size proxy used everywhere.
+        """
+        xyxy = self.xyxy.astype(np.float64)  # float64 like the original per-box Python math
+        wh = np.abs(xyxy[:, 2:] - xyxy[:, :2])
+        return (wh[:, 0] + wh[:, 1]) / 2.0
+
+    def sizes_mm(self, mm_per_pixel=None):
+        return self.sizes_px() * mm_per_pixel if mm_per_pixel else None
+
+    def summary(self, mm_per_pixel=None, per_box=True):
+        """
+        count, mean_px, mean_mm and, with per_box, the sizes_px / sizes_mm
+        lists (sizes_mm entries are None without calibration).
+        """
+        px = self.sizes_px()
+        mm = self.sizes_mm(mm_per_pixel)
+        out = {"count": len(self)}
+        if per_box:
+            out["sizes_px"] = px.tolist()
+            out["sizes_mm"] = mm.tolist() if mm is not None else [None] * len(self)
+        out["mean_px"] = float(px.mean()) if len(self) else 0.0
+        out["mean_mm"] = float(mm.mean()) if mm is not None and len(self) else None
+        return out
+
+    # ------------------------------------------------------------------
+    # output layouts
+    # ------------------------------------------------------------------
+    def to_records(self, mm_per_pixel=None, sizes=True):
+        xyxy = self.xyxy.astype(np.float64).tolist()
+        cls = self.cls.tolist()
+        conf = self.conf.astype(np.float64).tolist()
+        if not sizes:
+            return [{"xyxy": b, "class": c, "conf": cf} for b, c, cf in zip(xyxy, cls, conf)]
+        px = self.sizes_px().tolist()
+        mm = self.sizes_mm(mm_per_pixel)
+        mm = mm.tolist() if mm is not None else [None] * len(self)
+        return [{"xyxy": b, "class": c, "conf": cf, "size_px": p, "size_mm": m}
+                for b, c, cf, p, m in zip(xyxy, cls, conf, px, mm)]
+
+    def to_columns(self, mm_per_pixel=None, sizes=True):
+        out = {
+            "xyxy": self.xyxy.astype(np.float64).tolist(),
+            "class": self.cls.tolist(),
+            "conf": self.conf.astype(np.float64).tolist(),
+        }
+        if sizes:
+            mm = self.sizes_mm(mm_per_pixel)
+            out["size_px"] = self.sizes_px().tolist()
+            out["size_mm"] = mm.tolist() if mm is not None else None
+        return out
+
+    def to_binary(self, mm_per_pixel=None):
+        cols = {"xyxy": self.xyxy, "class": self.cls, "conf": self.conf,
+                "size_px": self.sizes_px().astype(np.float32)}
+        mm = self.sizes_mm(mm_per_pixel)
+        if mm is not None:
+            cols["size_mm"] = mm.astype(np.float32)
+        return {name: _pack(arr) for name, arr in cols.items()}
+
+    def to_layout(self, layout, mm_per_pixel=None):
+        if layout == "records":
+            return self.to_records(mm_per_pixel)
+        if layout == "columns":
+            return self.to_columns(mm_per_pixel)
+        raise ValueError(f"unknown layout {layout!r}, expected one of {LAYOUTS}")
+
+
+def _pack(arr):
+    arr = np.ascontiguousarray(arr)
+    dtype = arr.dtype.newbyteorder("<")
+    return {"dtype": dtype.str, "shape": list(arr.shape), "data": arr.astype(dtype, copy=False).tobytes()}
@@ -0,0 +1,200 @@
+"""
+inference/metrics.py
+Lightweight stage timing and Prometheus text exposition.
+
+`span(stage)` times a block and adds it to that stage's histogram
+(fixed cumulative buckets, as Prometheus expects, plus a rolling window of
+the last `WINDOW` samples for recent p50/p95/p99). Passing a dict as
+`into` also stores the duration there as "<stage>_s", which is how the
+per-request breakdown in the /upload and /detect responses is built.
+
+Each stage has its own histogram and lock, so threads timing different
+stages never contend. A span costs two perf_counter calls and one
+uncontended lock: cheap enough to leave on in production (METRICS=0 turns
+the histograms off; `into` dicts are still filled).
+
+Counters and gauges that other components already keep (queue depths, cache
+hits, camera reconnects, ...) are not duplicated here: register a collector
+that reads them at scrape time.
+
+Example usage:
+    from backend.inference import metrics
+    with metrics.span("predict", into=timings):
+        model.predict(...)
+    metrics.observe("queue_wait", seconds)
+    metrics.inc("live_frames_total", source="esp32")
+    metrics.register_collector(lambda: [("queue_depth", "gauge", "Queued requests", 3, {})])
+    text = metrics.render()
+"""
+
+import bisect
+import collections
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "microplastic_"
+ENABLED = os.getenv("METRICS", "1") == "1"
+WINDOW = 1024
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS, window=WINDOW):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._recent = collections.deque(maxlen=window)
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+            self._recent.append(value)
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+            recent = sorted(self._recent)
+        cumulative, acc = [], 0
+        for c in counts:
+            acc += c
+            cumulative.append(acc)
+        quantiles = {}
+        if recent:
+            for q in QUANTILES:
+                quantiles[q] = recent[min(len(recent) - 1, int(q * len(recent)))]
+        return {"cumulative": cumulative, "sum": total, "count": count, "quantiles": quantiles}
+
+
+_registry_lock = threading.Lock()   # only taken when a new stage first appears
+_counter_lock = threading.Lock()
+_stages = {}
+_counters = {}
+_collectors = []
+
+
+def _histogram(stage):
+    h = _stages.get(stage)
+    if h is None:
+        with _registry_lock:
+            h = _stages.setdefault(stage, Histogram())
+    return h
+
+
+def observe(stage, seconds, into=None):
+    if into is not None:
+        into[f"{stage}_s"] = round(into.get(f"{stage}_s", 0.0) + seconds, 4)
+    if ENABLED:
+        _histogram(stage).observe(seconds)
+
+
+@contextmanager
+def span(stage, into=None):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - t0, into)
+
+
+def inc(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _counter_lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def register_collector(fn):
+    """
+    fn() returns an iterable of (name, type, help, value, labels) read at
+    scrape time; type is "gauge" or "counter".
+    """
+    _collectors.append(fn)
+    return fn
+
+
+def stage_stats():
+    """
+    Per-stage count, mean and recent quantiles in ms (JSON-friendly).
+    """
+    out = {}
+    for stage, h in sorted(_stages.items()):
+        snap = h.snapshot()
+        out[stage] = {
+            "count": snap["count"],
+            "mean_ms": round(snap["sum"] / snap["count"] * 1000.0, 3) if snap["count"] else 0.0,
+            **{f"p{int(q * 100)}_ms": round(v * 1000.0, 3) for q, v in snap["quantiles"].items()},
+        }
+    return out
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    name = PREFIX + "stage_seconds"
+    lines += [f"# HELP {name} Time spent per pipeline stage.", f"# TYPE {name} histogram"]
+    recent = []
+    for stage, h in sorted(_stages.items()):
+        snap = h.snapshot()
+        for le, c in zip(list(h.buckets) + ["+Inf"], snap["cumulative"]):
+            lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {c}')
+        lines.append(f'{name}_sum{{stage="{stage}"}} {snap["sum"]:.6f}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {snap["count"]}')
+        recent += [(stage, q, v) for q, v in snap["quantiles"].items()]
+    if recent:
+        rname = PREFIX + "stage_recent_seconds"
+        lines += [f"# HELP {rname} Stage time quantiles over the last {WINDOW} samples.", f"# TYPE {rname} gauge"]
+        lines += [f'{rname}{{stage="{s}",quantile="{q}"}} {v:.6f}' for s, q, v in recent]
+
+    with _counter_lock:
+        counters = sorted(_counters.items())
+    typed = set()
+    for (cname, labels), value in counters:
+        full = PREFIX + cname
+        if full not in typed:
+            lines.append(f"# TYPE {full} counter")
+            typed.add(full)
+        lines.append(f"{full}{_labels(dict(labels))} {_number(value)}")
+
+    # every sample of a metric has to be listed together, whichever collector reported it
+    families = {}
+    for fn in list(_collectors):
+        try:
+            samples = list(fn())
+        except Exception as e:
+            lines.append(f"# collector {getattr(fn, '__name__', fn)} failed: {_escape(e)}")
+            continue
+        for mname, mtype, mhelp, value, labels in samples:
+            if value is not None:
+                families.setdefault(PREFIX + mname, (mtype, mhelp, []))[2].append((labels, value))
+    for full, (mtype, mhelp, samples) in families.items():
+        if full not in typed:
+            lines += [f"# HELP {full} {mhelp}", f"# TYPE {full} {mtype}"]
+        lines += [f"{full}{_labels(labels)} {_number(value)}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
+
+
+def _number(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
@@ -0,0 +1,162 @@
+"""
+inference/model_registry.py
+Process-wide cache of loaded YOLO models.
+
+Models are keyed by the resolved weights path and reloaded automatically when
+the file's size or mtime changes (e.g. a new best.pt written by train.py), so
+callers can ask for a model on every request without paying the load cost
+again. For an export directory (OpenVINO) the files inside are checked, since
+re-exporting over them leaves the directory's own mtime unchanged.
+
+Besides PyTorch .pt weights, the exported CPU backends written by
+model/export.py (ONNX FP32/INT8, OpenVINO FP32/INT8) can be selected by name;
+they are looked up next to best.pt.
+
+Example usage:
+    from backend.inference.model_registry import get_model, warmup
+    warmup("runs/train/microplastic_experiment/weights/best.pt")
+    model = get_model("runs/train/microplastic_experiment/weights/best.pt")
+    model = get_model("runs/train/microplastic_experiment/weights/best.pt", backend="onnx-int8")
+"""
+
+import hashlib
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from ultralytics import YOLO
+
+# backend name -> file/dir name pattern relative to the .pt weights
+BACKENDS = {
+    "pytorch": "{stem}.pt",
+    "onnx": "{stem}.onnx",
+    "onnx-int8": "{stem}_int8.onnx",
+    "openvino": "{stem}_openvino_model",
+    "openvino-int8": "{stem}_int8_openvino_model",
+}
+
+_lock = threading.Lock()
+_entries = {}  # resolved path -> {"model", "stamp", "load_s", "warmup_s", "loaded_at", "loads"}
+
+
+def resolve_weights(model_path, backend=None):
+    """
+    Map the .pt weights path to the exported model for `backend`
+    (see BACKENDS). None or "pytorch" returns model_path unchanged.
+    """
+    if not backend or backend == "pytorch":
+        return Path(model_path)
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown model backend {backend!r}, expected one of {sorted(BACKENDS)}")
+    p = Path(model_path)
+    return p.with_name(BACKENDS[backend].format(stem=p.stem))
+
+
+def _key(model_path):
+    return str(Path(model_path).resolve())
+
+
+def _stamp(path):
+    """
+    (name, size, mtime_ns) of the weights file, or of every file in an export
+    directory (.xml, .bin, metadata.yaml); changes whenever any of them is rewritten.
+    """
+    p = Path(path)
+    if not p.is_dir():
+        st = p.stat()
+        return ((p.name, st.st_size, st.st_mtime_ns),)
+    stamp = []
+    for f in sorted(f for f in p.rglob("*") if f.is_file()):
+        st = f.stat()
+        stamp.append((str(f.relative_to(p)), st.st_size, st.st_mtime_ns))
+    return tuple(stamp)
+
+
+def get_model(model_path, backend=None):
+    """
+    Return the cached model for model_path (or its exported `backend`
+    variant), loading it on first use or when the weights file has changed on
+    disk since it was loaded.
+    """
+    key = _key(resolve_weights(model_path, backend))
+    stamp = _stamp(key)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry["stamp"] == stamp:
+            return entry["model"]
+
+        t0 = time.perf_counter()
+        # exported formats carry no task metadata ultralytics can always infer
+        model = YOLO(key) if key.endswith(".pt") else YOLO(key, task="detect")
+        load_s = time.perf_counter() - t0
+        _entries[key] = {
+            "model": model,
+            "stamp": stamp,
+            "load_s": load_s,
+            "warmup_s": None,
+            "loaded_at": time.time(),
+            "loads": (entry["loads"] + 1) if entry else 1,
+        }
+        print(f"[INFO] Loaded model {key} in {load_s:.3f}s")
+        return model
+
+
+def warmup(model_path, imgsz=640, backend=None):
+    """
+    Load the model (if needed) and run one dummy predict so that layer fusing
+    and backend initialisation happen before the first real request.
+    Returns the warmup duration in seconds.
+    """
+    model_path = resolve_weights(model_path, backend)
+    model = get_model(model_path)
+    dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    t0 = time.perf_counter()
+    model.predict(source=dummy, imgsz=imgsz, verbose=False)
+    warmup_s = time.perf_counter() - t0
+    with _lock:
+        entry = _entries.get(_key(model_path))
+        if entry is not None and entry["model"] is model:
+            entry["warmup_s"] = warmup_s
+    print(f"[INFO] Warmed up model {model_path} in {warmup_s:.3f}s")
+    return warmup_s
+
+
+def is_loaded(model_path, backend=None):
+    """
+    True if model_path is cached and its weights have not changed on disk.
+    """
+    key = _key(resolve_weights(model_path, backend))
+    p = Path(key)
+    with _lock:
+        entry = _entries.get(key)
+    return entry is not None and p.exists() and entry["stamp"] == _stamp(p)
+
+
+def fingerprint(model_path, backend=None):
+    """
+    Short id for a weights file or export directory (resolved path, size and
+    mtime of each file); changes whenever the weights are replaced, e.g. by a
+    new training run or a re-export.
+    """
+    p = Path(_key(resolve_weights(model_path, backend)))
+    return hashlib.sha1(f"{p}:{_stamp(p)}".encode()).hexdigest()[:16]
+
+
+def model_stats():
+    """
+    Return load/warmup timings for every cached model (without the model objects).
+    """
+    with _lock:
+        return {
+            key: {k: v for k, v in entry.items() if k != "model"}
+            for key, entry in _entries.items()
+        }
+
+
+def clear():
+    """
+    Drop all cached models.
+    """
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,160 @@
+"""
+inference/motion.py
+Motion gate in front of live detection.
+
+A static water sample does not need detection on every frame. The gate
+downsizes each frame to a small gray thumbnail, compares it with the
+thumbnail of the last frame that was actually detected and only re-runs
+detection when enough pixels changed or the last result is older than
+`max_staleness` seconds. Otherwise the previous result is reused. Comparing
+against the last *detected* frame (not the previous one) means slow drift
+still adds up and eventually triggers a new detection.
+
+The gate also keeps the counters shown in /esp32/stats: effective and
+detection fps, skipped frames and an estimate of the detection time saved.
+
+Example usage:
+    gate = MotionGate(threshold=0.2, max_staleness=2.0)
+    result, detected = gate.run(frame, detector.detect)
+    gate.stats()
+"""
+
+import collections
+import threading
+import time
+
+import cv2
+
+
+class MotionGate:
+    def __init__(self, threshold=0.2, max_staleness=2.0, width=160, pixel_delta=15, fps_window=50):
+        """
+        threshold: percent of thumbnail pixels that must change (by more than
+                   pixel_delta gray levels) to re-run detection. <= 0 detects
+                   every frame.
+        max_staleness: seconds after which detection runs even without motion.
+        width: thumbnail width; height keeps the frame's aspect ratio.
+        """
+        self.threshold = threshold
+        self.max_staleness = max_staleness
+        self.width = width
+        self.pixel_delta = pixel_delta
+        self._shape = None
+        self._result = None
+        self._detected_at = 0.0
+        self._lock = threading.Lock()
+        self._frame_times = collections.deque(maxlen=fps_window)
+        self._detect_times = collections.deque(maxlen=fps_window)
+        self._stats = {
+            "frames": 0,
+            "detections": 0,
+            "skipped": 0,
+            "last_score": 0.0,
+            "last_reason": None,
+            "detect_ms_total": 0.0,
+            "gate_ms_total": 0.0,
+        }
+
+    def _ensure_buffers(self, shape):
+        if self._shape == shape:
+            return
+        h, w = shape
+        tw = min(self.width, w)
+        th = max(1, round(h * tw / w))
+        self._size = (tw, th)
+        self._small = None
+        self._gray = None
+        self._ref = None
+        self._diff = None
+        self._mask = None
+        self._result = None  # frame size changed: old boxes do not apply
+        self._shape = shape
+
+    def _thumbnail(self, frame):
+        self._small = cv2.resize(frame, self._size, dst=self._small, interpolation=cv2.INTER_AREA)
+        if self._small.ndim == 3:
+            self._gray = cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+            return self._gray
+        return self._small
+
+    def score(self, thumb):
+        """
+        Percent of thumbnail pixels that differ from the reference by more
+        than pixel_delta.
+        """
+        self._diff = cv2.absdiff(thumb, self._ref, dst=self._diff)
+        _, self._mask = cv2.threshold(self._diff, self.pixel_delta, 255, cv2.THRESH_BINARY, dst=self._mask)
+        return cv2.countNonZero(self._mask) * 100.0 / self._mask.size
+
+    def run(self, frame, detect):
+        """
+        Return (result, detected): detect(frame) when the gate opens,
+        otherwise the last result.
+        """
+        t0 = time.perf_counter()
+        now = time.time()
+        self._ensure_buffers(frame.shape[:2])
+        thumb = self._thumbnail(frame)
+        score = 0.0
+        if self._result is None:
+            reason = "first"
+        elif self.threshold <= 0:
+            reason = "always"
+        elif now - self._detected_at >= self.max_staleness:
+            reason = "stale"
+        else:
+            score = self.score(thumb)
+            reason = "motion" if score > self.threshold else None
+        gate_ms = (time.perf_counter() - t0) * 1000.0
+
+        detect_ms = 0.0
+        if reason is not None:
+            t1 = time.perf_counter()
+            self._result = detect(frame)
+            detect_ms = (time.perf_counter() - t1) * 1000.0
+            self._ref = thumb.copy()
+            self._detected_at = now
+
+        with self._lock:
+            self._frame_times.append(now)
+            self._stats["frames"] += 1
+            self._stats["gate_ms_total"] += gate_ms
+            self._stats["last_score"] = round(score, 3)
+            if reason is None:
+                self._stats["skipped"] += 1
+            else:
+                self._detect_times.append(now)
+                self._stats["detections"] += 1
+                self._stats["detect_ms_total"] += detect_ms
+                self._stats["last_reason"] = reason
+        return self._result, reason is not None
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            frame_times = list(self._frame_times)
+            detect_times = list(self._detect_times)
+        detections = out["detections"]
+        detect_ms_avg = out["detect_ms_total"] / detections if detections else 0.0
+        # frames that reused a result would have cost one average detection each
+        saved_ms = out["skipped"] * detect_ms_avg
+        spent_ms = out["detect_ms_total"] + out["gate_ms_total"]
+        out.update({
+            "threshold": self.threshold,
+            "max_staleness_s": self.max_staleness,
+            "fps": _rate(frame_times),
+            "detect_fps": _rate(detect_times),
+            "skip_ratio": round(out["skipped"] / out["frames"], 3) if out["frames"] else 0.0,
+            "detect_ms_avg": round(detect_ms_avg, 2),
+            "gate_ms_avg": round(out["gate_ms_total"] / out["frames"], 3) if out["frames"] else 0.0,
+            "cpu_saved_percent": round(saved_ms * 100.0 / (saved_ms + spent_ms), 1) if saved_ms + spent_ms else 0.0,
+        })
+        out["detect_ms_total"] = round(out["detect_ms_total"], 1)
+        out["gate_ms_total"] = round(out["gate_ms_total"], 1)
+        return out
+
+
+def _rate(times):
+    if len(times) < 2 or times[-1] <= times[0]:
+        return 0.0
+    return round((len(times) - 1) / (times[-1] - times[0]), 2)
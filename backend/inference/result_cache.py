@@ -0,0 +1,212 @@
+"""
+inference/result_cache.py
+Content-addressed cache for detection results.
+
+Keys are built from the image content hash, the model fingerprint and the
+inference parameters, so the same image re-submitted under any filename is
+served without running the model. Entries live in an in-memory LRU bounded by
+total JSON size, in front of a JSON-file store on disk that survives restarts.
+The disk store has its own byte budget: when a put takes it over, the least
+recently used files (by mtime; disk hits touch it) are deleted down to 90%.
+
+Raw detections are stored at a low confidence floor; a request at any conf at
+or above that floor is answered by filtering the cached boxes instead of
+running predict again. New entries hold the columns layout (see
+inference/detections.py); entries written as per-box records still load.
+
+Example usage:
+    cache = ResultCache("cache/results", max_bytes=64 * 1024 * 1024, max_disk_bytes=1024 * 1024 * 1024)
+    key = make_key(image_sha256, model_fingerprint, iou=0.45)
+    entry = cache.get(key)
+    if entry is None:
+        cache.put(key, {"base_conf": 0.1, "detections": detections})
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from backend.inference.detections import Detections
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(image_hash, model_fingerprint, **params):
+    """
+    Stable cache key for an image + model + parameter combination.
+    """
+    blob = json.dumps([image_hash, model_fingerprint, sorted(params.items())], default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def filter_detections(detections, conf):
+    """
+    Keep detections with confidence >= conf, as Detections (new arrays, so
+    cached entries stay untouched). Accepts records or columns.
+    """
+    return Detections.from_any(detections).filter(conf)
+
+
+DISK_TRIM_TO = 0.9
+
+
+class ResultCache:
+    def __init__(self, cache_dir=None, max_bytes=64 * 1024 * 1024, max_disk_bytes=None):
+        """
+        cache_dir: directory for the on-disk store, or None for memory only.
+        max_bytes: budget for the in-memory layer (sum of serialized sizes).
+        max_disk_bytes: budget for the on-disk store, None for unbounded.
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._trim_lock = threading.Lock()
+        self._mem = OrderedDict()   # key -> (value, size)
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._stats = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "evictions": 0, "puts": 0,
+                       "disk_evictions": 0}
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_files())
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                self._mem.move_to_end(key)
+                self._stats["hits_memory"] += 1
+                return hit[0]
+
+        if self.cache_dir:
+            p = self._path(key)
+            try:
+                raw = p.read_bytes()
+                value = json.loads(raw)
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                try:
+                    os.utime(p)   # recently used: trimmed last
+                except OSError:
+                    pass
+                with self._lock:
+                    self._stats["hits_disk"] += 1
+                    self._insert(key, value, len(raw))
+                return value
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key, value):
+        raw = json.dumps(value).encode()
+        if self.cache_dir:
+            p = self._path(key)
+            p.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                replaced = p.stat().st_size
+            except OSError:
+                replaced = 0
+            # write-then-rename so readers never see a half-written file
+            tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(raw)
+            os.replace(tmp, p)
+            with self._lock:
+                self._disk_bytes += len(raw) - replaced
+                over = self.max_disk_bytes is not None and self._disk_bytes > self.max_disk_bytes
+            if over:
+                self._trim_disk()
+        with self._lock:
+            self._stats["puts"] += 1
+            # a copy of what went to disk: the caller may keep mutating `value`
+            self._insert(key, json.loads(raw), len(raw))
+
+    def _disk_files(self):
+        out = []
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for f in os.scandir(sub.path):
+                if f.name.endswith(".json"):
+                    try:
+                        st = f.stat()
+                    except OSError:
+                        continue   # removed by another worker meanwhile
+                    out.append((st.st_mtime, f.path, st.st_size))
+        return out
+
+    def _trim_disk(self):
+        """
+        Delete the least recently used files until the store is at
+        DISK_TRIM_TO of its budget. Rescans, so files written by other
+        worker processes count too.
+        """
+        if not self._trim_lock.acquire(blocking=False):
+            return   # another thread is already trimming
+        try:
+            files = sorted(self._disk_files())
+            total = sum(size for _, _, size in files)
+            target = self.max_disk_bytes * DISK_TRIM_TO
+            evicted = 0
+            for _, path, size in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                evicted += 1
+            with self._lock:
+                self._disk_bytes = total
+                self._stats["disk_evictions"] += evicted
+        finally:
+            self._trim_lock.release()
+
+    def _insert(self, key, value, size):
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        if size > self.max_bytes:
+            return
+        self._mem[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._mem:
+            _, (_, evicted) = self._mem.popitem(last=False)
+            self._bytes -= evicted
+            self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._mem)
+            out["bytes"] = self._bytes
+            out["disk_bytes"] = self._disk_bytes
+        out["max_bytes"] = self.max_bytes
+        out["max_disk_bytes"] = self.max_disk_bytes
+        hits = out["hits_memory"] + out["hits_disk"]
+        out["hit_rate"] = round(hits / (hits + out["misses"]), 4) if hits + out["misses"] else 0.0
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self._bytes = 0
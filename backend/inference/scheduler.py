@@ -0,0 +1,278 @@
+"""
+inference/scheduler.py
+Micro-batching inference scheduler.
+
+A single background worker pulls pending requests from a bounded queue, groups
+them into batches (up to `max_batch_size` images, waiting at most `max_wait_ms`
+for a batch to fill) and runs one batched `model.predict` per group. Every
+caller gets its own result through a concurrent.futures.Future.
+
+Example usage:
+    scheduler = InferenceScheduler(MODEL_PATH, max_batch_size=8, max_wait_ms=10)
+    scheduler.start()
+    fut = scheduler.submit("uploads/input.jpg", "results/annotated_input.jpg", mm_per_pixel=0.05)
+    result = fut.result()   # same dict as run_inference
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+from backend.inference import metrics
+from backend.inference.detect import build_result
+from backend.inference.detections import Detections
+from backend.inference.model_registry import get_model
+from backend.inference.tiling import predict_tiled
+
+
+def _load(item):
+    if isinstance(item["image_path"], np.ndarray):
+        return item["image_path"]
+    with metrics.span("imread", into=item["timings"]):
+        return cv2.imread(item["image_path"])
+
+
+class QueueFullError(Exception):
+    """Raised by submit() when the scheduler queue is at capacity."""
+
+
+class SchedulerStoppedError(RuntimeError):
+    """Raised by submit() after stop(), and set on requests still queued at stop()."""
+
+
+class InferenceScheduler:
+    def __init__(self, model_path, max_batch_size=8, max_wait_ms=10, max_queue=64, executor=None):
+        """
+        executor: optional concurrent.futures executor used to decode the
+        batch's images and to annotate/write results in parallel; without it
+        that work runs on the scheduler thread.
+        """
+        self.model_path = model_path
+        self.executor = executor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, max_wait_ms / 1000.0)
+        self.max_queue = max_queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._running = False
+        self._stopped = False
+        self._submit_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "batch_size_hist": {},
+        }
+
+    # ------------------------------------------------------------------
+    # lifecycle
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._running:
+            return
+        with self._submit_lock:
+            self._stopped = False
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, name="inference-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """
+        Stop the worker after its current batch. Requests still queued fail
+        with SchedulerStoppedError, so no caller waits forever.
+        """
+        with self._submit_lock:
+            self._stopped = True
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        pending = []
+        while True:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._fail(pending, SchedulerStoppedError("inference scheduler stopped"))
+
+    # ------------------------------------------------------------------
+    # public API
+    # ------------------------------------------------------------------
+    def submit(self, image_path, output_image_path=None, conf_thresh=0.25, iou=0.45, mm_per_pixel=None,
+               tile_size=None, tile_overlap=0.2, tile_batch=8, filter_conf=None, layout="records"):
+        """
+        Queue one image (a file path, or an already decoded BGR ndarray such
+        as a camera frame) for detection. Returns a Future resolving to the
+        run_inference-style result dict. Raises QueueFullError when the queue
+        is full so the caller can apply backpressure, SchedulerStoppedError
+        after stop(). Tiled requests
+        (tile_size set) are predicted one image at a time, batching its tiles.
+        With filter_conf, predict runs at conf_thresh but the result only keeps
+        boxes >= filter_conf; the unfiltered boxes are returned as
+        result["raw_detections"] in the columns layout (used by the result
+        cache). `layout` selects the shape of result["detections"].
+        """
+        fut = Future()
+        item = {
+            "image_path": image_path if isinstance(image_path, np.ndarray) else str(image_path),
+            "output_image_path": output_image_path,
+            "conf": conf_thresh,
+            "iou": iou,
+            "mm_per_pixel": mm_per_pixel,
+            "tiling": (tile_size, tile_overlap, tile_batch) if tile_size else None,
+            "filter_conf": filter_conf,
+            "layout": layout,
+            "future": fut,
+            "enqueued": time.perf_counter(),
+        }
+        # stop() drains the queue under the same lock, so nothing is queued after the drain
+        with self._submit_lock:
+            if self._stopped:
+                raise SchedulerStoppedError("inference scheduler stopped")
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                with self._stats_lock:
+                    self._stats["rejected"] += 1
+                raise QueueFullError(f"inference queue full ({self.max_queue})")
+        with self._stats_lock:
+            self._stats["submitted"] += 1
+        return fut
+
+    def stats(self):
+        with self._stats_lock:
+            out = dict(self._stats)
+            out["batch_size_hist"] = dict(self._stats["batch_size_hist"])
+        out["queue_depth"] = self._queue.qsize()
+        out["max_queue"] = self.max_queue
+        out["max_batch_size"] = self.max_batch_size
+        out["max_wait_ms"] = self.max_wait_s * 1000.0
+        out["mean_batch_size"] = round(out["completed"] / out["batches"], 2) if out["batches"] else 0.0
+        return out
+
+    # ------------------------------------------------------------------
+    # worker
+    # ------------------------------------------------------------------
+    def _collect_batch(self):
+        try:
+            first = self._queue.get(timeout=0.2)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while self._running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            # predict() takes one conf/iou per call, so split by parameters
+            groups = {}
+            for item in batch:
+                groups.setdefault((item["conf"], item["iou"], item["tiling"]), []).append(item)
+            for (conf, iou, tiling), items in groups.items():
+                # anything escaping _run_group (e.g. a shut-down executor) fails its
+                # requests instead of killing the only worker thread
+                try:
+                    self._run_group(items, conf, iou, tiling)
+                except Exception as e:
+                    self._fail(items, e)
+
+    def _run_group(self, items, conf, iou, tiling=None):
+        try:
+            model = get_model(self.model_path)
+        except Exception as e:
+            self._fail(items, e)
+            return
+
+        started = time.perf_counter()
+        for item in items:
+            item["timings"] = {"load_s": 0.0, "queue_s": round(started - item["enqueued"], 4)}
+            metrics.observe("queue_wait", started - item["enqueued"])
+        decoded = list(self.executor.map(_load, items)) if self.executor else [_load(item) for item in items]
+        images, ready = [], []
+        for item, img in zip(items, decoded):
+            if img is None:
+                self._fail([item], FileNotFoundError(f"could not read image {item['image_path']}"))
+                continue
+            images.append(img)
+            ready.append(item)
+        if not ready:
+            return
+
+        try:
+            t0 = time.perf_counter()
+            if tiling:
+                tile_size, tile_overlap, tile_batch = tiling
+                results = [predict_tiled(model, img, tile_size, tile_overlap, tile_batch, conf, iou)
+                           for img in images]
+            else:
+                results = [Detections.from_results(res) for res in
+                           model.predict(source=images, conf=conf, iou=iou, max_det=300, verbose=False)]
+            predict_s = time.perf_counter() - t0
+            metrics.observe("predict", predict_s)
+        except Exception as e:
+            self._fail(ready, e)
+            return
+
+        with self._stats_lock:
+            self._stats["batches"] += 1
+            self._stats["last_batch_size"] = len(ready)
+            hist = self._stats["batch_size_hist"]
+            hist[len(ready)] = hist.get(len(ready), 0) + 1
+
+        for item, img, detections in zip(ready, images, results):
+            timings = item["timings"]
+            timings["predict_s"] = round(predict_s, 4)
+            timings["batch_size"] = len(ready)
+            if self.executor:
+                self.executor.submit(self._finish, item, img, detections, model.names, timings)
+            else:
+                self._finish(item, img, detections, model.names, timings)
+
+    def _finish(self, item, img, detections, class_names, timings):
+        try:
+            raw = None
+            if item["filter_conf"] is not None:
+                raw = detections
+                detections = detections.filter(item["filter_conf"])
+            out = build_result(detections, img, class_names,
+                               item["output_image_path"], item["mm_per_pixel"], timings, item["layout"])
+            out["timings"] = timings
+            if raw is not None:
+                out["raw_detections"] = raw.to_columns(sizes=False)
+        except Exception as e:
+            self._fail([item], e)
+            return
+        if item["future"].done():
+            return   # already failed by _worker or stop()
+        with self._stats_lock:
+            self._stats["completed"] += 1
+        item["future"].set_result(out)
+
+    def _fail(self, items, exc):
+        failed = 0
+        for item in items:
+            if not item["future"].done():
+                item["future"].set_exception(exc)
+                failed += 1
+        with self._stats_lock:
+            self._stats["failed"] += failed
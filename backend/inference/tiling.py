@@ -0,0 +1,102 @@
+"""
+inference/tiling.py
+Sliced (tiled) inference for large microscope images.
+
+Particles are ~20-30 px in the training images, so sending a multi-megapixel
+capture to YOLO at imgsz=640 shrinks them below what the model can see. Here
+the image is cut into overlapping tiles, all tiles are predicted in batches,
+boxes are shifted back to full-image coordinates and duplicates along tile
+seams are merged with NMS.
+
+Example usage:
+    from backend.inference.tiling import predict_tiled
+    detections = predict_tiled(model, img, tile_size=640, overlap=0.2, batch_size=8)
+"""
+
+import numpy as np
+
+from backend.inference.detections import Detections
+
+
+def tile_origins(length, tile, stride):
+    """
+    Start offsets along one axis so tiles of `tile` px cover [0, length);
+    the last tile is aligned to the end instead of running past it.
+    """
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def make_tiles(height, width, tile_size=640, overlap=0.2):
+    """
+    Return an (N, 4) int array of x0, y0, x1, y1 tile windows.
+    """
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+    ys = tile_origins(height, tile_size, stride)
+    xs = tile_origins(width, tile_size, stride)
+    tiles = [(x, y, min(x + tile_size, width), min(y + tile_size, height)) for y in ys for x in xs]
+    return np.array(tiles, dtype=np.int32)
+
+
+def nms(boxes, scores, iou_thresh=0.5):
+    """
+    Greedy NMS. boxes: (N, 4) xyxy, scores: (N,). Returns kept indices,
+    highest score first.
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.maximum(0, x2 - x1) * np.maximum(0, y2 - y1)
+    order = np.argsort(-scores)
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.maximum(0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        h = np.maximum(0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = w * h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_thresh]
+    return np.array(keep, dtype=np.int64)
+
+
+def merge_detections(detections, iou_thresh=0.5):
+    """
+    Class-aware NMS over Detections gathered from all tiles.
+    """
+    if not len(detections):
+        return detections
+    boxes = detections.xyxy
+    # offset each class into its own coordinate range so one NMS pass is class-aware
+    offset = detections.cls[:, None].astype(np.float32) * (boxes.max() + 1.0)
+    return detections.select(nms(boxes + offset, detections.conf, iou_thresh))
+
+
+def predict_tiled(model, img, tile_size=640, overlap=0.2, batch_size=8, conf_thresh=0.25, iou=0.45,
+                  merge_iou=0.5, imgsz=None):
+    """
+    Run `model` over overlapping tiles of `img` (BGR) and return Detections
+    in full-image coordinates. Images that fit in one tile take a single
+    predict call.
+    """
+    h, w = img.shape[:2]
+    tiles = make_tiles(h, w, tile_size, overlap)
+    imgsz = imgsz or tile_size
+
+    parts = []
+    for start in range(0, len(tiles), batch_size):
+        window = tiles[start:start + batch_size]
+        # slices are views, no copy of the full image per tile
+        crops = [img[y0:y1, x0:x1] for x0, y0, x1, y1 in window]
+        results = model.predict(source=crops, conf=conf_thresh, iou=iou, imgsz=imgsz, max_det=300, verbose=False)
+        for (x0, y0, _, _), res in zip(window, results):
+            parts.append(Detections.from_results(res).shifted(x0, y0))
+
+    detections = Detections.concat(parts)
+    if len(tiles) == 1:
+        return detections
+    return merge_detections(detections, merge_iou)
@@ -0,0 +1,285 @@
+"""
+inference/tracker.py
+Lightweight multi-object tracker for particles in the live feeds.
+
+Per-frame counts flicker, and a particle drifting through the sample is
+counted again on every frame. The tracker links each frame's boxes to
+tracks, which gives stable IDs, a steady "particles in view" count, a
+cumulative count of unique particles and a smoothed size per particle.
+
+All track state lives in NumPy arrays: a constant-velocity Kalman filter on
+the box centre (batched predict/update over every track at once) and an
+exponential average of the box size. Association builds one IoU and one
+centre-distance cost for the nearby track/detection pairs only (found with a
+sorted sweep), and matches them greedily in a few vectorized rounds, so the
+cost per frame follows the number of nearby pairs rather than tracks times
+detections. Small particles that move more than their own size between frames
+still match through the distance gate. A track counts as a unique particle
+once it was seen on `min_hits` frames, and is dropped after `max_age` frames
+without a match.
+
+Example usage:
+    tracker = ParticleTracker(mm_per_pixel=0.05)
+    tracks = tracker.update(result["boxes"])   # (N, 4) x, y, w, h per frame
+    tracks["ids"], tracks["sizes_mm"]
+    tracker.unique_count, tracker.active_count
+"""
+
+import threading
+
+import numpy as np
+
+# constant-velocity model on the centre: state [cx, cy, vx, vy], one frame per step
+F = np.array([[1, 0, 1, 0],
+              [0, 1, 0, 1],
+              [0, 0, 1, 0],
+              [0, 0, 0, 1]], dtype=np.float64)
+
+
+def pair_iou(a, b):
+    """
+    IoU of aligned (K, 4) x, y, w, h box arrays -> (K,).
+    """
+    x1 = np.maximum(a[:, 0], b[:, 0])
+    y1 = np.maximum(a[:, 1], b[:, 1])
+    x2 = np.minimum(a[:, 0] + a[:, 2], b[:, 0] + b[:, 2])
+    y2 = np.minimum(a[:, 1] + a[:, 3], b[:, 1] + b[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    union = a[:, 2] * a[:, 3] + b[:, 2] * b[:, 3] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def candidate_pairs(a, b, radius):
+    """
+    All (i, j) with a[i] and b[j] (centres, (N, 2) / (M, 2)) within `radius`
+    on both axes. A sweep over b sorted by x finds each row's window, so the
+    cost follows the number of nearby pairs instead of N * M.
+    """
+    order = np.argsort(b[:, 0], kind="stable")
+    bx = b[order, 0]
+    lo = np.searchsorted(bx, a[:, 0] - radius, side="left")
+    hi = np.searchsorted(bx, a[:, 0] + radius, side="right")
+    counts = hi - lo
+    rows = np.repeat(np.arange(len(a)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cols = order[np.repeat(lo, counts) + offsets]
+    near = np.abs(a[rows, 1] - b[cols, 1]) <= radius
+    return rows[near], cols[near]
+
+
+def greedy_match(rows, cols, cost):
+    """
+    Greedy one-to-one matching over candidate pairs by increasing cost.
+    Every pair that is the cheapest left for both its row and its column is
+    one greedy would pick, so each round accepts all of them at once.
+    Returns (rows, cols) index arrays.
+    """
+    order = np.argsort(cost, kind="stable")
+    rows, cols = rows[order], cols[order]
+    out_r, out_c = [], []
+    while len(rows):
+        first_r = np.zeros(len(rows), dtype=bool)
+        first_r[np.unique(rows, return_index=True)[1]] = True
+        first_c = np.zeros(len(rows), dtype=bool)
+        first_c[np.unique(cols, return_index=True)[1]] = True
+        take = first_r & first_c
+        out_r.append(rows[take])
+        out_c.append(cols[take])
+        keep = ~np.isin(rows, rows[take]) & ~np.isin(cols, cols[take])
+        rows, cols = rows[keep], cols[keep]
+    if not out_r:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    return np.concatenate(out_r), np.concatenate(out_c)
+
+
+class ParticleTracker:
+    def __init__(self, mm_per_pixel=None, iou_thresh=0.1, max_distance=15.0, max_age=5, min_hits=3,
+                 process_noise=1.0, measurement_noise=2.0, size_smoothing=0.3):
+        """
+        iou_thresh: minimum IoU between a predicted track box and a detection.
+        max_distance: pairs with lower IoU still match when their centres are
+                      within this many pixels (small, fast particles).
+        max_age: frames a track survives without a match.
+        min_hits: matched frames before a track counts as a unique particle.
+        size_smoothing: weight of the newest box in the size average.
+        """
+        self.mm_per_pixel = mm_per_pixel
+        self.iou_thresh = iou_thresh
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.size_smoothing = size_smoothing
+        self._Q = np.diag([0.25, 0.25, 1.0, 1.0]) * process_noise
+        self._R = np.eye(2) * measurement_noise
+        self._P0 = np.diag([measurement_noise, measurement_noise, 25.0, 25.0])
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._ids = np.empty(0, dtype=np.int64)
+        self._x = np.empty((0, 4))
+        self._P = np.empty((0, 4, 4))
+        self._wh = np.empty((0, 2))
+        self._hits = np.empty(0, dtype=np.int32)
+        self._misses = np.empty(0, dtype=np.int32)
+        self._confirmed = np.empty(0, dtype=bool)
+        self._next_id = 1
+        self.unique_count = 0
+        self.frames = 0
+
+    @property
+    def active_count(self):
+        """
+        Confirmed particles currently tracked (including ones briefly missed).
+        """
+        return int(self._confirmed.sum())
+
+    # ------------------------------------------------------------------
+    # per frame
+    # ------------------------------------------------------------------
+    def update(self, boxes):
+        """
+        Advance one frame with this frame's (N, 4) x, y, w, h boxes.
+        Returns the confirmed tracks matched on this frame:
+            ids       - (K,) int64 track ids
+            boxes     - (K, 4) int32 x, y, w, h (filtered centre, smoothed size)
+            sizes_px  - (K,) float32 smoothed mean of w and h
+            sizes_mm  - (K,) float32, or None without calibration
+            hits      - (K,) int32 frames each track was matched on
+        """
+        det = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        det_c = det[:, :2] + det[:, 2:] / 2.0
+        with self._lock:
+            self.frames += 1
+            self._predict()
+            rows, cols = self._associate(det, det_c)
+            self._correct(rows, det_c[cols], det[cols, 2:])
+
+            missed = np.ones(len(self._ids), dtype=bool)
+            missed[rows] = False
+            self._misses[missed] += 1
+
+            new = np.ones(len(det), dtype=bool)
+            new[cols] = False
+            matched_ids = self._ids[rows]
+            self._spawn(det_c[new], det[new, 2:])
+            self._prune()
+
+            visible = np.isin(self._ids, matched_ids) & self._confirmed
+            return self._tracks(visible)
+
+    def _predict(self):
+        if not len(self._ids):
+            return
+        self._x = self._x @ F.T
+        self._P = F @ self._P @ F.T + self._Q
+
+    def _associate(self, det, det_c):
+        if not len(self._ids) or not len(det):
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        # boxes can only overlap when their centres are within half their summed sizes
+        radius = max(self.max_distance, (self._wh.max() + det[:, 2:].max()) / 2.0)
+        rows, cols = candidate_pairs(self._x[:, :2], det_c, radius)
+        pred = np.concatenate([self._x[rows, :2] - self._wh[rows] / 2.0, self._wh[rows]], axis=1)
+        iou = pair_iou(pred, det[cols])
+        dist = np.sqrt(((self._x[rows, :2] - det_c[cols]) ** 2).sum(axis=1))
+        # IoU matches rank first (cost < 1), distance-only matches after (cost in [1, 2])
+        by_iou = iou >= self.iou_thresh
+        ok = by_iou | (dist <= self.max_distance)
+        cost = np.where(by_iou, 1.0 - iou, 1.0 + dist / self.max_distance)
+        return greedy_match(rows[ok], cols[ok], cost[ok])
+
+    def _correct(self, rows, z, wh):
+        if not len(rows):
+            return
+        x, P = self._x[rows], self._P[rows]
+        S = P[:, :2, :2] + self._R
+        K = P[:, :, :2] @ np.linalg.inv(S)                       # (k, 4, 2)
+        x = x + (K @ (z - x[:, :2])[:, :, None])[:, :, 0]
+        P = P - K @ P[:, :2, :]
+        self._x[rows], self._P[rows] = x, P
+        a = self.size_smoothing
+        self._wh[rows] = (1.0 - a) * self._wh[rows] + a * wh
+        self._hits[rows] += 1
+        self._misses[rows] = 0
+        promoted = (self._hits >= self.min_hits) & ~self._confirmed
+        self.unique_count += int(promoted.sum())
+        self._confirmed |= promoted
+
+    def _spawn(self, centres, wh):
+        n = len(centres)
+        if not n:
+            return
+        ids = np.arange(self._next_id, self._next_id + n, dtype=np.int64)
+        self._next_id += n
+        x = np.zeros((n, 4))
+        x[:, :2] = centres
+        confirmed = np.full(n, self.min_hits <= 1)
+        self.unique_count += int(confirmed.sum())
+        self._ids = np.concatenate([self._ids, ids])
+        self._x = np.concatenate([self._x, x])
+        self._P = np.concatenate([self._P, np.broadcast_to(self._P0, (n, 4, 4))])
+        self._wh = np.concatenate([self._wh, wh])
+        self._hits = np.concatenate([self._hits, np.ones(n, dtype=np.int32)])
+        self._misses = np.concatenate([self._misses, np.zeros(n, dtype=np.int32)])
+        self._confirmed = np.concatenate([self._confirmed, confirmed])
+
+    def _prune(self):
+        keep = self._misses <= self.max_age
+        # tentative tracks get no grace period: one miss and they are noise
+        keep &= self._confirmed | (self._misses == 0)
+        if keep.all():
+            return
+        self._ids, self._x, self._P = self._ids[keep], self._x[keep], self._P[keep]
+        self._wh, self._hits = self._wh[keep], self._hits[keep]
+        self._misses, self._confirmed = self._misses[keep], self._confirmed[keep]
+
+    def _tracks(self, mask):
+        wh = self._wh[mask]
+        xy = self._x[mask, :2] - wh / 2.0
+        sizes_px = wh.mean(axis=1).astype(np.float32)
+        return {
+            "ids": self._ids[mask],
+            "boxes": np.round(np.concatenate([xy, wh], axis=1)).astype(np.int32),
+            "sizes_px": sizes_px,
+            "sizes_mm": sizes_px * self.mm_per_pixel if self.mm_per_pixel else None,
+            "hits": self._hits[mask],
+        }
+
+    # ------------------------------------------------------------------
+    # reporting
+    # ------------------------------------------------------------------
+    def snapshot(self, limit=None):
+        """
+        Confirmed tracks as JSON-friendly dicts, longest-lived first.
+        """
+        with self._lock:
+            tracks = self._tracks(self._confirmed)
+            misses = self._misses[self._confirmed]
+        order = np.argsort(-tracks["hits"], kind="stable")[:limit]
+        sizes_mm = tracks["sizes_mm"]
+        return [
+            {
+                "id": int(tracks["ids"][i]),
+                "box": tracks["boxes"][i].tolist(),
+                "size_px": round(float(tracks["sizes_px"][i]), 2),
+                "size_mm": round(float(sizes_mm[i]), 3) if sizes_mm is not None else None,
+                "hits": int(tracks["hits"][i]),
+                "missed": int(misses[i]),
+            }
+            for i in order.tolist()
+        ]
+
+    def stats(self):
+        with self._lock:
+            sizes = self._wh[self._confirmed].mean(axis=1) if self._confirmed.any() else None
+            out = {
+                "frames": self.frames,
+                "active": self.active_count,
+                "tentative": int((~self._confirmed).sum()),
+                "unique": self.unique_count,
+            }
+        out["mean_size_px"] = round(float(sizes.mean()), 2) if sizes is not None else 0.0
+        if self.mm_per_pixel:
+            out["mean_size_mm"] = round(out["mean_size_px"] * self.mm_per_pixel, 3)
+        return out
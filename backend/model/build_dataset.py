@@ -0,0 +1,249 @@
+"""
+build_dataset.py
+Offline training-set build: overlapping tiles with clipped YOLO labels, plus a
+pre-decoded image cache.
+
+Particles are a few pixels wide, so training on whole images either needs a
+large imgsz or loses them when the image is scaled down. The builder slices
+every image into tile_size x tile_size tiles on the same grid as sliced
+inference (backend/inference/tiling.py), so the model trains at the
+resolution it will later see. Tiles smaller than tile_size (image edges,
+small images) are padded with gray (114) at the bottom/right; nothing is
+resized.
+
+Labels are clipped to each tile. A box is kept when at least
+`min_visibility` of its area is inside the tile (the overlap makes sure the
+others are whole in a neighbouring tile). Train tiles that contain
+particles can be listed `oversample` times in train.txt.
+
+The cache is one uint8 array per split (`images.npy`, N x T x T x 3, opened
+with np.load(mmap_mode="r")) holding the decoded tiles in the order of
+`images.index.json`. Loading a training sample then costs a page-cache
+memcpy instead of a JPEG decode (see train.py --cache mmap).
+
+Output layout (default: <data path>_tiles<T>/):
+    dataset.yaml            train: train.txt, val: valid/images
+    train.txt               train tile paths, positives repeated `oversample` times
+    <split>/images/*.jpg    tiles named <stem>_x<x0>_y<y0>.jpg
+    <split>/labels/*.txt
+    <split>/images.npy      decoded tiles (with --cache)
+    <split>/images.index.json
+    build.json              parameters + source signature; unchanged builds are skipped
+
+Usage:
+    python build_dataset.py --data dataset.yaml --tile 320 --overlap 0.2 --oversample 2
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+import yaml
+
+PAD_VALUE = 114
+BUILD_VERSION = 1
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def tile_origins(length, tile, stride):
+    # same grid as backend/inference/tiling.py
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def tile_windows(height, width, tile_size, overlap):
+    """
+    (N, 4) x0, y0, x1, y1 tile windows covering the image.
+    """
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+    return np.array([(x, y, min(x + tile_size, width), min(y + tile_size, height))
+                     for y in tile_origins(height, tile_size, stride)
+                     for x in tile_origins(width, tile_size, stride)], dtype=np.int32)
+
+
+def read_labels(path, width, height):
+    """
+    YOLO label file -> (classes (N,), pixel boxes (N, 4) xyxy).
+    """
+    if not path.exists() or path.stat().st_size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 4))
+    rows = np.loadtxt(path, ndmin=2)
+    xc, yc, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    return rows[:, 0].astype(np.int64), np.stack([xc - w / 2, yc - h / 2, xc + w / 2, yc + h / 2], axis=1)
+
+
+def clip_to_tile(classes, boxes, window, tile_size, min_visibility):
+    """
+    Boxes clipped to `window` and normalized to the (padded) tile. Keeps
+    boxes with at least `min_visibility` of their area inside the window.
+    Returns (classes, (K, 4) YOLO xc, yc, w, h).
+    """
+    x0, y0, x1, y1 = window
+    clipped = np.clip(boxes, [x0, y0, x0, y0], [x1, y1, x1, y1]) - [x0, y0, x0, y0]
+    area = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+    wh = clipped[:, 2:] - clipped[:, :2]
+    keep = (wh > 0).all(axis=1) & (np.prod(wh, axis=1) >= min_visibility * np.maximum(area, 1e-9))
+    clipped, wh = clipped[keep], wh[keep]
+    yolo = np.concatenate([(clipped[:, :2] + wh / 2.0), wh], axis=1) / tile_size
+    return classes[keep], yolo
+
+
+def write_labels(path, classes, yolo):
+    lines = "".join(f"{c} {xc:.6f} {yc:.6f} {w:.6f} {h:.6f}\n" for c, (xc, yc, w, h) in zip(classes.tolist(), yolo.tolist()))
+    path.write_text(lines)
+
+
+def tile_image(image_path, labels_dir, out_dir, tile_size, overlap, min_visibility, quality):
+    """
+    Slice one image into tiles and write them with their labels.
+    Returns [(tile file name, box count), ...].
+    """
+    img = cv2.imread(str(image_path))
+    if img is None:
+        return []
+    h, w = img.shape[:2]
+    classes, boxes = read_labels(labels_dir / f"{image_path.stem}.txt", w, h)
+    out = []
+    for window in tile_windows(h, w, tile_size, overlap).tolist():
+        x0, y0, x1, y1 = window
+        tile = img[y0:y1, x0:x1]
+        if tile.shape[:2] != (tile_size, tile_size):
+            tile = cv2.copyMakeBorder(tile, 0, tile_size - tile.shape[0], 0, tile_size - tile.shape[1],
+                                      cv2.BORDER_CONSTANT, value=(PAD_VALUE, PAD_VALUE, PAD_VALUE))
+        name = f"{image_path.stem}_x{x0}_y{y0}"
+        tile_classes, yolo = clip_to_tile(classes, boxes, window, tile_size, min_visibility)
+        cv2.imwrite(str(out_dir / "images" / f"{name}.jpg"), tile, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        write_labels(out_dir / "labels" / f"{name}.txt", tile_classes, yolo)
+        out.append((f"{name}.jpg", len(tile_classes)))
+    return out
+
+
+def build_cache(split_dir, names, tile_size, workers):
+    """
+    Decode every tile once into <split>/images.npy (N, T, T, 3) uint8.
+    The written JPEGs are decoded (not the source pixels) so cached and
+    uncached training see exactly the same images.
+    """
+    cache = np.lib.format.open_memmap(split_dir / "images.npy.tmp", mode="w+", dtype=np.uint8,
+                                      shape=(len(names), tile_size, tile_size, 3))
+
+    def load(i):
+        cache[i] = cv2.imread(str(split_dir / "images" / names[i]))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(load, range(len(names))))
+    cache.flush()
+    del cache
+    os.replace(split_dir / "images.npy.tmp", split_dir / "images.npy")
+    (split_dir / "images.index.json").write_text(json.dumps({"tile_size": tile_size, "files": names}))
+
+
+def source_signature(image_dirs):
+    h = hashlib.sha256()
+    for d in image_dirs:
+        for p in sorted(Path(d).iterdir()):
+            label = p.parent.parent / "labels" / f"{p.stem}.txt"
+            for f in (p, label):
+                if f.exists():
+                    st = f.stat()
+                    h.update(f"{f.name}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()
+
+
+def load_data_cfg(data_cfg):
+    """
+    Resolve an ultralytics dataset yaml to {"train": images dir, "val": images dir}
+    plus nc/names.
+    """
+    data_cfg = Path(data_cfg)
+    cfg = yaml.safe_load(data_cfg.read_text())
+    root = Path(cfg.get("path") or data_cfg.parent)
+    if not root.is_absolute():
+        # relative paths in the repo's dataset.yaml are relative to the working directory
+        root = root if root.exists() else data_cfg.parent / root
+    return {"train": root / cfg["train"], "val": root / cfg["val"], "nc": cfg["nc"], "names": cfg["names"]}
+
+
+def build(data_cfg, out_dir=None, tile_size=640, overlap=0.2, min_visibility=0.5, oversample=1, cache=True,
+          quality=95, workers=8, force=False):
+    """
+    Build the tiled dataset for an ultralytics dataset yaml and return the
+    path of the generated dataset.yaml. An existing `out_dir` is replaced only
+    if it is empty or an earlier build (has build.json), or with force=True.
+    """
+    cfg = load_data_cfg(data_cfg)
+    splits = {"train": cfg["train"], "valid": cfg["val"]}
+    out_dir = Path(out_dir or f"{cfg['train'].parent.parent}_tiles{tile_size}")
+    params = {"version": BUILD_VERSION, "tile_size": tile_size, "overlap": overlap,
+              "min_visibility": min_visibility, "oversample": oversample, "cache": cache, "quality": quality,
+              "source": source_signature(splits.values())}
+    manifest = out_dir / "build.json"
+    if not force and manifest.exists() and json.loads(manifest.read_text()).get("params") == params:
+        print(f"[INFO] {out_dir} is up to date")
+        return out_dir / "dataset.yaml"
+
+    if not force and out_dir.is_dir() and any(out_dir.iterdir()) and not manifest.exists():
+        raise FileExistsError(f"{out_dir} exists and is not a dataset built by build_dataset.py; "
+                              f"pick another --out or pass --force to replace it")
+    shutil.rmtree(out_dir, ignore_errors=True)
+    stats = {}
+    train_list = []
+    for split, image_dir in splits.items():
+        split_dir = out_dir / split
+        (split_dir / "images").mkdir(parents=True)
+        (split_dir / "labels").mkdir(parents=True)
+        labels_dir = image_dir.parent / "labels"
+        images = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            per_image = list(pool.map(
+                lambda p: tile_image(p, labels_dir, split_dir, tile_size, overlap, min_visibility, quality), images))
+        tiles = [t for image_tiles in per_image for t in image_tiles]
+        names = sorted(name for name, _ in tiles)
+        if cache:
+            build_cache(split_dir, names, tile_size, workers)
+        positives = sum(1 for _, n in tiles if n)
+        stats[split] = {"images": len(images), "tiles": len(tiles), "tiles_with_particles": positives,
+                        "boxes": sum(n for _, n in tiles)}
+        if split == "train":
+            for name, n in sorted(tiles):
+                train_list += [str((split_dir / "images" / name).resolve())] * (oversample if n else 1)
+
+    (out_dir / "train.txt").write_text("\n".join(train_list) + "\n")
+    (out_dir / "dataset.yaml").write_text(yaml.safe_dump({
+        "path": str(out_dir.resolve()),
+        "train": "train.txt",
+        "val": "valid/images",
+        "nc": cfg["nc"],
+        "names": list(cfg["names"]),
+    }, sort_keys=False))
+    manifest.write_text(json.dumps({"params": params, "stats": stats}, indent=2))
+    for split, s in stats.items():
+        print(f"[INFO] {split}: {s['images']} images -> {s['tiles']} tiles "
+              f"({s['tiles_with_particles']} with particles, {s['boxes']} boxes)")
+    return out_dir / "dataset.yaml"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", type=str, default="dataset.yaml", help="source dataset yaml")
+    parser.add_argument("--out", type=str, default=None, help="output directory")
+    parser.add_argument("--tile", type=int, default=640, help="tile size in px (also the training imgsz)")
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--min-visibility", type=float, default=0.5,
+                        help="keep a clipped box if at least this share of it is inside the tile")
+    parser.add_argument("--oversample", type=int, default=1, help="list train tiles with particles N times")
+    parser.add_argument("--no-cache", action="store_true", help="skip the pre-decoded images.npy cache")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--force", action="store_true", help="rebuild even if sources and settings are unchanged, replacing --out whatever it holds")
+    args = parser.parse_args()
+    print(build(args.data, args.out, args.tile, args.overlap, args.min_visibility, args.oversample,
+                cache=not args.no_cache, workers=args.workers, force=args.force))
@@ -0,0 +1,129 @@
+"""
+export.py
+Export trained weights to optimized CPU inference backends.
+
+Writes next to best.pt:
+    best.onnx                    ONNX FP32 (dynamic batch, used by onnxruntime)
+    best_int8.onnx               ONNX INT8, static quantization calibrated on data/valid images
+    best_openvino_model/         OpenVINO FP32
+    best_int8_openvino_model/    OpenVINO INT8 (calibrated by ultralytics on the dataset's val split)
+
+The server picks one with MODEL_BACKEND (see inference/model_registry.py).
+
+Usage:
+    python export.py --weights runs/train/microplastic_experiment/weights/best.pt --formats onnx,openvino --int8
+"""
+
+import argparse
+import shutil
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+VALID_IMAGES = Path(__file__).resolve().parent / "data/valid/images"
+
+
+def letterbox(img, size=640, pad_value=114):
+    """
+    Resize keeping aspect ratio and pad to size x size, like the YOLO preprocessor.
+    """
+    h, w = img.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    resized = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    out = np.full((size, size, 3), pad_value, dtype=np.uint8)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    out[top:top + nh, left:left + nw] = resized
+    return out
+
+
+def calibration_batches(image_dir, imgsz=640, limit=100):
+    """
+    Yield preprocessed (1, 3, imgsz, imgsz) float32 tensors from image_dir.
+    """
+    for p in sorted(Path(image_dir).glob("*.jpg"))[:limit]:
+        img = cv2.imread(str(p))
+        if img is None:
+            continue
+        x = letterbox(img, imgsz)[:, :, ::-1].transpose(2, 0, 1)  # BGR HWC -> RGB CHW
+        yield np.ascontiguousarray(x, dtype=np.float32)[None] / 255.0
+
+
+def quantize_onnx_int8(fp32_path, int8_path, calib_dir=VALID_IMAGES, imgsz=640, limit=100):
+    """
+    Static INT8 quantization (QDQ, per-channel weights) of an exported ONNX
+    model, calibrated on images from calib_dir. Keeps the ultralytics metadata
+    (class names, stride, imgsz) so YOLO() can still load the result.
+    """
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = onnx.load(str(fp32_path), load_external_data=False).graph.input[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._it = calibration_batches(calib_dir, imgsz, limit)
+
+        def get_next(self):
+            x = next(self._it, None)
+            return None if x is None else {input_name: x}
+
+    quantize_static(
+        str(fp32_path), str(int8_path), Reader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+
+    src = onnx.load(str(fp32_path), load_external_data=False)
+    dst = onnx.load(str(int8_path))
+    dst.metadata_props.extend(p for p in src.metadata_props if p.key not in {m.key for m in dst.metadata_props})
+    onnx.save(dst, str(int8_path))
+    return Path(int8_path)
+
+
+def export_model(weights, formats=("onnx",), int8=False, data="dataset.yaml", imgsz=640, calib_dir=VALID_IMAGES):
+    """
+    Export `weights` to each format in `formats` ("onnx", "openvino"), plus
+    INT8 variants when int8=True. Returns {backend_name: path}.
+    """
+    weights = Path(weights)
+    outputs = {}
+    for fmt in formats:
+        if fmt == "onnx":
+            path = YOLO(str(weights)).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+            outputs["onnx"] = Path(path)
+            if int8:
+                outputs["onnx-int8"] = quantize_onnx_int8(path, weights.with_name(f"{weights.stem}_int8.onnx"),
+                                                          calib_dir, imgsz)
+        elif fmt == "openvino":
+            path = YOLO(str(weights)).export(format="openvino", imgsz=imgsz, dynamic=True)
+            outputs["openvino"] = Path(path)
+            if int8:
+                path = YOLO(str(weights)).export(format="openvino", imgsz=imgsz, int8=True, data=data)
+                # ultralytics names this <stem>_int8_openvino_model already; normalise if not
+                target = weights.with_name(f"{weights.stem}_int8_openvino_model")
+                if Path(path) != target:
+                    if target.exists():
+                        shutil.rmtree(target)
+                    shutil.move(str(path), target)
+                outputs["openvino-int8"] = target
+        else:
+            raise ValueError(f"unsupported export format: {fmt}")
+    for name, path in outputs.items():
+        print(f"[INFO] {name}: {path}")
+    return outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", type=str, default="runs/train/microplastic_experiment/weights/best.pt")
+    parser.add_argument("--formats", type=str, default="onnx", help="comma separated: onnx,openvino")
+    parser.add_argument("--int8", action="store_true", help="also write INT8-quantized variants")
+    parser.add_argument("--data", type=str, default="dataset.yaml", help="dataset yaml (OpenVINO INT8 calibration)")
+    parser.add_argument("--img", type=int, default=640)
+    args = parser.parse_args()
+    export_model(args.weights, args.formats.split(","), args.int8, args.data, args.img)
@@ -1,11 +1,43 @@
-from utils import convert_annotations_csv_to_yolo
+"""
+prepare_data.py
+Convert the Roboflow CSV annotations of every dataset split to YOLO labels.
 
-convert_annotations_csv_to_yolo(
-    "backend/model/data/train/_annotations.csv",
-    "backend/model/data/train"
-)
+Splits are the directories under --data that contain an _annotations.csv
+(train/ and valid/ in the Roboflow export). Unchanged splits are skipped; see
+utils.py for how labels are validated and written.
 
-convert_annotations_csv_to_yolo(
-    "backend/model/data/valid/_annotations.csv",
-    "backend/model/data/valid"
-)
+Usage:
+    python backend/model/prepare_data.py
+    python backend/model/prepare_data.py --data backend/model/data --splits train,valid --force
+"""
+
+import argparse
+from pathlib import Path
+
+from utils import prepare_dataset
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", type=str, default=str(DATA_DIR), help="directory holding the split folders")
+    parser.add_argument("--splits", type=str, default=None, help="comma-separated split names (default: all)")
+    parser.add_argument("--classes", type=str, default=None,
+                        help="comma-separated class names for multi-class CSVs (default: everything is class 0)")
+    parser.add_argument("--min-size", type=float, default=1.0, help="drop boxes smaller than this (px)")
+    parser.add_argument("--workers", type=int, default=None, help="parallel splits (default: one per split)")
+    parser.add_argument("--force", action="store_true", help="rewrite labels even if the CSV is unchanged")
+    args = parser.parse_args()
+
+    results = prepare_dataset(
+        args.data,
+        splits=args.splits.split(",") if args.splits else None,
+        class_names=args.classes.split(",") if args.classes else None,
+        min_size=args.min_size,
+        force=args.force,
+        workers=args.workers,
+    )
+    for r in results:
+        state = "unchanged, skipped" if r["skipped"] else "converted"
+        print(f"{r['split']}: {state} - {r['kept']}/{r['rows']} boxes in {r['files']} label files "
+              f"({r['dropped']} dropped)")
@@ -2,29 +2,120 @@
 train.py
 Train YOLOv8 on your dataset (requires ultralytics package).
 
+Data loading options:
+    --tile 320          train on overlapping 320px tiles built by build_dataset.py
+                        (labels clipped per tile; imgsz becomes the tile size)
+    --oversample 2      with --tile, list tiles containing particles twice
+    --cache mmap        read pre-decoded tiles from the builder's images.npy
+                        instead of decoding a JPEG per sample (implies tiling
+                        at --img when --tile is not given)
+    --cache ram|disk    ultralytics' own image caches
+    --workers 8         dataloader worker processes
+
 Usage:
     python train.py --data dataset.yaml --epochs 50 --batch 8 --img 640 --model yolov8n.pt
+    python train.py --data dataset.yaml --tile 320 --oversample 2 --cache mmap --workers 8
+    python train.py --data dataset.yaml --export onnx,openvino --int8   # also export CPU backends
 """
 
 import argparse
-from ultralytics import YOLO
+import json
 import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+from ultralytics.data import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+
+from build_dataset import build
+from export import export_model
+
+CACHE_MODES = ("none", "ram", "disk", "mmap")
+
+
+class MmapYOLODataset(YOLODataset):
+    """
+    YOLODataset whose images come from the builder's images.npy. The array is
+    opened lazily so each dataloader worker maps it itself instead of pickling
+    it; images not in the cache fall back to the normal JPEG path.
+    """
+
+    def attach_cache(self, cache_path, index):
+        self.cache_path = str(cache_path)
+        self.cache_rows = np.array([index.get(Path(f).name, -1) for f in self.im_files], dtype=np.int64)
+        self._cache_array = None
+
+    def load_image(self, i, rect_mode=True):
+        row = self.cache_rows[i]
+        if row < 0:
+            return super().load_image(i, rect_mode)
+        if self._cache_array is None:
+            self._cache_array = np.load(self.cache_path, mmap_mode="r")
+        # copy: augmentations (HSV, flips) modify the image in place
+        im = np.array(self._cache_array[row])
+        h0, w0 = im.shape[:2]
+        if rect_mode:
+            r = self.imgsz / max(h0, w0)
+            if r != 1:
+                im = cv2.resize(im, (min(round(w0 * r), self.imgsz), min(round(h0 * r), self.imgsz)),
+                                interpolation=cv2.INTER_LINEAR)
+        elif not (h0 == w0 == self.imgsz):
+            im = cv2.resize(im, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+        return im, (h0, w0), im.shape[:2]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cache_array"] = None
+        return state
+
+
+class MmapDetectionTrainer(DetectionTrainer):
+    def build_dataset(self, img_path, mode="train", batch=None):
+        dataset = super().build_dataset(img_path, mode, batch)
+        # tiles of a split live in <split>/images/, its cache in <split>/images.npy
+        split_dir = Path(dataset.im_files[0]).parent.parent
+        index_path = split_dir / "images.index.json"
+        if (split_dir / "images.npy").exists() and index_path.exists():
+            files = json.loads(index_path.read_text())["files"]
+            # build_yolo_dataset hard-codes YOLODataset, so swap the class in place
+            dataset.__class__ = MmapYOLODataset
+            dataset.attach_cache(split_dir / "images.npy", {name: i for i, name in enumerate(files)})
+        return dataset
+
 
-def train(data_cfg, epochs=50, batch=8, img_size=640, model_name="yolov8n.pt", project="runs/train"):
+def train(data_cfg, epochs=50, batch=8, img_size=640, model_name="yolov8n.pt", project="runs/train",
+          tile=None, overlap=0.2, oversample=1, cache="none", workers=8):
     """
     data_cfg: path to dataset.yaml
+    tile: train on tiles of this size (see build_dataset.py); with cache="mmap"
+          the dataset is tiled at img_size when tile is not given.
     """
+    if cache not in CACHE_MODES:
+        raise ValueError(f"cache must be one of {CACHE_MODES}")
+    if cache == "mmap" and not tile:
+        tile = img_size
+    if tile:
+        data_cfg = str(build(data_cfg, tile_size=tile, overlap=overlap, oversample=oversample,
+                             cache=cache == "mmap", workers=workers))
+        img_size = tile
     print("Starting training with:")
-    print(f" data: {data_cfg}, epochs: {epochs}, batch: {batch}, img: {img_size}, model: {model_name}")
+    print(f" data: {data_cfg}, epochs: {epochs}, batch: {batch}, img: {img_size}, model: {model_name}, "
+          f"cache: {cache}, workers: {workers}")
     model = YOLO(model_name)  # uses pretrained weights
     model.train(data=data_cfg,
                 epochs=epochs,
                 imgsz=img_size,
                 batch=batch,
+                workers=workers,
+                cache=cache if cache in ("ram", "disk") else False,
+                trainer=MmapDetectionTrainer if cache == "mmap" else None,
                 project=project,
                 name="microplastic_experiment",
                 exist_ok=True)
     print("Training complete. Check the `runs/train` directory for weights.")
+    return os.path.join(project, "microplastic_experiment", "weights", "best.pt")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -33,5 +124,18 @@ if __name__ == "__main__":
     parser.add_argument("--batch", type=int, default=8)
     parser.add_argument("--img", type=int, default=640)
     parser.add_argument("--model", type=str, default="yolov8n.pt")
+    parser.add_argument("--project", type=str, default="runs/train")
+    parser.add_argument("--tile", type=int, default=None, help="train on tiles of this size (px)")
+    parser.add_argument("--overlap", type=float, default=0.2, help="tile overlap")
+    parser.add_argument("--oversample", type=int, default=1, help="repeat train tiles with particles N times")
+    parser.add_argument("--cache", type=str, default="none", choices=CACHE_MODES)
+    parser.add_argument("--workers", type=int, default=8, help="dataloader workers")
+    parser.add_argument("--export", type=str, default=None, help="export best.pt after training: onnx,openvino")
+    parser.add_argument("--int8", action="store_true", help="with --export, also write INT8 models")
     args = parser.parse_args()
-    train(args.data, args.epochs, args.batch, args.img, args.model)
+    best = train(args.data, args.epochs, args.batch, args.img, args.model, args.project,
+                 tile=args.tile, overlap=args.overlap, oversample=args.oversample, cache=args.cache,
+                 workers=args.workers)
+    if args.export:
+        export_model(best, args.export.split(","), int8=args.int8, data=args.data,
+                     imgsz=args.tile or args.img)
@@ -1,29 +1,214 @@
-def convert_annotations_csv_to_yolo(csv_file, output_dir):
+"""
+utils.py
+Dataset preparation: Roboflow CSV annotations -> YOLO label files.
+
+Each split directory (e.g. data/train) holds `_annotations.csv` with one row
+per box (filename, width, height, class, xmin, ymin, xmax, ymax) and gets a
+`labels/` directory with one `<image stem>.txt` per annotated image.
+
+The conversion is vectorized: boxes are clipped to the image, degenerate
+ones (smaller than `min_size` px after clipping, missing values, bad image
+sizes) are dropped, and normalization plus text formatting run on whole NumPy arrays.
+Rows are grouped by filename, so every label file is written exactly once.
+A split's labels are written into a temporary directory that then replaces
+`labels/`, so reruns never append duplicates and a failed run leaves the old
+labels untouched. A manifest with the CSV's content hash lets unchanged
+splits be skipped.
+
+Usage:
+    from utils import prepare_dataset
+    prepare_dataset("backend/model/data")              # every split with an _annotations.csv
+    convert_annotations_csv_to_yolo("data/train/_annotations.csv", "data/train")
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+ANNOTATIONS_CSV = "_annotations.csv"
+MANIFEST = "labels.manifest.json"
+MANIFEST_VERSION = 1
+COLUMNS = ["filename", "width", "height", "xmin", "ymin", "xmax", "ymax"]
+# "0.123456": every normalized value is in [0, 1], so it always takes 8 characters
+VALUE_WIDTH = 8
+DECIMALS = 6
+# creating thousands of small files is syscall-bound; threads overlap it
+WRITE_THREADS = 8
+
+
+def hash_file(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def normalize_boxes(df, min_size=1.0, keep=None):
+    """
+    Clip pixel boxes to their image and convert them to YOLO
+    (x_center, y_center, w, h) in [0, 1]. `keep` pre-selects rows.
+    Returns (keep mask, (K, 4) float64 normalized boxes of the kept rows).
+    """
+    w = df["width"].to_numpy(dtype=np.float64)
+    h = df["height"].to_numpy(dtype=np.float64)
+    xyxy = df[["xmin", "ymin", "xmax", "ymax"]].to_numpy(dtype=np.float64)
+    valid = np.isfinite(xyxy).all(axis=1) & np.isfinite(w) & np.isfinite(h) & (w > 0) & (h > 0)
+    keep = valid if keep is None else keep & valid
+    keep &= df["filename"].notna().to_numpy()
+    limit = np.stack([w, h, w, h], axis=1)
+    xyxy = np.clip(xyxy, 0.0, limit)
+    bw = xyxy[:, 2] - xyxy[:, 0]
+    bh = xyxy[:, 3] - xyxy[:, 1]
+    keep &= (bw >= min_size) & (bh >= min_size)
+
+    xyxy, limit = xyxy[keep], limit[keep]
+    boxes = np.empty((len(xyxy), 4))
+    boxes[:, 0] = (xyxy[:, 0] + xyxy[:, 2]) / 2.0
+    boxes[:, 1] = (xyxy[:, 1] + xyxy[:, 3]) / 2.0
+    boxes[:, 2] = xyxy[:, 2] - xyxy[:, 0]
+    boxes[:, 3] = xyxy[:, 3] - xyxy[:, 1]
+    return keep, np.clip(boxes / limit, 0.0, 1.0)
+
+
+def format_label_rows(class_ids, boxes):
+    """
+    Render "<class> <xc> <yc> <w> <h>\\n" for every row as one fixed-width
+    (N, row_len) uint8 array, built with integer arithmetic instead of
+    per-value string formatting. Returns (array, row_len).
+    """
+    n = len(boxes)
+    cls_width = max(1, len(str(int(class_ids.max())))) if n else 1
+    row_len = cls_width + 4 * (VALUE_WIDTH + 1) + 1
+    out = np.full((n, row_len), ord(" "), dtype=np.uint8)
+
+    col = np.asarray(class_ids, dtype=np.int64)
+    for pos in range(cls_width - 1, -1, -1):
+        digit = col % 10
+        out[:, pos] = np.where((col > 0) | (pos == cls_width - 1), ord("0") + digit, ord(" "))
+        col //= 10
+
+    fixed = np.rint(boxes * 10 ** DECIMALS).astype(np.int64)   # 0 .. 1_000_000
+    for k in range(4):
+        start = cls_width + 1 + k * (VALUE_WIDTH + 1)
+        v = fixed[:, k]
+        out[:, start] = ord("0") + v // 10 ** DECIMALS
+        out[:, start + 1] = ord(".")
+        frac = v % 10 ** DECIMALS
+        for pos in range(start + VALUE_WIDTH - 1, start + 1, -1):
+            out[:, pos] = ord("0") + frac % 10
+            frac //= 10
+    out[:, -1] = ord("\n")
+    return out, row_len
+
+
+def _write_labels(directory, files, data, row_len):
+    for stem, start, end in files:
+        with open(os.path.join(directory, f"{stem}.txt"), "wb") as f:
+            f.write(data[start * row_len:end * row_len])
+
+
+def convert_annotations_csv_to_yolo(csv_file, output_dir, class_names=None, min_size=1.0):
     """
     Convert CSV annotations to YOLO format.
-    Saves .txt labels in <output_dir>/labels/
+    Saves .txt labels in <output_dir>/labels/, replacing any previous labels.
+    class_names: list mapping the CSV's class column to ids; by default every
+                 box is class 0 (only 1 class = microplastic).
+    min_size: boxes narrower or shorter than this many pixels after clipping
+              to the image are dropped.
+    Returns counts: rows, kept, dropped, files.
     """
-    import os, pandas as pd
-    df = pd.read_csv(csv_file)
+    import pandas as pd
+    usecols = COLUMNS + (["class"] if class_names else [])
+    df = pd.read_csv(csv_file, usecols=usecols)
+
+    ids = None
+    if class_names:
+        # classes not in class_names get -1 and are dropped
+        ids = pd.Categorical(df["class"], categories=list(class_names)).codes.astype(np.int64)
+    keep, boxes = normalize_boxes(df, min_size, None if ids is None else ids >= 0)
+    class_ids = ids[keep] if ids is not None else np.zeros(len(boxes), dtype=np.int64)
 
-    labels_dir = os.path.join(output_dir, "labels")
-    os.makedirs(labels_dir, exist_ok=True)
+    # group rows by image: factorize + stable sort keeps each image's boxes in CSV order
+    codes, names = pd.factorize(df["filename"].to_numpy()[keep])
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+    rows, row_len = format_label_rows(class_ids[order], boxes[order])
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, dtype=np.int64)
+    ends = np.r_[starts[1:], len(codes)]
+    data = rows.tobytes()
 
-    for _, row in df.iterrows():
-        filename = row['filename']
-        width, height = row['width'], row['height']
-        xmin, ymin, xmax, ymax = row['xmin'], row['ymin'], row['xmax'], row['ymax']
+    output_dir = Path(output_dir)
+    labels_dir = output_dir / "labels"
+    tmp_dir = output_dir / f".labels.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    try:
+        files = [(str(names[code]).rsplit(".", 1)[0], start, end)
+                 for code, start, end in zip(codes[starts].tolist(), starts.tolist(), ends.tolist())]
+        with ThreadPoolExecutor(max_workers=WRITE_THREADS) as pool:
+            chunks = [files[i::WRITE_THREADS] for i in range(WRITE_THREADS)]
+            list(pool.map(lambda chunk: _write_labels(str(tmp_dir), chunk, data, row_len), chunks))
+        old_dir = output_dir / f".labels.{os.getpid()}.old"
+        if labels_dir.exists():
+            labels_dir.rename(old_dir)
+        tmp_dir.rename(labels_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
-        class_id = 0  # only 1 class = microplastic
+    # ultralytics caches parsed labels next to the split; it must not outlive them
+    (output_dir / "labels.cache").unlink(missing_ok=True)
+    stats = {"rows": len(df), "kept": int(keep.sum()), "dropped": int((~keep).sum()), "files": len(starts)}
+    print(f"[INFO] Labels saved in {labels_dir} ({stats['files']} files, {stats['dropped']} boxes dropped)")
+    return stats
 
-        # YOLO normalized values
-        x_center = (xmin + xmax) / 2 / width
-        y_center = (ymin + ymax) / 2 / height
-        w = (xmax - xmin) / width
-        h = (ymax - ymin) / height
 
-        label_file = os.path.join(labels_dir, filename.rsplit(".", 1)[0] + ".txt")
-        with open(label_file, "a") as f:
-            f.write(f"{class_id} {x_center} {y_center} {w} {h}\n")
+def prepare_split(split_dir, class_names=None, min_size=1.0, force=False):
+    """
+    Convert one split unless its manifest says the labels already match the
+    current CSV and settings. Returns the manifest plus "skipped".
+    """
+    split_dir = Path(split_dir)
+    csv_file = split_dir / ANNOTATIONS_CSV
+    manifest_path = split_dir / MANIFEST
+    params = {"version": MANIFEST_VERSION, "csv_sha256": hash_file(csv_file),
+              "class_names": list(class_names) if class_names else None, "min_size": min_size}
+    if not force and manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        labels_dir = split_dir / "labels"
+        if ({k: manifest.get(k) for k in params} == params and labels_dir.is_dir()
+                and sum(1 for _ in labels_dir.glob("*.txt")) == manifest.get("files")):
+            return {**manifest, "split": split_dir.name, "skipped": True}
+
+    stats = convert_annotations_csv_to_yolo(csv_file, split_dir, class_names, min_size)
+    manifest = {**params, **stats}
+    tmp = manifest_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, manifest_path)
+    return {**manifest, "split": split_dir.name, "skipped": False}
+
 
-    print(f"[INFO] Labels saved in {labels_dir}")
+def find_splits(data_dir):
+    return sorted(p for p in Path(data_dir).iterdir() if (p / ANNOTATIONS_CSV).is_file())
+
+
+def prepare_dataset(data_dir, splits=None, class_names=None, min_size=1.0, force=False, workers=None):
+    """
+    Prepare every split under data_dir (directories with an _annotations.csv,
+    or the named `splits`), converting them in parallel processes.
+    """
+    dirs = [Path(data_dir) / s for s in splits] if splits else find_splits(data_dir)
+    if not dirs:
+        raise FileNotFoundError(f"no split with {ANNOTATIONS_CSV} under {data_dir}")
+    workers = min(len(dirs), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [prepare_split(d, class_names, min_size, force) for d in dirs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(prepare_split, d, class_names, min_size, force) for d in dirs]
+        return [f.result() for f in futures]
@@ -0,0 +1,201 @@
+"""
+server/annotations.py
+Annotated result images, rendered on first request.
+
+/upload and /detect do not draw and write an annotated JPEG per request: the
+result only names the file, and the store remembers the source image and
+detections behind that name. The first GET of the name decodes the source,
+draws the boxes in place and encodes it. The default rendering is also
+written to the results directory (so it survives restarts), and every
+rendering, including downscaled or lower-quality variants, is kept in an
+in-memory LRU bounded by total bytes.
+
+With persist=True (several server workers) each registration is also
+written as a small JSON sidecar (source path + detection columns) under
+<results_dir>/.pending/, so whichever worker gets the GET can render it.
+
+Renderings are always JPEG, so names end in .jpg whatever the source format
+(annotated_name("x.png") -> "annotated_x.jpg").
+
+Example usage:
+    store = AnnotationStore(RESULTS_DIR, class_names=lambda: model.names)
+    store.register(annotated_name("x.jpg"), "uploads/x.jpg", result["detections"])
+    jpeg = store.get("annotated_x.jpg", quality=70, max_width=800)   # None if unknown
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import cv2
+
+from backend.inference import metrics
+from backend.inference.detections import Detections
+from backend.inference.utils import draw_boxes_on_image, encode_jpeg, resize_to_width
+
+
+JPEG_SUFFIXES = (".jpg", ".jpeg")
+
+
+def annotated_name(image_name):
+    """
+    Name of the annotated rendering of `image_name`, always .jpg.
+    """
+    return f"annotated_{Path(image_name).stem}.jpg"
+
+
+class AnnotationStore:
+    def __init__(self, results_dir, class_names=None, quality=90, max_bytes=32 * 1024 * 1024, max_pending=4096,
+                 persist=False):
+        """
+        class_names: callable returning the model's class names, called at render time.
+        quality: JPEG quality of the default rendering (the one written to disk).
+        max_pending: registered names kept renderable, oldest forgotten first.
+        persist: also keep registrations on disk for other worker processes.
+        """
+        self.results_dir = Path(results_dir)
+        self.persist = persist
+        self.class_names = class_names
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()     # name -> (image_path, Detections, version)
+        self._mtimes = {}                 # name -> sidecar mtime_ns seen (persist=True)
+        self._rendered = OrderedDict()    # (name, version, quality, max_width) -> jpeg bytes
+        self._bytes = 0
+        self._version = 0
+        self._stats = {"registered": 0, "renders": 0, "hits": 0, "evictions": 0}
+
+    def register(self, name, image_path, detections):
+        """
+        (Re)bind `name` to an image and its detections (any layout). Earlier
+        renderings of the same name are dropped.
+        """
+        if Path(name).suffix.lower() not in JPEG_SUFFIXES:
+            raise ValueError(f"annotated images are JPEG, {name!r} must end in .jpg")
+        dets = Detections.from_any(detections)
+        mtime = None
+        if self.persist:
+            self._write(f".pending/{name}.json", json.dumps(
+                {"image_path": str(image_path), "detections": dets.to_columns(sizes=False)}).encode())
+            mtime = self._sidecar(name).stat().st_mtime_ns
+        with self._lock:
+            if mtime is not None:
+                self._mtimes[name] = mtime
+            self._version += 1
+            self._pending.pop(name, None)
+            self._pending[name] = (str(image_path), dets, self._version)
+            while len(self._pending) > self.max_pending:
+                self._mtimes.pop(self._pending.popitem(last=False)[0], None)
+            for key in [k for k in self._rendered if k[0] == name]:
+                self._bytes -= len(self._rendered.pop(key))
+            self._stats["registered"] += 1
+
+    def known(self, name):
+        return name in self._pending or (self.persist and self._sidecar(name).exists())
+
+    def _sidecar(self, name):
+        return self.results_dir / ".pending" / f"{name}.json"
+
+    def _refresh(self, name):
+        # (re)registered by another worker since we last looked: adopt its sidecar
+        path = self._sidecar(name)
+        try:
+            mtime = path.stat().st_mtime_ns
+            if mtime == self._mtimes.get(name):
+                return
+            entry = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return
+        dets = Detections.from_any(entry["detections"])
+        with self._lock:
+            self._version += 1
+            self._pending.pop(name, None)
+            self._pending[name] = (entry["image_path"], dets, self._version)
+            self._mtimes[name] = mtime
+            while len(self._pending) > self.max_pending:
+                self._mtimes.pop(self._pending.popitem(last=False)[0], None)
+            for key in [k for k in self._rendered if k[0] == name]:
+                self._bytes -= len(self._rendered.pop(key))
+
+    def get(self, name, quality=None, max_width=None):
+        """
+        JPEG bytes of the annotated image `name`, rendered on first use, or
+        None when nothing is registered under that name. Raises
+        FileNotFoundError when the source image is gone.
+        """
+        quality = int(quality or self.quality)
+        max_width = int(max_width) if max_width else None
+        if self.persist:
+            self._refresh(name)
+        with self._lock:
+            entry = self._pending.get(name)
+            if entry is None:
+                return None
+            image_path, dets, version = entry
+            key = (name, version, quality, max_width)
+            data = self._rendered.get(key)
+            if data is not None:
+                self._rendered.move_to_end(key)
+                self._stats["hits"] += 1
+                return data
+
+        data = self._render(image_path, dets, quality, max_width)
+        if quality == self.quality and max_width is None:
+            self._write(name, data)
+        with self._lock:
+            self._stats["renders"] += 1
+            current = self._pending.get(name)
+            # skip caching when the name was re-registered while rendering
+            if current is not None and current[2] == version:
+                self._insert(key, data)
+        return data
+
+    def _render(self, image_path, dets, quality, max_width):
+        img = cv2.imread(image_path)
+        if img is None:
+            raise FileNotFoundError(f"could not read image {image_path}")
+        with metrics.span("annotate"):
+            h, w = img.shape[:2]
+            img = resize_to_width(img, max_width)
+            if img.shape[1] != w:
+                # draw at output resolution so boxes and labels stay legible
+                sx, sy = img.shape[1] / w, img.shape[0] / h
+                dets = Detections(dets.xyxy * (sx, sy, sx, sy), dets.conf, dets.cls)
+            names = self.class_names() if self.class_names else None
+            draw_boxes_on_image(img, dets, class_names=names, inplace=True)
+        with metrics.span("encode"):
+            return encode_jpeg(img, quality)
+
+    def _write(self, name, data):
+        p = self.results_dir / name
+        p.parent.mkdir(parents=True, exist_ok=True)
+        # write-then-rename so a concurrent FileResponse never sees a half-written file
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, p)
+
+    def _insert(self, key, data):
+        old = self._rendered.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        if len(data) > self.max_bytes:
+            return
+        self._rendered[key] = data
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes and self._rendered:
+            _, evicted = self._rendered.popitem(last=False)
+            self._bytes -= len(evicted)
+            self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["pending"] = len(self._pending)
+            out["cached"] = len(self._rendered)
+            out["cached_bytes"] = self._bytes
+        out["max_bytes"] = self.max_bytes
+        return out
@@ -1,19 +1,40 @@
 import os
 import time
+import asyncio
+import copy
+import urllib.error
 import urllib.request
 import numpy as np
 import cv2
 import csv
+import io
+import json
 import datetime
 from pathlib import Path
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-import threading
-import requests
 
-from backend.inference.detect import run_inference
-from backend.server.esp32_handler import save_image_from_post
+from backend.inference import metrics
+from backend.inference.detect import build_result
+from backend.inference.detections import Detections
+from backend.inference.model_registry import get_model, warmup, model_stats, fingerprint, resolve_weights
+from backend.inference.result_cache import ResultCache, make_key, hash_bytes, hash_file, filter_detections
+from backend.inference.contours import ContourDetector, water_stats
+from backend.inference.motion import MotionGate
+from backend.inference.tracker import ParticleTracker
+from backend.inference.scheduler import InferenceScheduler, QueueFullError, SchedulerStoppedError
+from backend.server.annotations import AnnotationStore, annotated_name
+from backend.server.ingest import JobStore, UploadTooLarge, store_upload
+from backend.server.broadcaster import FrameBroadcaster
+from backend.server.camera import MJPEGReader
+from backend.server.cameras import CameraManager, parse_cameras, SOURCE_KINDS, DETECTORS
+from backend.server.executor import get_executor, run_blocking, shutdown as shutdown_executor
+from backend.server.relay import FeedRelay, forward
+from backend.server.serial_ingest import SerialIngester
+from backend.server.shared_state import Lease, open_store
+from backend.server.state_hub import StateHub
+from backend.server.telemetry import TelemetryWriter, CSV_HEADER, FIELDS
 
 # ================================
 # Config
@@ -21,13 +42,79 @@ from backend.server.esp32_handler import save_image_from_post
 BASE_DIR = Path(__file__).resolve().parents[2]
 UPLOAD_DIR = BASE_DIR / "uploads"
 RESULTS_DIR = BASE_DIR / "results"
-MODEL_PATH = BASE_DIR / "runs/train/microplastic_experiment/weights/best.pt"
+MODEL_WEIGHTS = BASE_DIR / "runs/train/microplastic_experiment/weights/best.pt"
+# pytorch | onnx | onnx-int8 | openvino | openvino-int8 (exported by backend/model/export.py)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "pytorch")
+MODEL_PATH = resolve_weights(MODEL_WEIGHTS, MODEL_BACKEND)
 MM_PER_PIXEL = 0.05
 WATER_ML = 100
 
+# Micro-batching for /upload and /detect (see backend/inference/scheduler.py)
+INFER_MAX_BATCH = int(os.getenv("INFER_MAX_BATCH", "8"))
+INFER_MAX_WAIT_MS = float(os.getenv("INFER_MAX_WAIT_MS", "10"))
+INFER_QUEUE_SIZE = int(os.getenv("INFER_QUEUE_SIZE", "64"))
+INFER_RETRY_AFTER_S = 1
+
+# Sliced inference for large images (/detect?tile=true, see backend/inference/tiling.py)
+TILE_SIZE = int(os.getenv("TILE_SIZE", "640"))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+TILE_BATCH = int(os.getenv("TILE_BATCH", "8"))
+
+# Result cache for repeated detections (see backend/inference/result_cache.py)
+INFER_IOU = 0.45
+RESULT_CACHE_DIR = Path(os.getenv("RESULT_CACHE_DIR", str(BASE_DIR / "cache/results")))
+RESULT_CACHE_MB = float(os.getenv("RESULT_CACHE_MB", "64"))
+RESULT_CACHE_DISK_MB = float(os.getenv("RESULT_CACHE_DISK_MB", "1024"))   # 0: unbounded
+# predictions are cached at this conf so any higher conf is served by filtering
+RESULT_CACHE_CONF_FLOOR = float(os.getenv("RESULT_CACHE_CONF_FLOOR", "0.1"))
+
+# Annotated images are rendered on first request (see backend/server/annotations.py)
+ANNOTATE_QUALITY = int(os.getenv("ANNOTATE_QUALITY", "90"))
+ANNOTATE_CACHE_MB = float(os.getenv("ANNOTATE_CACHE_MB", "32"))
+
+# Upload ingestion (streamed to disk, stored as <sha256>.<ext>, detected in the background)
+UPLOAD_MAX_MB = float(os.getenv("UPLOAD_MAX_MB", "50"))
+UPLOAD_MAX_JOBS = int(os.getenv("UPLOAD_MAX_JOBS", "10000"))  # job records kept for /jobs/{id}
+
+# Pushed stats (/ws/stats, /events): default and minimum seconds between two pushes per client
+STATS_PUSH_INTERVAL_S = float(os.getenv("STATS_PUSH_INTERVAL_S", "1"))
+STATS_MIN_INTERVAL_S = float(os.getenv("STATS_MIN_INTERVAL_S", "0.1"))
+STATS_HEARTBEAT_S = float(os.getenv("STATS_HEARTBEAT_S", "15"))
+
+# State shared between worker processes (see backend/server/serve.py):
+# memory (one worker) or sqlite:///path/to/state.db
+STATE_STORE = os.getenv("STATE_STORE", "memory")
+# the worker holding this lease runs the live camera pipelines, the serial port and telemetry
+LEADER_LEASE_S = float(os.getenv("LEADER_LEASE_S", "10"))
+# this worker's private loopback address, set by serve.py; other workers forward leader-only routes there
+WORKER_URL = os.getenv("WORKER_URL")
+
 # Camera URL (default to your IP, can override with env var)
 CAM_URL = os.getenv("CAM_URL", "http://10.190.245.60:8080/video")
 
+# Live feed pacing and motion gating (see backend/inference/motion.py)
+LIVE_TARGET_FPS = float(os.getenv("LIVE_TARGET_FPS", "10"))
+# percent of (downscaled) pixels that must change to re-run detection; 0 = every frame
+MOTION_THRESHOLD = float(os.getenv("MOTION_THRESHOLD", "0.2"))
+MOTION_MAX_STALENESS_S = float(os.getenv("MOTION_MAX_STALENESS_S", "2"))
+# count tracked particles instead of raw per-frame blobs (see backend/inference/tracker.py)
+LIVE_TRACKING = os.getenv("LIVE_TRACKING", "1") == "1"
+
+# Additional sampling stations (see backend/server/cameras.py for the format)
+CAMERAS = os.getenv("CAMERAS", "")
+
+# Serial JPEG ingestion (see backend/server/serial_ingest.py); off when SERIAL_PORT is unset
+SERIAL_PORT = os.getenv("SERIAL_PORT")  # e.g. /dev/ttyUSB0
+SERIAL_BAUD = int(os.getenv("SERIAL_BAUD", "921600"))
+SERIAL_SAVE_DIR = os.getenv("SERIAL_SAVE_DIR")  # also keep every frame on disk
+
+# Live stats history (see backend/server/telemetry.py)
+TELEMETRY_DIR = Path(os.getenv("TELEMETRY_DIR", str(BASE_DIR / "telemetry")))
+TELEMETRY_CSV_INTERVAL_S = float(os.getenv("TELEMETRY_CSV_INTERVAL_S", "5"))
+TELEMETRY_MAX_FILE_MB = float(os.getenv("TELEMETRY_MAX_FILE_MB", "64"))
+# run the live pipeline without viewers so history is recorded all day
+TELEMETRY_CONTINUOUS = os.getenv("TELEMETRY_CONTINUOUS", "0") == "1"
+
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -44,100 +131,396 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+scheduler = InferenceScheduler(
+    MODEL_PATH,
+    max_batch_size=INFER_MAX_BATCH,
+    max_wait_ms=INFER_MAX_WAIT_MS,
+    max_queue=INFER_QUEUE_SIZE,
+    executor=get_executor(),
+)
+
+state_store = open_store(STATE_STORE)
+shared_store = state_store if state_store.shared else None
+
+def start_singletons():
+    """
+    Components that must run once per deployment, not once per worker.
+    """
+    print(f"[worker {os.getenv('WORKER_INDEX', 0)}] leader: starting telemetry, serial and cameras")
+    state_store.put_record("worker", "leader", {"url": WORKER_URL, "owner": leader.owner,
+                                                "index": int(os.getenv("WORKER_INDEX", "0"))})
+    telemetry.start()
+    if serial_ingester is not None:
+        serial_ingester.start()
+    sync_cameras()
+    camera_manager.start()
+
+def stop_singletons():
+    camera_manager.stop()
+    if serial_ingester is not None:
+        serial_ingester.stop()
+    telemetry.stop()
+
+leader = Lease(state_store, "leader", ttl=LEADER_LEASE_S, on_acquire=start_singletons, on_release=stop_singletons)
+
+def leader_address():
+    """
+    Private URL of the worker that last took the leader lease (None before any did).
+    """
+    if shared_store is None:
+        return None
+    record = state_store.get_record("worker", "leader")
+    return record.get("url") if record else None
+
+@app.on_event("startup")
+async def load_model_on_startup():
+    # Load + warm the model once so the first /upload does not pay for it.
+    if MODEL_PATH.exists():
+        try:
+            warmup(MODEL_PATH)
+        except Exception as e:
+            print(f"Model warmup failed: {e}")
+    scheduler.executor = get_executor()
+    scheduler.start()
+    state_hub.start()
+    leader.start()
+    if TELEMETRY_CONTINUOUS:
+        app.state.live_recorder = asyncio.create_task(record_live_feed())
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    scheduler.stop()
+    camera.stop()
+    for relay in feed_relays.values():
+        relay.close()
+    leader.stop()
+    state_hub.stop()
+    shutdown_executor()
+    state_store.close()
+
+async def submit_inference(image_path, conf=0.25, **options):
+    """
+    Queue an image on the batching scheduler and wait for its result without
+    blocking the event loop. Responds 503 (+ Retry-After) when the queue is full
+    or the scheduler has stopped.
+    """
+    try:
+        fut = scheduler.submit(str(image_path), conf_thresh=conf, iou=INFER_IOU,
+                               mm_per_pixel=MM_PER_PIXEL, **options)
+    except QueueFullError:
+        raise HTTPException(
+            status_code=503,
+            detail="Inference queue full, retry later",
+            headers={"Retry-After": str(INFER_RETRY_AFTER_S)},
+        )
+    except SchedulerStoppedError:
+        raise HTTPException(status_code=503, detail="Server shutting down")
+    try:
+        return await asyncio.wrap_future(fut)
+    except SchedulerStoppedError:
+        # still queued when the scheduler stopped
+        raise HTTPException(status_code=503, detail="Server shutting down")
+
+result_cache = ResultCache(RESULT_CACHE_DIR, max_bytes=int(RESULT_CACHE_MB * 1024 * 1024),
+                           max_disk_bytes=int(RESULT_CACHE_DISK_MB * 1024 * 1024) or None)
+
+annotations = AnnotationStore(
+    RESULTS_DIR,
+    class_names=lambda: get_model(MODEL_PATH).names,
+    quality=ANNOTATE_QUALITY,
+    max_bytes=int(ANNOTATE_CACHE_MB * 1024 * 1024),
+    # other workers render images registered here
+    persist=state_store.shared,
+)
+
+def result_from_raw(raw_detections, conf, timings=None):
+    # no image needed: annotation happens when the image is requested
+    return build_result(filter_detections(raw_detections, conf), None, mm_per_pixel=MM_PER_PIXEL, timings=timings,
+                        layout="columns")
+
+async def detect_cached(image_path, annotated_out, conf=0.25, image_bytes=None, timings=None, image_hash=None,
+                        **tiling):
+    """
+    Detection through the result cache:
+      1. same image + model + params + conf already answered -> cached result
+      2. raw detections cached at a conf <= requested        -> filter, no predict
+      3. otherwise predict at min(conf, floor) on the scheduler and cache the raw boxes
+    Stage times of this request are added to `timings` (never cached).
+    `image_hash` (sha256 of the file, e.g. from store_upload) skips hashing.
+    Detections are kept in the columns layout; format_result converts them.
+    `annotated_out` is only registered with the annotation store; it is drawn
+    and written when first requested through /image.
+    """
+    timings = {} if timings is None else timings
+    if image_hash is None:
+        with metrics.span("hash", into=timings):
+            if image_bytes is not None:
+                image_hash = await run_blocking(hash_bytes, image_bytes)
+            else:
+                image_hash = await run_blocking(hash_file, image_path)
+    raw_key = make_key(image_hash, fingerprint(MODEL_PATH), iou=INFER_IOU, **tiling)
+    result_key = make_key(raw_key, None, conf=conf, mm_per_pixel=MM_PER_PIXEL, annotated=str(annotated_out))
+
+    with metrics.span("cache_lookup", into=timings):
+        hit = result_cache.get(result_key)
+    if hit is not None:
+        res = copy.deepcopy(hit)
+        res["cache"] = "result"
+        annotations.register(Path(annotated_out).name, image_path, res["detections"])
+        return res
+
+    with metrics.span("cache_lookup", into=timings):
+        raw = result_cache.get(raw_key)
+    if raw is not None and raw["base_conf"] <= conf:
+        res = result_from_raw(raw["detections"], conf, timings)
+        res["cache"] = "raw"
+    else:
+        base_conf = min(conf, RESULT_CACHE_CONF_FLOOR)
+        res = await submit_inference(image_path, base_conf, filter_conf=conf, layout="columns", **tiling)
+        timings.update(res.pop("timings", None) or {})
+        with metrics.span("cache_put", into=timings):
+            await run_blocking(result_cache.put, raw_key,
+                               {"base_conf": base_conf, "detections": res.pop("raw_detections")})
+        res["cache"] = "miss"
+    res["annotated_image"] = str(annotated_out)
+    annotations.register(Path(annotated_out).name, image_path, res["detections"])
+    with metrics.span("cache_put", into=timings):
+        await run_blocking(result_cache.put, result_key, res)
+    return res
+
+RESULT_FORMATS = ("records", "columns", "msgpack")
+
+def format_result(res, fmt="records"):
+    """
+    Shape a detect_cached result for the response:
+      records  one dict per box, per-box sizes in the summary (original API)
+      columns  struct-of-arrays JSON
+      msgpack  columns as raw little-endian arrays (see inference/detections.py)
+    Cached entries of either layout are accepted.
+    """
+    dets = Detections.from_any(res["detections"])
+    if fmt == "records":
+        return {**res, "detections": dets.to_records(MM_PER_PIXEL),
+                "summary": {**dets.summary(MM_PER_PIXEL), **res["summary"]}}
+    if fmt == "columns":
+        return {**res, "detections": dets.to_columns(MM_PER_PIXEL)}
+    return {**res, "detections": dets.to_binary(MM_PER_PIXEL)}
+
 # ================================
-# Latest detection info
+# Live state (versioned, pushed to /ws/stats and /events)
 # ================================
-latest_info = {
-    "image_path": None,
-    "annotated_path": None,
-    "result": None
-}
+# topics: "latest" (/api/latest), "esp32" (live water stats), "gating" (motion gate counters)
+STATS_TOPICS = ("latest", "esp32", "gating")
+state_hub = StateHub(store=shared_store)
+state_hub.setdefault("latest", {"imageUrl": None, "stats": {}})
+
+def publish_latest(image_path, annotated_path, result):
+    """
+    Publish the newest upload/detect result as the /api/latest payload.
+    """
+    image_url = None
+    if annotated_path:
+        image_url = f"/image/{Path(annotated_path).name}"
+    elif image_path:
+        image_url = f"/image/{Path(image_path).name}"
+
+    stats = {}
+    if isinstance(result, dict) and 'summary' in result:
+        summary = result['summary']
+        stats['count'] = summary.get('count', 0)
+        stats['percent_plastic'] = summary.get('percent_plastic', 0)
+        stats['percent_water'] = summary.get('percent_water', 100)
+    state_hub.update("latest", {"imageUrl": image_url, "stats": stats})
+
+def not_modified(request, etag):
+    """
+    304 response when the request's If-None-Match matches `etag`, else None.
+    """
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return None
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
+
+def versioned_json(content, etag):
+    # no-cache: browsers keep the body but revalidate with If-None-Match every time
+    return JSONResponse(content=content, headers={"ETag": etag, "Cache-Control": "no-cache"})
 
 # ================================
 # Upload & Detection Routes
 # ================================
+jobs = JobStore(max_jobs=UPLOAD_MAX_JOBS, store=shared_store)
+_job_tasks = set()   # strong references, so running jobs are not garbage collected
+
+def add_plastic_percentages(res):
+    total_objects = res['summary']['count']
+    percent_plastic = (total_objects / (total_objects + WATER_ML)) * 100 if (total_objects + WATER_ML) > 0 else 0
+    percent_water = 100 - percent_plastic
+    res['summary'].update({
+        "percent_plastic": round(percent_plastic, 2),
+        "percent_water": round(percent_water, 2)
+    })
+    return res
+
+async def run_upload_job(job_id, image_path, image_hash, stages, t_start):
+    """
+    Background detection for one upload. A full scheduler queue is waited
+    out (Retry-After) instead of failing the job.
+    """
+    jobs.update(job_id, status="running")
+    annotated_out = RESULTS_DIR / annotated_name(image_path.name)
+    try:
+        if not MODEL_PATH.exists():
+            publish_latest(image_path, None, {"msg": "Model not found - image saved."})
+            jobs.update(job_id, status="done", result={"msg": "Model not found - image saved."})
+            return
+        while True:
+            try:
+                res = await detect_cached(image_path, annotated_out, image_hash=image_hash, timings=stages)
+                break
+            except HTTPException as e:
+                if e.status_code != 503:
+                    raise
+                await asyncio.sleep(INFER_RETRY_AFTER_S)
+        add_plastic_percentages(res)
+        publish_latest(image_path, annotated_out, res)
+        metrics.observe("upload_total", time.perf_counter() - t_start, into=stages)
+        jobs.update(job_id, status="done", result=res, timings=stages)
+    except Exception as e:
+        jobs.update(job_id, status="error", error=str(e) or type(e).__name__, timings=stages)
+
 @app.post("/upload")
-async def upload_image(file: UploadFile = File(...)):
-    contents = await file.read()
-    out_path = UPLOAD_DIR / file.filename
-    save_image_from_post(contents, out_path)
+async def upload_image(file: UploadFile = File(...), timings: bool = False):
+    """
+    Store the upload and return at once; detection runs in the background.
+    The image is streamed to disk as <sha256>.<ext> (identical uploads are
+    stored once). Poll /jobs/{job_id} for the result; an upload of an image
+    whose detection is still queued or running gets that job's id.
+    timings=true adds the ingestion time breakdown to the response.
+    """
+    t_start = time.perf_counter()
+    stages = {}
+    try:
+        with metrics.span("upload_store", into=stages):
+            stored = await store_upload(file, UPLOAD_DIR, max_bytes=int(UPLOAD_MAX_MB * 1024 * 1024))
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
-    annotated_out = RESULTS_DIR / f"annotated_{file.filename}"
-    if MODEL_PATH.exists():
-        res = run_inference(
-            str(MODEL_PATH), str(out_path), str(annotated_out), mm_per_pixel=MM_PER_PIXEL
-        )
-        total_objects = res['summary']['count']
-        percent_plastic = (total_objects / (total_objects + WATER_ML)) * 100 if (total_objects + WATER_ML) > 0 else 0
-        percent_water = 100 - percent_plastic
-        res['summary'].update({
-            "percent_plastic": round(percent_plastic, 2),
-            "percent_water": round(percent_water, 2)
-        })
-
-        latest_info.update({
-            "image_path": str(out_path),
-            "annotated_path": str(annotated_out),
-            "result": res
-        })
-    else:
-        latest_info.update({
-            "image_path": str(out_path),
-            "annotated_path": None,
-            "result": {"msg": "Model not found - image saved."}
-        })
-    return {"status": "ok", "filename": file.filename}
+    job, created = jobs.create(stored.name, sha256=stored.sha256, original_filename=file.filename)
+    if created:
+        task = asyncio.create_task(run_upload_job(job["id"], stored.path, stored.sha256, dict(stages), t_start))
+        _job_tasks.add(task)
+        task.add_done_callback(_job_tasks.discard)
+    metrics.observe("upload_accept", time.perf_counter() - t_start, into=stages)
+    response = {"status": "ok", "filename": stored.name, "original_filename": file.filename,
+                "duplicate": stored.duplicate, "job_id": job["id"], "job_url": f"/jobs/{job['id']}"}
+    if timings:
+        response["timings"] = stages
+    return response
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str, format: str = "records", timings: bool = False):
+    """
+    Status of an upload job: queued, running, done (with `result`, shaped
+    like /detect's, see `format`) or error (with `error`).
+    """
+    if format not in ("records", "columns"):
+        raise HTTPException(status_code=400, detail="format must be records or columns")
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    res = job.get("result")
+    if isinstance(res, dict) and "detections" in res:
+        job["result"] = format_result(res, format)
+    if not timings:
+        job.pop("timings", None)
+    return job
+
+@app.get("/jobs")
+async def job_stats():
+    return jobs.stats()
 
 @app.post("/detect")
-async def detect_image(filename: str, conf: float = 0.25):
+async def detect_image(filename: str, conf: float = 0.25, tile: bool = False,
+                       tile_size: int = TILE_SIZE, tile_overlap: float = TILE_OVERLAP, timings: bool = False,
+                       format: str = "records"):
+    """
+    timings=true adds the per-stage time breakdown of this request to the result.
+    format: records (list of per-box dicts, default), columns (struct of
+    arrays, much smaller for crowded images) or msgpack (columns as binary
+    arrays, needs the msgpack package).
+    """
+    t_start = time.perf_counter()
+    stages = {}
     image_path = UPLOAD_DIR / filename
     if not image_path.exists():
         raise HTTPException(status_code=404, detail="Image not found")
 
-    annotated_out = RESULTS_DIR / f"annotated_{filename}"
+    annotated_out = RESULTS_DIR / annotated_name(filename)
     if not Path(MODEL_PATH).exists():
         raise HTTPException(status_code=500, detail="Trained model not found on server")
 
-    res = run_inference(
-        str(MODEL_PATH), str(image_path), str(annotated_out),
-        conf_thresh=conf, mm_per_pixel=MM_PER_PIXEL
-    )
-    total_objects = res['summary']['count']
-    percent_plastic = (total_objects / (total_objects + WATER_ML)) * 100 if (total_objects + WATER_ML) > 0 else 0
-    percent_water = 100 - percent_plastic
-    res['summary'].update({
-        "percent_plastic": round(percent_plastic, 2),
-        "percent_water": round(percent_water, 2)
-    })
+    if format not in RESULT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(RESULT_FORMATS)}")
+    if format == "msgpack":
+        try:
+            import msgpack
+        except ImportError:
+            raise HTTPException(status_code=400, detail="format=msgpack needs the msgpack package on the server")
+    if tile and (tile_size < 32 or not 0 <= tile_overlap < 1):
+        raise HTTPException(status_code=400, detail="tile_size must be >= 32 and 0 <= tile_overlap < 1")
+    tiling = {"tile_size": tile_size, "tile_overlap": tile_overlap, "tile_batch": TILE_BATCH} if tile else {}
+    res = add_plastic_percentages(await detect_cached(image_path, annotated_out, conf, timings=stages, **tiling))
 
-    latest_info.update({
-        "image_path": str(image_path),
-        "annotated_path": str(annotated_out),
-        "result": res
-    })
+    publish_latest(image_path, annotated_out, res)
+    res = format_result(res, format)
+    metrics.observe("detect_total", time.perf_counter() - t_start, into=stages)
+    if timings:
+        res = {**res, "timings": stages}
+    if format == "msgpack":
+        return Response(msgpack.packb({"status": "ok", "result": res}), media_type="application/msgpack")
     return {"status": "ok", "result": res}
 
 @app.get("/api/latest")
-async def get_latest():
-    res = latest_info['result']
-    annotated_path = latest_info['annotated_path']
-    image_url = None
-    if annotated_path:
-        image_url = f"/image/{Path(annotated_path).name}"
-    elif latest_info['image_path']:
-        image_url = f"/image/{Path(latest_info['image_path']).name}"
+async def get_latest(request: Request):
+    """
+    Sends an ETag; a request with a matching If-None-Match gets 304.
+    """
+    version, latest = state_hub.snapshot("latest")
+    etag = f'"{state_hub.boot_id}-{version}"'
+    return not_modified(request, etag) or versioned_json(latest, etag)
 
-    stats = {}
-    if isinstance(res, dict) and 'summary' in res:
-        summary = res['summary']
-        stats['count'] = summary.get('count', 0)
-        stats['percent_plastic'] = summary.get('percent_plastic', 0)
-        stats['percent_water'] = summary.get('percent_water', 100)
+@app.get("/model/info")
+async def model_info():
+    return {"model_path": str(MODEL_PATH), "backend": MODEL_BACKEND, "models": model_stats()}
 
-    return {"imageUrl": image_url, "stats": stats}
+@app.get("/inference/stats")
+async def inference_stats():
+    return scheduler.stats()
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {**result_cache.stats(), "annotations": annotations.stats()}
 
 @app.get("/image/{image_name}")
-async def serve_image(image_name: str):
+async def serve_image(image_name: str, quality: int = None, max_width: int = None):
+    """
+    Annotated results are drawn and encoded on their first request and then
+    cached. quality (1-100) and max_width select a smaller rendering of them.
+    """
+    if quality is not None and not 1 <= quality <= 100:
+        raise HTTPException(status_code=400, detail="quality must be between 1 and 100")
+    if max_width is not None and max_width < 16:
+        raise HTTPException(status_code=400, detail="max_width must be >= 16")
+    if annotations.known(image_name):
+        try:
+            data = await run_blocking(annotations.get, image_name, quality, max_width)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Source image not found")
+        if data is not None:
+            return Response(data, media_type="image/jpeg")
     candidate = RESULTS_DIR / image_name
     if not candidate.exists():
         candidate = UPLOAD_DIR / image_name
@@ -148,133 +531,516 @@ async def serve_image(image_name: str):
 # ================================
 # Live Feed + Stats (HTTP MJPEG)
 # ================================
-esp32_stats = {
+state_hub.setdefault("esp32", {
     "objects": 0,
     "grams_per_ml": 0.0,
     "percent_plastic": 0.0,
     "percent_water": 100.0,
-    "water_ml": WATER_ML
-}
+    "water_ml": WATER_ML,
+    "unique_particles": 0
+})
 
 LOG_FILE = BASE_DIR / "live_log.csv"
-is_logging = False  # flag
+
+# One persistent connection to the camera shared by every video_feed client.
+# Started on first use so the server runs fine without a camera attached.
+camera = MJPEGReader(CAM_URL)
+live_detector = ContourDetector(mm_per_pixel=MM_PER_PIXEL)
+# Detection only re-runs when the scene changes (or the result gets stale)
+live_gate = MotionGate(threshold=MOTION_THRESHOLD, max_staleness=MOTION_MAX_STALENESS_S)
+# Stable per-particle IDs: "objects" becomes the tracked count, plus a running unique total
+live_tracker = ParticleTracker(mm_per_pixel=MM_PER_PIXEL) if LIVE_TRACKING else None
+
+# Every processed live frame is recorded; files are written in batches by a
+# background thread. live_log.csv keeps one row per TELEMETRY_CSV_INTERVAL_S.
+telemetry = TelemetryWriter(
+    TELEMETRY_DIR,
+    csv_path=LOG_FILE,
+    csv_interval=TELEMETRY_CSV_INTERVAL_S,
+    max_file_bytes=int(TELEMETRY_MAX_FILE_MB * 1024 * 1024),
+)
 
 def fetch_esp32_frame():
     """
-    Fetches a frame from the camera stream and applies microplastic detection.
+    Takes the newest frame from the shared camera reader and applies microplastic detection.
     """
-    global esp32_stats
-    try:
-        # Fetch MJPEG frame manually
-        stream = requests.get(CAM_URL, stream=True, timeout=5)
-        bytes_data = bytes()
-        for chunk in stream.iter_content(chunk_size=1024):
-            bytes_data += chunk
-            a = bytes_data.find(b'\xff\xd8')
-            b = bytes_data.find(b'\xff\xd9')
-            if a != -1 and b != -1:
-                jpg = bytes_data[a:b+2]
-                bytes_data = bytes_data[b+2:]
-                frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
-                break
-        else:
-            frame = np.zeros((240, 320, 3), dtype=np.uint8)
-    except Exception as e:
-        print(f"Camera fetch error: {e}")
+    camera.start()
+    with metrics.span("live_decode"):
+        frame, _ = camera.latest_frame()
+    placeholder = frame is None
+    if placeholder:
         frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    else:
+        # detection draws on the frame; keep the shared one untouched
+        frame = frame.copy()
 
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    canny = cv2.Canny(cv2.GaussianBlur(gray, (11, 11), 0), 30, 150)
-    dilated = cv2.dilate(canny, (1, 1), iterations=2)
-    cnt, _ = cv2.findContours(dilated.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    with metrics.span("live_detect"):
+        result, detected = live_gate.run(frame, live_detector.detect)
+    with metrics.span("live_draw"):
+        live_detector.draw(frame, result)
+    objects = result["objects"]
+    stats = {}
+    if live_tracker is not None:
+        # frames the gate skipped carry no new boxes; only track fresh detections
+        if detected and not placeholder:
+            with metrics.span("live_track"):
+                live_tracker.update(result["boxes"])
+        objects = live_tracker.active_count
+        stats["unique_particles"] = live_tracker.unique_count
+    stats.update(water_stats(objects, WATER_ML))
+    # unchanged values are not re-published, so a static scene pushes nothing; a worker
+    # that just lost the lease (viewers still attached) leaves the shared topics to the new leader
+    if leader.held:
+        state_hub.update("esp32", stats)
+        state_hub.update("gating", {**live_gate.stats(), "target_fps": LIVE_TARGET_FPS})
+        if not placeholder:
+            telemetry.record(state_hub.snapshot("esp32")[1])
 
-    objects = len(cnt)
-    grams_per_ml = objects / WATER_ML if WATER_ML > 0 else 0
-    percent_plastic = (objects / (objects + WATER_ML)) * 100 if (objects + WATER_ML) > 0 else 0
-    percent_water = 100 - percent_plastic
+    return frame
 
-    # Draw bounding boxes + size
-    for c in cnt:
-        x, y, w, h = cv2.boundingRect(c)
-        if w > 5 and h > 5:
-            size_mm = round((w + h) / 2 * MM_PER_PIXEL, 2)
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-            cv2.putText(frame, f"{size_mm} mm", (x, y - 5),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
-
-    esp32_stats.update({
-        "objects": objects,
-        "grams_per_ml": round(grams_per_ml, 3),
-        "percent_plastic": round(percent_plastic, 2),
-        "percent_water": round(percent_water, 2),
-        "water_ml": WATER_ML
-    })
+def fetch_and_encode_frame():
+    frame = fetch_esp32_frame()
+    with metrics.span("live_encode"):
+        ret, buffer = cv2.imencode('.jpg', frame)
+    return buffer.tobytes()
 
-    return frame
+_live_seq = 0
 
-def gen_esp32_frames():
+def produce_live_chunk():
+    """
+    Producer for the live broadcaster: waits for a new camera frame, runs
+    detection + encode once and returns the multipart chunk sent to every viewer.
+    """
+    global _live_seq
+    camera.start()
+    # on timeout (camera down) still produce, so viewers get the placeholder frame
+    with metrics.span("live_wait"):
+        _live_seq = camera.wait_for_frame(_live_seq, timeout=1.0)
+    jpg = fetch_and_encode_frame()
+    return (
+        b'--frame\r\n'
+        b'Content-Type: image/jpeg\r\n\r\n' + jpg + b'\r\n'
+    )
+
+# One detection pipeline for the live feed, fanned out to all viewers. The
+# broadcaster sleeps only what is left of each 1/LIVE_TARGET_FPS tick.
+live_broadcaster = FrameBroadcaster(produce_live_chunk, min_interval=1.0 / LIVE_TARGET_FPS, queue_size=2,
+                                    name="live-feed")
+
+async def record_live_feed():
+    """
+    Keeps the live pipeline running with no viewers attached
+    (TELEMETRY_CONTINUOUS=1) so telemetry covers the whole day.
+    Only the leader worker records; the others wait for the lease.
+    """
     while True:
-        frame = fetch_esp32_frame()
-        ret, buffer = cv2.imencode('.jpg', frame)
-        yield (
-            b'--frame\r\n'
-            b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n'
-        )
-        time.sleep(0.1)
+        if not leader.held:
+            await asyncio.sleep(LEADER_LEASE_S / 3)
+            continue
+        async for _ in live_broadcaster.stream():
+            if not leader.held:
+                break
 
-# ================================
-# CSV Logging (every 5s for 30s)
-# ================================
-def log_esp32_stats():
-    global is_logging
-    if is_logging:
-        return
-    is_logging = True
-
-    start_time = time.time()
-
-    if not LOG_FILE.exists():
-        with open(LOG_FILE, mode='w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['timestamp', 'objects', 'grams_per_ml',
-                             'percent_plastic', 'percent_water', 'water_ml'])
-
-    while time.time() - start_time < 30:
-        with open(LOG_FILE, mode='a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                esp32_stats.get('objects', 0),
-                esp32_stats.get('grams_per_ml', 0.0),
-                esp32_stats.get('percent_plastic', 0.0),
-                esp32_stats.get('percent_water', 100.0),
-                esp32_stats.get('water_ml', WATER_ML)
-            ])
-        time.sleep(5)
-
-    is_logging = False
-    print(f"✅ Logging finished. Saved in {LOG_FILE}")
+def parse_time(value, default):
+    """
+    Accepts epoch seconds or an ISO-8601 timestamp.
+    """
+    if value is None or value == "":
+        return default
+    try:
+        ts = float(value)
+    except ValueError:
+        try:
+            ts = datetime.datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid time: {value}")
+    try:
+        datetime.datetime.fromtimestamp(ts)
+    except (OverflowError, ValueError, OSError):
+        # nan, inf or beyond the years datetime can represent
+        raise HTTPException(status_code=422, detail=f"Time out of range: {value}")
+    return ts
 
 # ================================
 # Endpoints
 # ================================
 @app.get("/esp32/video_feed")
 async def esp32_video_feed():
-    if not is_logging:
-        logging_thread = threading.Thread(target=log_esp32_stats, daemon=True)
-        logging_thread.start()
     return StreamingResponse(
-        gen_esp32_frames(),
+        live_broadcaster.stream(),
         media_type="multipart/x-mixed-replace; boundary=frame"
     )
 
 @app.get("/esp32/stats")
-async def esp32_stats_endpoint():
-    return JSONResponse(content=esp32_stats)
+async def esp32_stats_endpoint(request: Request):
+    """
+    Live stats as of the last processed frame, with an ETag for conditional GETs.
+    """
+    v_stats, stats = state_hub.snapshot("esp32")
+    v_gating, gating = state_hub.snapshot("gating")
+    if not gating:
+        gating = {**live_gate.stats(), "target_fps": LIVE_TARGET_FPS}
+    etag = f'"{state_hub.boot_id}-{max(v_stats, v_gating)}"'
+    return not_modified(request, etag) or versioned_json({**stats, "gating": gating}, etag)
+
+def parse_topics(value):
+    topics = tuple(t for t in (value or "latest,esp32").split(",") if t)
+    unknown = set(topics) - set(STATS_TOPICS)
+    if unknown or not topics:
+        raise ValueError(f"topics must be a comma-separated subset of {', '.join(STATS_TOPICS)}")
+    return topics
+
+def push_interval(value):
+    return max(STATS_MIN_INTERVAL_S, STATS_PUSH_INTERVAL_S if value is None else value)
+
+@app.websocket("/ws/stats")
+async def stats_socket(websocket: WebSocket, topics: str = None, interval: float = None, since: str = None):
+    """
+    Pushes {"type": "stats", "version", "changes": {topic: {key: value}}}
+    with only the keys that changed, at most once per `interval` seconds
+    (>= STATS_MIN_INTERVAL_S). The first message holds every key, unless
+    `since` is a version from an earlier message. Idle connections get
+    {"type": "ping"} every STATS_HEARTBEAT_S.
+    topics: comma-separated subset of latest, esp32, gating (default latest,esp32).
+    """
+    try:
+        topics = parse_topics(topics)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    await websocket.accept()
+    try:
+        async for version, changes in state_hub.watch(topics, state_hub.parse_version(since),
+                                                      push_interval(interval), STATS_HEARTBEAT_S):
+            tag = f"{state_hub.boot_id}-{version}"
+            if changes is None:
+                await websocket.send_text(json.dumps({"type": "ping", "version": tag}))
+            else:
+                await websocket.send_text(json.dumps({"type": "stats", "version": tag, "changes": changes}))
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+@app.get("/events")
+async def stats_events(request: Request, topics: str = None, interval: float = None):
+    """
+    Server-sent events with the same payload as /ws/stats ("stats" events,
+    id = version). A reconnecting EventSource sends Last-Event-ID and only
+    gets what changed since then.
+    """
+    try:
+        topics = parse_topics(topics)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    since = state_hub.parse_version(request.headers.get("last-event-id"))
+
+    async def stream():
+        yield "retry: 2000\n\n"
+        async for version, changes in state_hub.watch(topics, since, push_interval(interval), STATS_HEARTBEAT_S):
+            if changes is None:
+                yield ": ping\n\n"
+            else:
+                yield f"id: {state_hub.boot_id}-{version}\nevent: stats\ndata: {json.dumps(changes)}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/events/stats")
+async def stats_hub_stats():
+    return state_hub.stats()
+
+@app.get("/worker")
+async def worker_info():
+    """
+    Which worker answered, and whether it runs the leader-only components.
+    """
+    return {
+        "index": int(os.getenv("WORKER_INDEX", "0")),
+        "workers": int(os.getenv("WORKERS", "1")),
+        "pid": os.getpid(),
+        "store": STATE_STORE,
+        "url": WORKER_URL,
+        "leader": {**leader.stats(), "url": leader_address()},
+        "relays": {path: relay.stats()["subscribers"] for path, relay in feed_relays.items()},
+    }
+
+@app.get("/esp32/tracks")
+async def esp32_tracks(limit: int = 100):
+    if live_tracker is None:
+        return {"enabled": False}
+    return {"enabled": True, "stats": live_tracker.stats(), "tracks": live_tracker.snapshot(limit)}
+
+@app.get("/esp32/history")
+async def esp32_history(
+    start: str = Query(None, alias="from"),
+    end: str = Query(None, alias="to"),
+    step: float = None,
+    format: str = "json",
+):
+    """
+    Live stats between `from` and `to` (epoch seconds or ISO-8601, default:
+    the last hour), averaged into buckets of `step` seconds. format=csv
+    returns the same points as CSV.
+    """
+    t_to = parse_time(end, time.time())
+    t_from = parse_time(start, t_to - 3600)
+    if t_to <= t_from:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    if step is not None and step <= 0:
+        raise HTTPException(status_code=400, detail="step must be positive")
+    history = await run_blocking(telemetry.query, t_from, t_to, step)
+    if format == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(CSV_HEADER + ["objects_max", "samples"])
+        for p in history["points"]:
+            ts = datetime.datetime.fromtimestamp(p["ts"]).strftime("%Y-%m-%d %H:%M:%S")
+            writer.writerow([ts] + [p[k] for k in FIELDS] + [p["objects_max"], p["samples"]])
+        return StreamingResponse(iter([buf.getvalue()]), media_type="text/csv")
+    return history
+
+@app.get("/esp32/telemetry")
+async def esp32_telemetry():
+    return telemetry.stats()
+
+@app.get("/esp32/viewers")
+async def esp32_viewers():
+    return live_broadcaster.stats()
+
+@app.get("/esp32/camera")
+async def esp32_camera_status():
+    return camera.stats()
+
+# ================================
+# Serial ingestion
+# ================================
+serial_latest = {"seq": 0, "summary": None, "timings": None}
+
+def handle_serial_frame(jpeg, seq):
+    """
+    Runs on the ingester's consumer thread: decode and hand the frame straight
+    to the inference scheduler. Waiting for the result bounds the work in
+    flight; frames arriving meanwhile queue up and the oldest are dropped.
+    """
+    frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError(f"serial frame {seq} is not a valid JPEG")
+    res = scheduler.submit(frame, conf_thresh=0.25, iou=INFER_IOU, mm_per_pixel=MM_PER_PIXEL,
+                           layout="columns").result()
+    serial_latest.update({"seq": seq, "summary": res["summary"], "timings": res.get("timings")})
+
+serial_ingester = SerialIngester(
+    SERIAL_PORT, SERIAL_BAUD, on_frame=handle_serial_frame, save_dir=SERIAL_SAVE_DIR,
+) if SERIAL_PORT else None
+
+@app.get("/serial/stats")
+async def serial_stats():
+    if serial_ingester is None:
+        return {"enabled": False}
+    return {"enabled": True, "ingester": serial_ingester.stats(), "latest": serial_latest}
+
+# ================================
+# Multi-camera
+# ================================
+camera_manager = CameraManager(scheduler=scheduler, water_ml=WATER_ML, mm_per_pixel=MM_PER_PIXEL,
+                               motion_threshold=MOTION_THRESHOLD, max_staleness=MOTION_MAX_STALENESS_S)
+
+def camera_configs():
+    """
+    CAMERAS plus the cameras registered / removed through the API, which are
+    kept in the shared store so a new leader starts the same set.
+    """
+    configs = {cfg["id"]: cfg for cfg in parse_cameras(CAMERAS)}
+    for cfg in state_store.list_records("camera"):
+        if cfg.get("removed"):
+            configs.pop(cfg["id"], None)
+        else:
+            configs[cfg["id"]] = cfg
+    return configs
+
+def sync_cameras():
+    configs = camera_configs()
+    for cam_id in camera_manager.ids():
+        if cam_id not in configs:
+            camera_manager.remove(cam_id)
+    camera_manager.add_from_config([cfg for cam_id, cfg in configs.items() if camera_manager.get(cam_id) is None])
+
+def get_pipeline(cam_id):
+    pipeline = camera_manager.get(cam_id)
+    if pipeline is None:
+        raise HTTPException(status_code=404, detail=f"Unknown camera: {cam_id}")
+    return pipeline
+
+@app.get("/cameras")
+async def cameras_overview():
+    return camera_manager.stats()
+
+@app.post("/cameras")
+async def register_camera(id: str, source: str, kind: str = None, detector: str = "classical",
+                          max_fps: float = 10.0):
+    if kind is not None and kind not in SOURCE_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {SOURCE_KINDS}")
+    if detector not in DETECTORS:
+        raise HTTPException(status_code=400, detail=f"detector must be one of {DETECTORS}")
+    if max_fps <= 0:
+        raise HTTPException(status_code=400, detail="max_fps must be positive")
+    if camera_manager.get(id) is not None:
+        raise HTTPException(status_code=409, detail=f"Camera already registered: {id}")
+    pipeline = camera_manager.add(id, source, kind=kind, detector=detector, max_fps=max_fps)
+    state_store.put_record("camera", id, {"id": id, "source": source, "kind": kind, "detector": detector,
+                                          "max_fps": max_fps})
+    return pipeline.stats()
+
+@app.delete("/cameras/{cam_id}")
+async def remove_camera(cam_id: str):
+    get_pipeline(cam_id)
+    await run_blocking(camera_manager.remove, cam_id)
+    # a tombstone, so a camera from CAMERAS stays removed after a leader change
+    state_store.put_record("camera", cam_id, {"id": cam_id, "removed": True})
+    return {"removed": cam_id}
+
+@app.get("/cameras/{cam_id}/stats")
+async def camera_stats(cam_id: str):
+    return get_pipeline(cam_id).stats()
+
+@app.get("/cameras/{cam_id}/video_feed")
+async def camera_video_feed(cam_id: str):
+    return StreamingResponse(
+        get_pipeline(cam_id).broadcaster.stream(),
+        media_type="multipart/x-mixed-replace; boundary=frame"
+    )
+
+# ================================
+# Leader-only routes (several workers)
+# ================================
+# served from the live camera pipelines, tracker, serial port and telemetry
+# writer, which run in the leader worker only
+LEADER_ROUTES = ("/esp32/video_feed", "/esp32/tracks", "/esp32/history", "/esp32/telemetry", "/esp32/viewers",
+                 "/esp32/camera", "/serial/", "/cameras")
+MAX_IDLE_RELAYS = 64
+feed_relays = {}   # path -> FeedRelay
+
+def relay_for(path):
+    relay = feed_relays.get(path)
+    if relay is None:
+        if len(feed_relays) >= MAX_IDLE_RELAYS:
+            for key in [k for k, r in feed_relays.items() if not r.stats()["subscribers"]]:
+                feed_relays.pop(key).close()
+        relay = feed_relays[path] = FeedRelay(leader_address, path)
+    return relay
+
+@app.middleware("http")
+async def route_to_leader(request: Request, call_next):
+    """
+    With several workers (serve.py), pass leader-only routes on to the
+    leader: MJPEG feeds through one shared FeedRelay per feed, anything else
+    replayed once. A single worker, or the leader itself, serves them directly.
+    """
+    path = request.url.path
+    if WORKER_URL is None or shared_store is None or leader.held or not path.startswith(LEADER_ROUTES):
+        return await call_next(request)
+    target = leader_address()
+    retry = {"Retry-After": str(int(LEADER_LEASE_S))}
+    if target is None or target == WORKER_URL:
+        # no leader yet, or this worker lost the lease and nobody has taken it over
+        return JSONResponse({"detail": "No leader worker, retry later"}, status_code=503, headers=retry)
+    if path.endswith("/video_feed"):
+        return StreamingResponse(relay_for(path).stream(), media_type="multipart/x-mixed-replace; boundary=frame")
+    full_path = f"{path}?{request.url.query}" if request.url.query else path
+    body = await request.body()
+    try:
+        status, content_type, content = await run_blocking(
+            forward, target, request.method, full_path, dict(request.headers), body)
+    except (urllib.error.URLError, OSError) as e:
+        return JSONResponse({"detail": f"Leader worker unreachable: {e}"}, status_code=503, headers=retry)
+    return Response(content, status_code=status, media_type=content_type)
+
+# ================================
+# Metrics (Prometheus text format)
+# ================================
+@metrics.register_collector
+def collect_app_metrics():
+    """
+    Queue depths, cache hits, frames and reconnects, read from each
+    component's own stats at scrape time.
+    """
+    sched = scheduler.stats()
+    yield "inference_queue_depth", "gauge", "Requests waiting for the scheduler.", sched["queue_depth"], {}
+    for key in ("submitted", "rejected", "completed", "failed", "batches"):
+        yield "inference_requests_total", "counter", "Scheduler requests by outcome.", sched[key], {"outcome": key}
+
+    hub = state_hub.stats()
+    yield "stats_subscribers", "gauge", "Connected /ws/stats and /events clients.", hub["subscribers"], {}
+    yield "stats_updates_total", "counter", "Live state changes published.", hub["updates"], {}
+    yield "worker_leader", "gauge", "1 in the worker running telemetry, serial and cameras.", int(leader.held), {}
+
+    job = jobs.stats()
+    for key in ("queued", "running"):
+        yield "upload_jobs", "gauge", "Upload jobs by state.", job[key], {"state": key}
+    for key in ("done", "error"):
+        yield "upload_jobs_total", "counter", "Finished upload jobs by outcome.", job[key], {"outcome": key}
+
+    cache = result_cache.stats()
+    yield "result_cache_hits_total", "counter", "Result cache hits.", cache["hits_memory"], {"layer": "memory"}
+    yield "result_cache_hits_total", "counter", "Result cache hits.", cache["hits_disk"], {"layer": "disk"}
+    yield "result_cache_misses_total", "counter", "Result cache misses.", cache["misses"], {}
+    yield "result_cache_bytes", "gauge", "Result cache memory use.", cache["bytes"], {}
+
+    for path, entry in model_stats().items():
+        yield "model_load_seconds", "gauge", "Last load time per model.", entry.get("load_s"), {"model": Path(path).name}
+
+    cam = camera.stats()
+    yield "camera_connected", "gauge", "1 while the camera stream is open.", int(cam["connected"]), {"camera": "esp32"}
+    yield "camera_frames_total", "counter", "Frames received from the camera.", cam["frames"], {"camera": "esp32"}
+    yield "camera_reconnects_total", "counter", "Camera reconnects.", cam["reconnects"], {"camera": "esp32"}
+
+    feed = live_broadcaster.stats()
+    yield "live_viewers", "gauge", "Connected video_feed clients.", feed["subscribers"], {"feed": "esp32"}
+    yield "live_frames_total", "counter", "Live frames processed.", feed["frames_produced"], {"feed": "esp32"}
+    yield "live_frames_dropped_total", "counter", "Frames dropped for slow viewers.", feed["frames_dropped"], {"feed": "esp32"}
+    gate = live_gate.stats()
+    yield "live_detections_total", "counter", "Live frames that ran detection.", gate["detections"], {"feed": "esp32"}
+    yield "live_detections_skipped_total", "counter", "Live frames served from the motion gate.", gate["skipped"], {"feed": "esp32"}
+    if live_tracker is not None:
+        yield "particles_unique_total", "counter", "Unique particles tracked.", live_tracker.unique_count, {"feed": "esp32"}
+
+    for cam_id in camera_manager.ids():
+        pipeline = camera_manager.get(cam_id)
+        if pipeline is None:
+            continue
+        st = pipeline.stats()
+        src = st["camera"]
+        labels = {"camera": cam_id}
+        yield "camera_frames_total", "counter", "Frames received from the camera.", src.get("frames"), labels
+        yield "camera_reconnects_total", "counter", "Camera reconnects.", src.get("reconnects"), labels
+        yield "live_viewers", "gauge", "Connected video_feed clients.", st["viewers"], {"feed": cam_id}
+        yield "live_frames_total", "counter", "Live frames processed.", st["frames"], {"feed": cam_id}
+        yield "live_errors_total", "counter", "Live pipeline errors.", st["errors"], {"feed": cam_id}
+        yield "live_detections_skipped_total", "counter", "Live frames served from the motion gate.", st["gating"]["skipped"], {"feed": cam_id}
+
+    if serial_ingester is not None:
+        ser = serial_ingester.stats()
+        yield "serial_queue_depth", "gauge", "Serial frames waiting for inference.", ser["queue_depth"], {}
+        yield "serial_frames_total", "counter", "Serial frames received.", ser["frames"], {}
+        yield "serial_frames_dropped_total", "counter", "Serial frames dropped (queue full).", ser["dropped"], {}
+        yield "serial_reconnects_total", "counter", "Serial port reconnects.", ser["reconnects"], {}
+
+    tel = telemetry.stats()
+    yield "telemetry_buffered", "gauge", "Live samples waiting to be written.", tel["buffered"], {}
+    yield "telemetry_recorded_total", "counter", "Live samples recorded.", tel["recorded"], {}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    text = await run_blocking(metrics.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/stages")
+async def stage_metrics():
+    return metrics.stage_stats()
 
 # ================================
 # Run server
 # ================================
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("backend.server.app:app", host="0.0.0.0", port=8000, reload=True)
+    # production launch; WORKERS=N for N pinned workers (dev: uvicorn backend.server.app:app --reload)
+    from backend.server.serve import main
+    main()
@@ -0,0 +1,150 @@
+"""
+server/broadcaster.py
+Single-producer, many-subscriber fan-out for the live MJPEG feed.
+
+One producer thread builds each item once (fetch + detect + draw + encode) and
+hands the same bytes to every subscriber. Each subscriber has a small bounded
+asyncio queue; when a slow client falls behind, its oldest frame is dropped
+(and counted) so it always gets the freshest frame without slowing anyone else.
+The producer only runs while at least one client is subscribed.
+
+Example usage:
+    broadcaster = FrameBroadcaster(produce_multipart_chunk, min_interval=0.1)
+
+    @app.get("/video")
+    async def video():
+        return StreamingResponse(broadcaster.stream(), media_type=...)
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+
+
+class Subscriber:
+    def __init__(self, sub_id, loop, queue_size):
+        self.id = sub_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.sent = 0
+        self.dropped = 0
+        self.connected_at = time.time()
+
+    def _offer(self, item):
+        # runs on the subscriber's event loop
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(item)
+
+
+class FrameBroadcaster:
+    def __init__(self, produce, min_interval=0.1, queue_size=2, name="broadcaster", on_idle=None):
+        """
+        produce: callable returning the bytes to broadcast, or None to skip
+                 this tick (e.g. no new camera frame yet). Runs on the
+                 producer thread.
+        min_interval: minimum seconds between two produce() calls.
+        on_idle: called on the producer thread when the last subscriber has
+                 left and the producer stops (e.g. to close an upstream).
+        """
+        self.produce = produce
+        self.on_idle = on_idle
+        self.min_interval = min_interval
+        self.queue_size = queue_size
+        self.name = name
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+        self._thread = None
+        self._produced = 0
+        self._errors = 0
+        self._dropped_gone = 0  # drops of clients that have disconnected
+
+    # ------------------------------------------------------------------
+    # subscribers
+    # ------------------------------------------------------------------
+    def subscribe(self):
+        """
+        Register a subscriber on the running event loop and start the
+        producer if it is idle.
+        """
+        sub = Subscriber(next(self._ids), asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers[sub.id] = sub
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if self._subscribers.pop(sub.id, None) is not None:
+                self._dropped_gone += sub.dropped
+
+    async def stream(self):
+        """
+        Async generator yielding broadcast items for one client.
+        """
+        sub = self.subscribe()
+        try:
+            while True:
+                item = await sub.queue.get()
+                sub.sent += 1
+                yield item
+        finally:
+            self.unsubscribe(sub)
+
+    def stats(self):
+        with self._lock:
+            subs = list(self._subscribers.values())
+            produced, errors = self._produced, self._errors
+            dropped = self._dropped_gone + sum(s.dropped for s in subs)
+            running = self._thread is not None
+        return {
+            "subscribers": len(subs),
+            "producer_running": running,
+            "frames_produced": produced,
+            "producer_errors": errors,
+            "frames_dropped": dropped,
+            "clients": [
+                {"id": s.id, "sent": s.sent, "dropped": s.dropped,
+                 "queued": s.queue.qsize(), "connected_s": round(time.time() - s.connected_at, 1)}
+                for s in subs
+            ],
+        }
+
+    # ------------------------------------------------------------------
+    # producer thread
+    # ------------------------------------------------------------------
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    break
+            t0 = time.perf_counter()
+            try:
+                item = self.produce()
+            except Exception as e:
+                print(f"{self.name} producer error: {e}")
+                item = None
+                with self._lock:
+                    self._errors += 1
+            if item is not None:
+                self._publish(item)
+            time.sleep(max(0.0, self.min_interval - (time.perf_counter() - t0)))
+        if self.on_idle is not None:
+            self.on_idle()
+
+    def _publish(self, item):
+        with self._lock:
+            subs = list(self._subscribers.values())
+            self._produced += 1
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._offer, item)
+            except RuntimeError:
+                # loop closed under us; the client is gone
+                self.unsubscribe(sub)
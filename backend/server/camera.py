@@ -0,0 +1,230 @@
+"""
+server/camera.py
+Long-lived MJPEG camera reader.
+
+One background thread keeps a single HTTP connection to the camera open,
+splits the multipart stream into JPEGs by scanning for the SOI/EOI markers in
+a preallocated bytearray, and keeps only the newest frame. Every consumer
+(each /esp32/video_feed client, the stats logger, ...) reads that shared frame
+instead of opening its own connection. Dropped connections are retried with
+exponential backoff.
+
+Example usage:
+    reader = MJPEGReader("http://10.190.245.60:8080/video")
+    reader.start()
+    frame, seq = reader.latest_frame()     # BGR ndarray (or None), sequence number
+"""
+
+import threading
+import time
+import urllib.request
+
+import cv2
+import numpy as np
+
+SOI = b"\xff\xd8"
+EOI = b"\xff\xd9"
+
+
+class MJPEGReader:
+    def __init__(self, url, chunk_size=16384, buffer_size=4 * 1024 * 1024,
+                 timeout=5, initial_backoff=0.5, max_backoff=10.0, poll_interval=0.0):
+        """
+        poll_interval: pause before reconnecting after a connection that did
+        deliver frames. 0 for MJPEG streams; set it (e.g. 0.1) for snapshot
+        URLs such as cam-lo.jpg, which close after one image.
+        """
+        self.url = url
+        self.poll_interval = poll_interval
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+        # parse buffer: bytes [0, _fill) are valid; reused for the whole session
+        self._buf = bytearray(buffer_size)
+        self._fill = 0
+        self._scan = 0     # where the next marker search resumes
+        self._soi = -1     # start of the frame being assembled, -1 if none
+
+        self._cond = threading.Condition()
+        self._jpeg = None
+        self._seq = 0
+        self._frame_ts = 0.0
+        self._decoded = None
+        self._decoded_seq = -1
+
+        self._thread = None
+        self._running = False
+        self._stats = {
+            "connected": False,
+            "frames": 0,
+            "reconnects": 0,
+            "overflows": 0,
+            "last_error": None,
+        }
+
+    # ------------------------------------------------------------------
+    # lifecycle
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="mjpeg-reader", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._running
+
+    # ------------------------------------------------------------------
+    # consumers
+    # ------------------------------------------------------------------
+    def latest_jpeg(self):
+        """
+        Return (jpeg_bytes, seq) of the newest frame; (None, 0) before the first one.
+        """
+        with self._cond:
+            return self._jpeg, self._seq
+
+    def latest_frame(self):
+        """
+        Return (frame_bgr, seq) of the newest frame. Decoding happens at most
+        once per frame, on the first call that asks for it.
+        """
+        with self._cond:
+            jpeg, seq = self._jpeg, self._seq
+            if seq == self._decoded_seq:
+                return self._decoded, seq
+        if jpeg is None:
+            return None, 0
+        frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        with self._cond:
+            if seq > self._decoded_seq:
+                self._decoded, self._decoded_seq = frame, seq
+        return frame, seq
+
+    def wait_for_frame(self, after_seq=0, timeout=1.0):
+        """
+        Block until a frame newer than after_seq is available (or timeout).
+        Returns the newest seq.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after_seq or not self._running, timeout=timeout)
+            return self._seq
+
+    def stats(self):
+        with self._cond:
+            out = dict(self._stats)
+            out["seq"] = self._seq
+            out["frame_age_s"] = round(time.time() - self._frame_ts, 3) if self._frame_ts else None
+        out["url"] = self.url
+        return out
+
+    # ------------------------------------------------------------------
+    # reader thread
+    # ------------------------------------------------------------------
+    def _run(self):
+        backoff = self.initial_backoff
+        while self._running:
+            got_frame = False
+            try:
+                with urllib.request.urlopen(self.url, timeout=self.timeout) as resp:
+                    self._set_stat("connected", True)
+                    self._reset_buffer()
+                    while self._running:
+                        data = resp.read1(self.chunk_size)
+                        if not data:
+                            break
+                        if self._feed(data):
+                            got_frame = True
+                            backoff = self.initial_backoff
+            except Exception as e:
+                self._set_stat("last_error", str(e))
+                print(f"Camera reader error: {e}")
+            self._set_stat("connected", False)
+            if not self._running:
+                break
+            with self._cond:
+                self._stats["reconnects"] += 1
+            if got_frame:
+                if self.poll_interval > 0:
+                    with self._cond:
+                        self._cond.wait(timeout=self.poll_interval)
+            else:
+                # only back off when the connection produced nothing useful
+                with self._cond:
+                    self._cond.wait(timeout=backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def _reset_buffer(self):
+        self._fill = 0
+        self._scan = 0
+        self._soi = -1
+
+    def _feed(self, data):
+        """
+        Append data to the parse buffer and publish every complete JPEG found.
+        Only bytes not yet scanned are searched. Returns True if a frame was
+        published.
+        """
+        n = len(data)
+        if self._fill + n > len(self._buf):
+            # a frame larger than the buffer (or garbage): drop what we have
+            with self._cond:
+                self._stats["overflows"] += 1
+            self._reset_buffer()
+            if n > len(self._buf):
+                return False
+        self._buf[self._fill:self._fill + n] = data
+        self._fill += n
+
+        published = False
+        while True:
+            if self._soi < 0:
+                # markers are 2 bytes, so back up one in case one straddles chunks
+                start = self._buf.find(SOI, max(self._scan - 1, 0), self._fill)
+                if start < 0:
+                    # nothing to keep except a possible first half of a marker
+                    if self._fill > 1:
+                        self._buf[0] = self._buf[self._fill - 1]
+                        self._fill = 1
+                    self._scan = self._fill
+                    break
+                self._soi = start
+                self._scan = start + 2
+            end = self._buf.find(EOI, max(self._scan - 1, self._soi + 2), self._fill)
+            if end < 0:
+                self._scan = self._fill
+                break
+            self._publish(bytes(self._buf[self._soi:end + 2]))
+            published = True
+            # move the unparsed tail to the front of the buffer
+            tail = self._fill - (end + 2)
+            self._buf[0:tail] = self._buf[end + 2:self._fill]
+            self._fill = tail
+            self._scan = 0
+            self._soi = -1
+        return published
+
+    def _publish(self, jpeg):
+        with self._cond:
+            self._jpeg = jpeg
+            self._seq += 1
+            self._frame_ts = time.time()
+            self._stats["frames"] += 1
+            self._cond.notify_all()
+
+    def _set_stat(self, key, value):
+        with self._cond:
+            self._stats[key] = value
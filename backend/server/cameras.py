@@ -0,0 +1,377 @@
+"""
+server/cameras.py
+Multi-camera manager: one independent pipeline per sampling station.
+
+Each registered camera gets its own frame source (MJPEG stream, snapshot URL
+such as cam-lo.jpg, or serial port), its own worker thread limited to
+`max_fps`, its own detector, stats and broadcaster. Pipelines share nothing on
+the hot path, so cost grows linearly with the number of cameras. YOLO
+pipelines hand frames to the shared micro-batching InferenceScheduler with at
+most one frame in flight per camera, so a fast camera cannot starve the
+others and frames from different cameras are batched together. Each pipeline
+has its own MotionGate, so a static sample reuses its last boxes instead of
+re-running detection on every frame, and its own ParticleTracker, so
+"objects" is the tracked particle count and stats carry a unique total.
+
+Cameras can be configured with the CAMERAS env var, either as
+"id=source,id=source" or as a JSON list:
+
+    CAMERAS="tank1=http://10.0.0.5:8080/video,tank2=http://10.0.0.6/cam-lo.jpg,tank3=serial:/dev/ttyUSB0@921600"
+    CAMERAS='[{"id": "tank1", "source": "http://10.0.0.5:8080/video", "detector": "yolo", "max_fps": 5}]'
+
+Example usage:
+    manager = CameraManager(scheduler=scheduler)
+    manager.add("tank1", "http://10.0.0.5:8080/video", max_fps=10)
+    manager.get("tank1").stats()
+    manager.stats()      # per-camera stats plus totals
+"""
+
+import json
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from backend.inference import metrics
+from backend.inference.contours import ContourDetector, water_stats
+from backend.inference.detections import Detections
+from backend.inference.motion import MotionGate
+from backend.inference.tracker import ParticleTracker
+from backend.inference.utils import draw_boxes_on_image
+from backend.server.broadcaster import FrameBroadcaster
+from backend.server.camera import MJPEGReader
+from backend.server.serial_ingest import SerialIngester
+
+SOURCE_KINDS = ("mjpeg", "snapshot", "serial")
+DETECTORS = ("classical", "yolo")
+
+
+def guess_kind(source):
+    if source.startswith("serial:"):
+        return "serial"
+    path = source.split("?", 1)[0].lower()
+    if path.endswith((".jpg", ".jpeg")) or path.endswith("/capture"):
+        return "snapshot"
+    return "mjpeg"
+
+
+def parse_cameras(spec):
+    """
+    Parse the CAMERAS setting into a list of camera config dicts.
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        return []
+    if spec.startswith("["):
+        return json.loads(spec)
+    cameras = []
+    for item in spec.split(","):
+        cam_id, _, source = item.strip().partition("=")
+        if not cam_id or not source:
+            raise ValueError(f"invalid camera entry {item!r}, expected id=source")
+        cameras.append({"id": cam_id.strip(), "source": source.strip()})
+    return cameras
+
+
+class SerialFrameSource:
+    """
+    Adapts SerialIngester to the MJPEGReader consumer API
+    (latest_frame / wait_for_frame / stats) used by CameraPipeline.
+    """
+
+    def __init__(self, port, baudrate=921600):
+        self._cond = threading.Condition()
+        self._jpeg = None
+        self._seq = 0
+        self._decoded = None
+        self._decoded_seq = -1
+        self.ingester = SerialIngester(port, baudrate, on_frame=self._publish, queue_size=2)
+
+    def _publish(self, jpeg, seq):
+        with self._cond:
+            self._jpeg = jpeg
+            self._seq += 1
+            self._cond.notify_all()
+
+    def start(self):
+        self.ingester.start()
+        return self
+
+    def stop(self):
+        self.ingester.stop()
+        with self._cond:
+            self._cond.notify_all()
+
+    def latest_frame(self):
+        with self._cond:
+            jpeg, seq = self._jpeg, self._seq
+            if seq == self._decoded_seq:
+                return self._decoded, seq
+        if jpeg is None:
+            return None, 0
+        frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        with self._cond:
+            if seq > self._decoded_seq:
+                self._decoded, self._decoded_seq = frame, seq
+        return frame, seq
+
+    def wait_for_frame(self, after_seq=0, timeout=1.0):
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after_seq or not self.ingester.running, timeout=timeout)
+            return self._seq
+
+    def stats(self):
+        return self.ingester.stats()
+
+
+def open_source(source, kind=None):
+    kind = kind or guess_kind(source)
+    if kind == "serial":
+        port, _, baud = source[len("serial:"):].partition("@") if source.startswith("serial:") else (source, "", "")
+        return SerialFrameSource(port, int(baud) if baud else 921600)
+    if kind == "snapshot":
+        # snapshot URLs close after one image; poll instead of reconnect-storming
+        return MJPEGReader(source, poll_interval=0.1)
+    if kind == "mjpeg":
+        return MJPEGReader(source)
+    raise ValueError(f"unknown camera kind {kind!r}, expected one of {SOURCE_KINDS}")
+
+
+class CameraPipeline:
+    def __init__(self, cam_id, source, kind=None, detector="classical", max_fps=10.0, water_ml=100,
+                 mm_per_pixel=None, scheduler=None, conf_thresh=0.25, iou=0.45, motion_threshold=0.2,
+                 max_staleness=2.0, tracking=True):
+        """
+        detector: "classical" (ContourDetector, runs on this camera's thread)
+                  or "yolo" (needs `scheduler`, an InferenceScheduler).
+        motion_threshold, max_staleness: see MotionGate; a threshold <= 0
+                  detects every frame.
+        tracking: count tracked particles (ParticleTracker) instead of the
+                  raw per-frame detections.
+        """
+        if detector not in DETECTORS:
+            raise ValueError(f"unknown detector {detector!r}, expected one of {DETECTORS}")
+        if detector == "yolo" and scheduler is None:
+            raise ValueError("yolo detector needs an inference scheduler")
+        self.id = cam_id
+        self.source_url = source
+        self.kind = kind or guess_kind(source)
+        self.detector = detector
+        self.max_fps = max_fps
+        self.water_ml = water_ml
+        self.mm_per_pixel = mm_per_pixel
+        self.scheduler = scheduler
+        self.conf_thresh = conf_thresh
+        self.iou = iou
+
+        self.source = open_source(source, self.kind)
+        self._contours = ContourDetector(mm_per_pixel=mm_per_pixel)
+        self.gate = MotionGate(threshold=motion_threshold, max_staleness=max_staleness)
+        self.tracker = ParticleTracker(mm_per_pixel=mm_per_pixel) if tracking else None
+        self._cond = threading.Condition()
+        self._chunk = None
+        self._out_seq = 0
+        self._sent_seq = 0
+        self._thread = None
+        self._running = False
+        self._stats = {
+            "objects": 0,
+            "grams_per_ml": 0.0,
+            "percent_plastic": 0.0,
+            "percent_water": 100.0,
+            "water_ml": water_ml,
+            "unique_particles": 0,
+            "frames": 0,
+            "errors": 0,
+            "last_error": None,
+            "process_ms": 0.0,
+            "updated_at": None,
+        }
+        self.broadcaster = FrameBroadcaster(self._next_chunk, min_interval=0.0, queue_size=2,
+                                            name=f"camera-{cam_id}-feed")
+
+    # ------------------------------------------------------------------
+    # lifecycle
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self.source.start()
+        self._thread = threading.Thread(target=self._run, name=f"camera-{self.id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2):
+        self._running = False
+        self.source.stop()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    # ------------------------------------------------------------------
+    # consumers
+    # ------------------------------------------------------------------
+    def stats(self):
+        with self._cond:
+            out = dict(self._stats)
+            out["seq"] = self._out_seq
+        out.update({
+            "id": self.id,
+            "source": self.source_url,
+            "kind": self.kind,
+            "detector": self.detector,
+            "max_fps": self.max_fps,
+            "running": self._running,
+            "camera": self.source.stats(),
+            "viewers": self.broadcaster.stats()["subscribers"],
+            "gating": self.gate.stats(),
+            "tracking": self.tracker.stats() if self.tracker is not None else None,
+        })
+        return out
+
+    def _next_chunk(self):
+        # broadcaster producer: hand out each processed frame once
+        seq = self._sent_seq
+        with self._cond:
+            self._cond.wait_for(lambda: self._out_seq > seq or not self._running, timeout=1.0)
+            if self._out_seq == seq:
+                return None
+            self._sent_seq = self._out_seq
+            return self._chunk
+
+    # ------------------------------------------------------------------
+    # worker
+    # ------------------------------------------------------------------
+    def _detect_yolo(self, frame):
+        return self.scheduler.submit(frame, conf_thresh=self.conf_thresh, iou=self.iou,
+                                     mm_per_pixel=self.mm_per_pixel, layout="columns").result()
+
+    def _process(self, frame):
+        if self.detector == "yolo":
+            res, detected = self.gate.run(frame, self._detect_yolo)
+            dets = Detections.from_any(res["detections"])
+            frame = draw_boxes_on_image(frame, dets)
+            boxes = dets.xyxy.astype(np.float64)
+            boxes[:, 2:] -= boxes[:, :2]
+            return frame, self._count(res["summary"]["count"], boxes, detected)
+        frame = frame.copy()  # drawing must not touch the source's shared frame
+        result, detected = self.gate.run(frame, self._contours.detect)
+        self._contours.draw(frame, result)
+        return frame, self._count(result["objects"], result["boxes"], detected)
+
+    def _count(self, objects, boxes, detected):
+        # boxes: x, y, w, h; frames the gate skipped are not fed to the tracker
+        if self.tracker is None:
+            return objects
+        if detected:
+            self.tracker.update(boxes)
+        return self.tracker.active_count
+
+    def _run(self):
+        interval = 1.0 / self.max_fps if self.max_fps else 0.0
+        seen = 0
+        while self._running:
+            t0 = time.perf_counter()
+            self.source.wait_for_frame(seen, timeout=1.0)
+            frame, seq = self.source.latest_frame()
+            if frame is None or seq == seen:
+                continue
+            seen = seq
+            try:
+                with metrics.span("camera_process"):
+                    annotated, objects = self._process(frame)
+                with metrics.span("camera_encode"):
+                    ok, buf = cv2.imencode(".jpg", annotated)
+                chunk = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + buf.tobytes() + b"\r\n"
+                update = water_stats(objects, self.water_ml)
+                if self.tracker is not None:
+                    update["unique_particles"] = self.tracker.unique_count
+                with self._cond:
+                    self._stats.update(update)
+                    self._stats["frames"] += 1
+                    self._stats["process_ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+                    self._stats["updated_at"] = time.time()
+                    self._chunk = chunk
+                    self._out_seq += 1
+                    self._cond.notify_all()
+            except Exception as e:
+                with self._cond:
+                    self._stats["errors"] += 1
+                    self._stats["last_error"] = str(e)
+                print(f"Camera {self.id} pipeline error: {e}")
+            time.sleep(max(0.0, interval - (time.perf_counter() - t0)))
+
+
+class CameraManager:
+    def __init__(self, scheduler=None, water_ml=100, mm_per_pixel=None, motion_threshold=0.2, max_staleness=2.0):
+        self.scheduler = scheduler
+        self.water_ml = water_ml
+        self.mm_per_pixel = mm_per_pixel
+        self.motion_threshold = motion_threshold
+        self.max_staleness = max_staleness
+        self._lock = threading.Lock()   # registration only, never per frame
+        self._pipelines = {}
+
+    def add(self, cam_id, source, kind=None, detector="classical", max_fps=10.0, start=True, **options):
+        options.setdefault("water_ml", self.water_ml)
+        options.setdefault("mm_per_pixel", self.mm_per_pixel)
+        options.setdefault("motion_threshold", self.motion_threshold)
+        options.setdefault("max_staleness", self.max_staleness)
+        pipeline = CameraPipeline(cam_id, source, kind, detector, max_fps, scheduler=self.scheduler, **options)
+        with self._lock:
+            if cam_id in self._pipelines:
+                raise ValueError(f"camera {cam_id!r} already registered")
+            self._pipelines = {**self._pipelines, cam_id: pipeline}
+        if start:
+            pipeline.start()
+        return pipeline
+
+    def add_from_config(self, configs):
+        for cfg in configs:
+            cfg = dict(cfg)
+            self.add(cfg.pop("id"), cfg.pop("source"), **cfg)
+
+    def remove(self, cam_id):
+        with self._lock:
+            pipelines = dict(self._pipelines)
+            pipeline = pipelines.pop(cam_id, None)
+            self._pipelines = pipelines
+        if pipeline is not None:
+            pipeline.stop()
+        return pipeline is not None
+
+    def get(self, cam_id):
+        # readers use the current snapshot of the (copy-on-write) dict: no lock
+        return self._pipelines.get(cam_id)
+
+    def ids(self):
+        return list(self._pipelines)
+
+    def start(self):
+        for pipeline in self._pipelines.values():
+            pipeline.start()
+
+    def stop(self):
+        for pipeline in self._pipelines.values():
+            pipeline.stop()
+
+    def stats(self):
+        cameras = [p.stats() for p in self._pipelines.values()]
+        live = [c for c in cameras if c["updated_at"] is not None]
+        return {
+            "cameras": cameras,
+            "totals": {
+                "cameras": len(cameras),
+                "active": len(live),
+                "objects": sum(c["objects"] for c in live),
+                "unique_particles": sum(c["unique_particles"] for c in cameras),
+                "mean_percent_plastic": round(sum(c["percent_plastic"] for c in live) / len(live), 2) if live else 0.0,
+                "frames": sum(c["frames"] for c in cameras),
+                "errors": sum(c["errors"] for c in cameras),
+                "viewers": sum(c["viewers"] for c in cameras),
+            },
+        }
@@ -0,0 +1,46 @@
+"""
+server/executor.py
+Shared thread pool for blocking work (OpenCV, disk I/O, camera requests) so
+that async FastAPI handlers never run it on the event loop.
+
+OpenCV and file I/O release the GIL, so threads give real parallelism here.
+The pool size is set with the CPU_WORKERS env var (default: number of cores).
+
+Example usage:
+    from backend.server.executor import run_blocking
+    frame = await run_blocking(cv2.imread, path)
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 4)))
+
+_executor = None
+
+
+def get_executor():
+    """
+    Return the process-wide pool, creating it on first use.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+    return _executor
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) on the shared pool and await its result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown(wait=False):
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
@@ -0,0 +1,120 @@
+"""
+server/fake_mjpeg.py
+Local fake ESP32 camera for offline development.
+
+Serves synthetic frames (dark background with a few drifting bright
+"particles") as:
+    /video       multipart/x-mixed-replace MJPEG stream (like CAM_URL)
+    /cam-lo.jpg  single JPEG snapshot (like esp32_stream.ESP32_URL + "cam-lo.jpg")
+
+Example usage:
+    python -m backend.server.fake_mjpeg --port 8081 --fps 10
+    CAM_URL=http://127.0.0.1:8081/video uvicorn backend.server.app:app --port 8000
+
+Or from Python:
+    server, url = start_fake_camera(port=0)   # port 0 picks a free port
+    ...
+    server.shutdown()
+"""
+
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+BOUNDARY = "frame"
+
+
+def make_frame(index, width=320, height=240, particles=12, seed=0):
+    """
+    Render synthetic frame number `index`. Particles move deterministically so
+    consecutive frames differ slightly, like a real sample under a camera.
+    """
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(0, 1, (particles, 2)) * (width, height)
+    vel = rng.uniform(-2, 2, (particles, 2))
+    radius = rng.integers(3, 9, particles)
+    frame = np.full((height, width, 3), 30, dtype=np.uint8)
+    pts = (pos + vel * index) % (width, height)
+    for (x, y), r in zip(pts.astype(int), radius):
+        cv2.circle(frame, (int(x), int(y)), int(r), (220, 220, 220), -1)
+    cv2.putText(frame, str(index), (5, height - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 0), 1)
+    return frame
+
+
+def encode_jpeg(frame, quality=80):
+    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buf.tobytes()
+
+
+def make_handler(fps, width, height, particles):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith("/cam-lo.jpg") or self.path.startswith("/capture"):
+                jpg = encode_jpeg(make_frame(int(time.time() * fps), width, height, particles))
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(jpg)))
+                self.end_headers()
+                self.wfile.write(jpg)
+                return
+            if not self.path.startswith("/video"):
+                self.send_error(404)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+            self.end_headers()
+            index = 0
+            period = 1.0 / fps if fps > 0 else 0
+            try:
+                while True:
+                    t0 = time.perf_counter()
+                    jpg = encode_jpeg(make_frame(index, width, height, particles))
+                    self.wfile.write(
+                        f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpg)}\r\n\r\n".encode()
+                        + jpg + b"\r\n"
+                    )
+                    self.wfile.flush()
+                    index += 1
+                    time.sleep(max(0.0, period - (time.perf_counter() - t0)))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+def start_fake_camera(host="127.0.0.1", port=0, fps=10, width=320, height=240, particles=12):
+    """
+    Start the fake camera in a background thread.
+    Returns (server, base_url); the MJPEG stream is at base_url + "video".
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(fps, width, height, particles))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-mjpeg", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--fps", type=float, default=10)
+    parser.add_argument("--width", type=int, default=320)
+    parser.add_argument("--height", type=int, default=240)
+    parser.add_argument("--particles", type=int, default=12)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port),
+                                 make_handler(args.fps, args.width, args.height, args.particles))
+    print(f"Fake camera at http://{args.host}:{args.port}/video (snapshot: /cam-lo.jpg)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
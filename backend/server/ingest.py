@@ -0,0 +1,197 @@
+"""
+server/ingest.py
+Upload ingestion: streamed, content-addressed storage plus background jobs.
+
+store_upload reads an UploadFile in chunks and writes them to a temporary
+file on the shared blocking pool while hashing them, so neither the whole
+upload nor a synchronous disk write ever sits on the event loop. The file
+is then renamed to <sha256><ext>: concurrent uploads never overwrite each
+other, and identical images are stored once (a second copy is discarded).
+
+JobStore keeps the state of background detections for /jobs/{id}:
+queued -> running -> done | error, with timestamps, the result and the
+error message. It is bounded; the oldest finished jobs are forgotten first.
+With a shared store (server/shared_state.py) every state change is also
+written there, so /jobs/{id} works on any worker, not just the one that
+accepted the upload.
+
+Example usage:
+    stored = await store_upload(file, UPLOAD_DIR)
+    job, created = jobs.create(stored.name, sha256=stored.sha256)
+    ...
+    jobs.update(job["id"], status="done", result=res)
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from backend.server.executor import run_blocking
+
+CHUNK_SIZE = 1 << 20
+PRUNE_EVERY = 100     # shared-store job records are trimmed to max_jobs every N creates
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+JOB_STATES = ("queued", "running", "done", "error")
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@dataclass
+class StoredUpload:
+    path: Path
+    sha256: str
+    size: int
+    duplicate: bool      # an identical file was already stored
+
+    @property
+    def name(self):
+        return self.path.name
+
+
+def _extension(filename):
+    ext = Path(filename or "").suffix.lower()
+    return ext if ext in IMAGE_EXTENSIONS else ".jpg"
+
+
+def _write_chunk(f, h, chunk):
+    # hash and write together: one hop to the pool per chunk
+    h.update(chunk)
+    f.write(chunk)
+
+
+def _finish(tmp, path):
+    if path.exists():
+        tmp.unlink(missing_ok=True)
+        return True
+    os.replace(tmp, path)
+    return False
+
+
+async def store_upload(upload, directory, chunk_size=CHUNK_SIZE, max_bytes=None):
+    """
+    Stream an UploadFile to <directory>/<sha256><ext>. Raises UploadTooLarge
+    (nothing is kept) when the upload exceeds max_bytes.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp = directory / f".upload.{uuid.uuid4().hex}.part"
+    h = hashlib.sha256()
+    size = 0
+    f = await run_blocking(open, tmp, "wb")
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise UploadTooLarge(f"upload larger than {max_bytes} bytes")
+            await run_blocking(_write_chunk, f, h, chunk)
+        await run_blocking(f.close)
+        path = directory / f"{h.hexdigest()}{_extension(upload.filename)}"
+        duplicate = await run_blocking(_finish, tmp, path)
+    except BaseException:
+        f.close()
+        tmp.unlink(missing_ok=True)
+        raise
+    return StoredUpload(path, h.hexdigest(), size, duplicate)
+
+
+def _public(job):
+    return {k: v for k, v in job.items() if not k.startswith("_")}
+
+
+class JobStore:
+    def __init__(self, max_jobs=10000, store=None):
+        self.max_jobs = max_jobs
+        self.store = store
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()     # id -> job dict
+        self._active = {}              # (sha256, key) -> id of a queued/running job
+        self._stats = {"created": 0, "reused": 0, "done": 0, "error": 0}
+
+    def create(self, filename, sha256=None, key=None, **fields):
+        """
+        New queued job, or the queued/running job already working on the
+        same content (sha256) with the same `key`. Returns (job, created).
+        """
+        with self._lock:
+            active_id = self._active.get((sha256, key)) if sha256 else None
+            if active_id is not None and active_id in self._jobs:
+                self._stats["reused"] += 1
+                return _public(self._jobs[active_id]), False
+            job = {"id": uuid.uuid4().hex, "status": "queued", "filename": filename, "sha256": sha256,
+                   "created": time.time(), "started": None, "finished": None, "result": None, "error": None,
+                   **fields}
+            self._jobs[job["id"]] = job
+            if sha256:
+                self._active[(sha256, key)] = job["id"]
+                job["_active_key"] = (sha256, key)
+            self._stats["created"] += 1
+            self._evict()
+            out = _public(job)
+            prune = self.store is not None and self._stats["created"] % PRUNE_EVERY == 0
+        if self.store is not None:
+            self.store.put_record("job", out["id"], out)
+            if prune:
+                self.store.prune_records("job", self.max_jobs)
+        return out, True
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            status = fields.get("status")
+            if status == "running":
+                fields.setdefault("started", time.time())
+            elif status in ("done", "error"):
+                fields.setdefault("finished", time.time())
+                active_key = job.get("_active_key")
+                if active_key is not None and self._active.get(active_key) == job_id:
+                    del self._active[active_key]
+                self._stats[status] += 1
+            job.update(fields)
+            out = _public(job)
+        if self.store is not None:
+            self.store.put_record("job", job_id, out)
+        return out
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return _public(job)
+        # accepted by another worker
+        return self.store.get_record("job", job_id) if self.store is not None else None
+
+    def _evict(self):
+        # drop the oldest finished jobs; queued/running ones are kept
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        stale = []
+        for job_id, job in self._jobs.items():
+            if job["status"] in ("done", "error"):
+                stale.append(job_id)
+                if len(stale) >= excess:
+                    break
+        for job_id in stale:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            counts = {s: 0 for s in JOB_STATES}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+        out.update(counts)
+        out["max_jobs"] = self.max_jobs
+        return out
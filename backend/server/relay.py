@@ -0,0 +1,90 @@
+"""
+server/relay.py
+Serving another worker's routes from this one.
+
+With several workers (server/serve.py) only the leader runs the live camera
+pipelines, so the other workers pass those routes on to it over loopback:
+
+    FeedRelay   re-broadcasts one MJPEG feed of the leader. One upstream
+                connection per feed and worker, however many viewers are
+                attached, opened on the first viewer and closed after the
+                last; follows the leader when it changes.
+    forward     replays a plain request against the leader and returns
+                (status, content type, body).
+
+Example usage:
+    relay = FeedRelay(lambda: leader_url(), "/cameras/tank1/video_feed")
+    return StreamingResponse(relay.stream(), media_type="multipart/x-mixed-replace; boundary=frame")
+    status, ctype, body = forward(leader_url(), "GET", "/cameras/tank1/stats")
+"""
+
+import urllib.error
+import urllib.request
+
+from backend.server.broadcaster import FrameBroadcaster
+from backend.server.camera import MJPEGReader
+
+FORWARD_TIMEOUT_S = 10
+# request headers worth passing on; hop-by-hop ones and Host are not
+FORWARD_HEADERS = ("content-type", "accept", "if-none-match")
+
+
+class FeedRelay:
+    def __init__(self, base_url, path):
+        """
+        base_url: callable returning the leader's base URL (or None while
+                  there is none); asked again on every frame.
+        path: the feed's path (and query) on the leader.
+        """
+        self.base_url = base_url
+        self.path = path
+        self.reader = None
+        self._seq = 0
+        self.broadcaster = FrameBroadcaster(self._next_chunk, min_interval=0.0, queue_size=2,
+                                            name=f"relay-{path}", on_idle=self.close)
+
+    def stream(self):
+        return self.broadcaster.stream()
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.stop()
+
+    def _next_chunk(self):
+        base = self.base_url()
+        if base is None:
+            self.close()
+            return None
+        url = base + self.path
+        if self.reader is None or self.reader.url != url:
+            # first viewer, or the leader moved: reconnect to the new one
+            self.close()
+            self.reader = MJPEGReader(url)
+            self._seq = 0
+        self.reader.start()
+        seq = self.reader.wait_for_frame(self._seq, timeout=1.0)
+        if seq == self._seq:
+            return None
+        self._seq = seq
+        jpeg, _ = self.reader.latest_jpeg()
+        return b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
+
+    def stats(self):
+        out = self.broadcaster.stats()
+        out["upstream"] = self.reader.stats() if self.reader is not None else None
+        return out
+
+
+def forward(base_url, method, path, headers=None, body=None):
+    """
+    Blocking: send the request to base_url + path and return
+    (status, content type, body bytes). HTTP errors are returned like any
+    other response; an unreachable leader raises URLError.
+    """
+    headers = {k: v for k, v in (headers or {}).items() if k.lower() in FORWARD_HEADERS}
+    req = urllib.request.Request(base_url + path, data=body or None, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=FORWARD_TIMEOUT_S) as resp:
+            return resp.status, resp.headers.get("content-type"), resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers.get("content-type"), e.read()
@@ -0,0 +1,315 @@
+"""
+server/serial_ingest.py
+Streaming ingestion of framed JPEGs sent by the ESP32 over serial (UART or USB-CDC).
+
+The ESP32 sends frames as <IMG>...jpeg bytes...</IMG>. A reader thread reads
+straight into a preallocated bytearray (FrameParser) and only scans bytes it
+has not looked at yet, so frames split across reads cost nothing extra and
+the buffer is compacted only when it runs out of room. Complete frames go on
+a small in-process queue (oldest dropped when consumers fall behind) that an
+on_frame callback drains, e.g. to hand them to the inference scheduler.
+Saving frames to disk is optional and done on a separate writer thread.
+
+Example usage:
+    ingester = SerialIngester("/dev/ttyUSB0", 921600, on_frame=handle_jpeg, save_dir="serial_frames")
+    ingester.start()
+    ...
+    ingester.stats()   # frames, fps, dropped, saved, ...
+
+See backend/bench/serial_loopback.py for a pty-based throughput test.
+"""
+
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+START_MARKER = b"<IMG>"
+END_MARKER = b"</IMG>"
+
+
+class FrameParser:
+    """
+    Incremental splitter for start/end-marker framed payloads.
+
+    Bytes [head, fill) of the buffer are unconsumed. Readers write directly
+    into writable() and call commit(n); each byte is scanned for markers once.
+    """
+
+    def __init__(self, start_marker=START_MARKER, end_marker=END_MARKER, buffer_size=1024 * 1024):
+        self.start_marker = start_marker
+        self.end_marker = end_marker
+        self._buf = bytearray(buffer_size)
+        self._view = memoryview(self._buf)
+        self._head = 0
+        self._fill = 0
+        self._scan = 0      # where the next marker search resumes
+        self._start = -1    # payload start of the frame being assembled, -1 if none
+        self.overflows = 0
+
+    def reset(self):
+        self._head = self._fill = self._scan = 0
+        self._start = -1
+
+    def writable(self, min_free=4096):
+        """
+        Return a memoryview of the free space at the end of the buffer,
+        compacting first if less than min_free bytes are left.
+        """
+        if len(self._buf) - self._fill < min_free and self._head > 0:
+            n = self._fill - self._head
+            self._buf[0:n] = self._buf[self._head:self._fill]
+            shift = self._head
+            self._head, self._fill = 0, n
+            self._scan -= shift
+            if self._start >= 0:
+                self._start -= shift
+        if self._fill == len(self._buf):
+            # one frame bigger than the whole buffer (or a lost end marker)
+            self.overflows += 1
+            self.reset()
+        return self._view[self._fill:]
+
+    def commit(self, n):
+        """
+        Mark n bytes written into writable() as valid and return the list of
+        complete payloads (bytes) found.
+        """
+        self._fill += n
+        return self._parse()
+
+    def feed(self, data):
+        """
+        Copy data in (for sources without readinto) and return complete payloads.
+        """
+        n = len(data)
+        space = self.writable(n)
+        if len(space) >= n:
+            space[:n] = data
+            return self.commit(n)
+        frames = []
+        data = memoryview(data)
+        while len(data):
+            space = self.writable(min(len(data), len(self._buf)))
+            n = min(len(space), len(data))
+            space[:n] = data[:n]
+            data = data[n:]
+            frames.extend(self.commit(n))
+        return frames
+
+    def _parse(self):
+        frames = []
+        buf, sm, em = self._buf, self.start_marker, self.end_marker
+        while True:
+            if self._start < 0:
+                # back up so a marker straddling two reads is still found
+                start = buf.find(sm, max(self._scan - len(sm) + 1, self._head), self._fill)
+                if start < 0:
+                    # drop garbage, keeping what could be a partial marker
+                    self._head = max(self._head, self._fill - len(sm) + 1)
+                    self._scan = self._fill
+                    break
+                self._start = start + len(sm)
+                self._scan = self._start
+            end = buf.find(em, max(self._scan - len(em) + 1, self._start), self._fill)
+            if end < 0:
+                self._scan = self._fill
+                break
+            frames.append(bytes(self._view[self._start:end]))
+            self._head = self._scan = end + len(em)
+            self._start = -1
+        if self._head == self._fill:
+            self._head = self._fill = self._scan = 0
+        return frames
+
+
+class SerialIngester:
+    def __init__(self, port, baudrate=921600, on_frame=None, save_dir=None, queue_size=8,
+                 start_marker=START_MARKER, end_marker=END_MARKER, chunk_size=16384,
+                 buffer_size=1024 * 1024, read_timeout=0.05, initial_backoff=0.5, max_backoff=10.0):
+        """
+        on_frame(jpeg_bytes, seq): called on the ingester's consumer thread for
+                 every frame taken off the queue. Without it, consumers call
+                 get_frame() themselves.
+        save_dir: when set, every frame is also written there as
+                  frame_<seq>.jpg by a background writer thread.
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.on_frame = on_frame
+        self.save_dir = Path(save_dir) if save_dir else None
+        self.chunk_size = chunk_size
+        self.read_timeout = read_timeout
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+
+        self.parser = FrameParser(start_marker, end_marker, buffer_size)
+        self.frames = queue.Queue(maxsize=queue_size)
+        self._writer = None
+        self._reader = None
+        self._consumer = None
+        self._running = False
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._arrivals = collections.deque(maxlen=64)
+        self._stats = {
+            "connected": False,
+            "frames": 0,
+            "bytes": 0,
+            "dropped": 0,
+            "processed": 0,
+            "saved": 0,
+            "errors": 0,
+            "reconnects": 0,
+            "last_error": None,
+        }
+
+    # ------------------------------------------------------------------
+    # lifecycle
+    # ------------------------------------------------------------------
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._stop.clear()
+        if self.save_dir:
+            self.save_dir.mkdir(parents=True, exist_ok=True)
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="serial-writer")
+        self._reader = threading.Thread(target=self._read_loop, name="serial-reader", daemon=True)
+        self._reader.start()
+        if self.on_frame is not None:
+            self._consumer = threading.Thread(target=self._consume_loop, name="serial-consumer", daemon=True)
+            self._consumer.start()
+        return self
+
+    def stop(self, timeout=2):
+        self._running = False
+        self._stop.set()
+        for t in (self._reader, self._consumer):
+            if t is not None:
+                t.join(timeout=timeout)
+        self._reader = self._consumer = None
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+
+    @property
+    def running(self):
+        return self._running
+
+    # ------------------------------------------------------------------
+    # consumers
+    # ------------------------------------------------------------------
+    def get_frame(self, timeout=1.0):
+        """
+        Return the oldest queued (jpeg_bytes, seq, ts), or None on timeout.
+        """
+        try:
+            return self.frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            arrivals = list(self._arrivals)
+        span = arrivals[-1] - arrivals[0] if len(arrivals) > 1 else 0
+        out["fps"] = round((len(arrivals) - 1) / span, 2) if span > 0 else 0.0
+        out["queue_depth"] = self.frames.qsize()
+        out["overflows"] = self.parser.overflows
+        out["seq"] = self._seq
+        out["port"] = self.port
+        return out
+
+    # ------------------------------------------------------------------
+    # threads
+    # ------------------------------------------------------------------
+    def _open(self):
+        import serial
+        return serial.Serial(self.port, self.baudrate, timeout=self.read_timeout)
+
+    def _read_loop(self):
+        backoff = self.initial_backoff
+        while self._running:
+            try:
+                with self._open() as ser:
+                    self._set_stat("connected", True)
+                    self.parser.reset()
+                    backoff = self.initial_backoff
+                    while self._running:
+                        space = self.parser.writable(self.chunk_size)
+                        # ask for what is waiting (at least 1 byte, so the read
+                        # blocks up to read_timeout instead of spinning)
+                        want = min(len(space), max(1, ser.in_waiting))
+                        n = ser.readinto(space[:want])
+                        if n:
+                            with self._lock:
+                                self._stats["bytes"] += n
+                            for jpeg in self.parser.commit(n):
+                                self._publish(jpeg)
+            except Exception as e:
+                with self._lock:
+                    self._stats["last_error"] = str(e)
+                    self._stats["errors"] += 1
+                print(f"Serial reader error: {e}")
+            self._set_stat("connected", False)
+            if not self._running:
+                break
+            with self._lock:
+                self._stats["reconnects"] += 1
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _publish(self, jpeg):
+        self._seq += 1
+        now = time.time()
+        item = (jpeg, self._seq, now)
+        with self._lock:
+            self._stats["frames"] += 1
+            self._arrivals.append(now)
+        while True:
+            try:
+                self.frames.put_nowait(item)
+                break
+            except queue.Full:
+                # keep the newest frames: drop the oldest queued one
+                try:
+                    self.frames.get_nowait()
+                    with self._lock:
+                        self._stats["dropped"] += 1
+                except queue.Empty:
+                    pass
+        if self._writer is not None:
+            self._writer.submit(self._save, jpeg, self._seq)
+
+    def _save(self, jpeg, seq):
+        try:
+            with open(self.save_dir / f"frame_{seq:06d}.jpg", "wb") as f:
+                f.write(jpeg)
+            with self._lock:
+                self._stats["saved"] += 1
+        except OSError as e:
+            print(f"Serial frame save error: {e}")
+
+    def _consume_loop(self):
+        while self._running:
+            item = self.get_frame(timeout=0.2)
+            if item is None:
+                continue
+            jpeg, seq, _ = item
+            try:
+                self.on_frame(jpeg, seq)
+                with self._lock:
+                    self._stats["processed"] += 1
+            except Exception as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                    self._stats["last_error"] = str(e)
+                print(f"Serial frame handler error: {e}")
+
+    def _set_stat(self, key, value):
+        with self._lock:
+            self._stats[key] = value
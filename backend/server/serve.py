@@ -0,0 +1,173 @@
+"""
+server/serve.py
+Production launch: N worker processes, each pinned to its own cores with
+one preloaded model and a bounded number of intra-op threads.
+
+The parent binds the listening socket and supervises the workers (a worker
+that dies is restarted); the kernel hands each connection to whichever
+worker accepts it first. Each worker:
+    - is pinned (sched_setaffinity) to a disjoint slice of the usable cores
+    - caps BLAS / OpenMP / torch / OpenCV threads to its slice
+      (INTRA_OP_THREADS, default: cores per worker), so N workers do not
+      oversubscribe the CPU
+    - loads and warms the model in its startup hook (app.py)
+    - also listens on a private loopback port (WORKER_URL), so the other
+      workers can reach it when it is the leader
+With more than one worker, shared state (latest result, live stats, upload
+jobs, the leader lease) goes to a SQLite file,
+STATE_STORE=sqlite:///<repo>/cache/state.db by default. The leader alone runs
+the camera pipelines, serial port and telemetry; the other workers forward
+those routes to it (see app.py, server/relay.py).
+
+Usage:
+    python -m backend.server.serve --workers 4                 # or WORKERS=4
+    python -m backend.server.serve --workers 2 --threads 2 --port 8000
+For development use `uvicorn backend.server.app:app --reload`.
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS",
+                   "VECLIB_MAXIMUM_THREADS", "OPENVINO_NUM_THREADS")
+RESTART_DELAY_S = 1.0
+
+
+def usable_cores():
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:   # not Linux
+        return list(range(os.cpu_count() or 1))
+
+
+def plan_cores(workers, cores=None):
+    """
+    Split the usable cores into `workers` disjoint, contiguous slices
+    (workers share cores round-robin when there are more workers than cores).
+    """
+    cores = cores or usable_cores()
+    if workers >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(workers)]
+    per = len(cores) // workers
+    return [cores[i * per:(i + 1) * per] for i in range(workers)]
+
+
+def limit_threads(threads):
+    """
+    Cap native thread pools. The env vars must be set before torch / numpy
+    BLAS / onnxruntime initialize, so this runs first in each worker.
+    """
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    os.environ.setdefault("CPU_WORKERS", str(max(2, 2 * threads)))   # server/executor.py pool
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        pass
+
+
+def run_worker(index, cores, threads, sock, host, port, log_level):
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    limit_threads(threads)
+    # app.py reads these at import, which uvicorn does inside run()
+    private = bind("127.0.0.1", 0)
+    os.environ["WORKER_INDEX"] = str(index)
+    os.environ["WORKER_URL"] = f"http://127.0.0.1:{private.getsockname()[1]}"
+    import uvicorn
+    config = uvicorn.Config("backend.server.app:app", host=host, port=port, log_level=log_level)
+    print(f"[serve] worker {index} pid {os.getpid()} cores {cores} threads {threads} at {os.environ['WORKER_URL']}")
+    uvicorn.Server(config).run(sockets=[sock, private])
+
+
+def bind(host, port):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # accepted connections inherit it; without it small responses wait ~40 ms for delayed ACKs
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve(workers=1, threads=None, host="0.0.0.0", port=8000, pin=True, store=None, log_level="info"):
+    """
+    Start and supervise the workers until SIGINT / SIGTERM.
+    """
+    plan = plan_cores(workers)
+    threads = threads or max(1, len(plan[0]))
+    if store:
+        os.environ["STATE_STORE"] = store
+    elif workers > 1:
+        os.environ.setdefault("STATE_STORE", f"sqlite:///{BASE_DIR / 'cache' / 'state.db'}")
+    os.environ["WORKERS"] = str(workers)
+    print(f"[serve] {workers} worker(s) on {host}:{port}, {threads} thread(s) each, "
+          f"state store {os.environ.get('STATE_STORE', 'memory')}")
+
+    sock = bind(host, port)
+    ctx = multiprocessing.get_context("spawn")
+    procs = {}
+    stopping = False
+
+    def start(i):
+        p = ctx.Process(target=run_worker, name=f"worker-{i}",
+                        args=(i, plan[i] if pin else None, threads, sock, host, port, log_level))
+        p.start()
+        procs[i] = p
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for i in range(workers):
+        start(i)
+    try:
+        while not stopping:
+            time.sleep(0.5)
+            for i, p in list(procs.items()):
+                if not p.is_alive() and not stopping:
+                    print(f"[serve] worker {i} exited with {p.exitcode}, restarting")
+                    time.sleep(RESTART_DELAY_S)
+                    start(i)
+    finally:
+        for p in procs.values():
+            if p.is_alive():
+                p.terminate()
+        for p in procs.values():
+            p.join(timeout=10)
+        sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", "1")))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("INTRA_OP_THREADS", "0")) or None,
+                        help="intra-op threads per worker (default: cores per worker)")
+    parser.add_argument("--host", type=str, default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--no-pin", action="store_true", help="do not pin workers to cores")
+    parser.add_argument("--store", type=str, default=None, help="memory or sqlite:///path (STATE_STORE)")
+    parser.add_argument("--log-level", type=str, default="info")
+    args = parser.parse_args(argv)
+    serve(args.workers, args.threads, args.host, args.port, not args.no_pin, args.store, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+server/shared_state.py
+State shared between server worker processes.
+
+With several workers (backend/server/serve.py) every process has its own
+memory, so the live state, upload jobs and "who runs the singletons"
+(telemetry, serial port, camera pipelines) need a store all of them see:
+
+    SQLiteStore   one WAL-mode SQLite file on local disk (default for
+                  WORKERS > 1; STATE_STORE=sqlite:///path/to/state.db)
+    MemoryStore   the same API in process memory: single worker, tests
+
+Both provide
+    put(topic, values)          merge changed keys under one new global
+                                version -> (version or None, changed dict)
+    changes_since(version)      [(topic, key, version, value)] in version order
+    acquire_lease(name, owner, ttl) / release_lease(name, owner)
+    put_record(kind, id, value) / get_record(kind, id) / list_records(kind)
+    prune_records(kind, keep)
+
+StateHub (state_hub.py) syncs its topics through put/changes_since, so
+versions, ETags and SSE ids agree across workers. Lease keeps renewing a
+named lease on a background thread and calls back when it is won or lost.
+
+Example usage:
+    store = open_store("sqlite:///cache/state.db")
+    hub = StateHub(store=store).start()
+    leader = Lease(store, "leader", on_acquire=start_singletons, on_release=stop_singletons).start()
+    if leader.held: telemetry.record(stats)
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS state (topic TEXT, key TEXT, version INTEGER, value TEXT, PRIMARY KEY (topic, key));
+CREATE INDEX IF NOT EXISTS state_version ON state (version);
+CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires REAL);
+CREATE TABLE IF NOT EXISTS records (kind TEXT, id TEXT, updated REAL, value TEXT, PRIMARY KEY (kind, id));
+CREATE INDEX IF NOT EXISTS records_updated ON records (kind, updated);
+"""
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+class MemoryStore:
+    shared = False
+
+    def __init__(self):
+        self.instance_id = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._version = 0
+        self._state = {}     # (topic, key) -> (version, value)
+        self._leases = {}    # name -> (owner, expires)
+        self._records = {}   # (kind, id) -> (updated, value)
+
+    def put(self, topic, values):
+        with self._lock:
+            changed = {k: v for k, v in values.items()
+                       if (topic, k) not in self._state or self._state[(topic, k)][1] != v}
+            if not changed:
+                return None, {}
+            self._version += 1
+            for k, v in changed.items():
+                self._state[(topic, k)] = (self._version, v)
+            return self._version, changed
+
+    def changes_since(self, version):
+        with self._lock:
+            rows = [(t, k, ver, v) for (t, k), (ver, v) in self._state.items() if ver > version]
+        return sorted(rows, key=lambda r: r[2])
+
+    def acquire_lease(self, name, owner, ttl):
+        now = time.time()
+        with self._lock:
+            current = self._leases.get(name)
+            if current is None or current[0] == owner or current[1] < now:
+                self._leases[name] = (owner, now + ttl)
+                return True
+            return False
+
+    def release_lease(self, name, owner):
+        with self._lock:
+            if self._leases.get(name, (None,))[0] == owner:
+                del self._leases[name]
+
+    def put_record(self, kind, record_id, value):
+        with self._lock:
+            self._records[(kind, record_id)] = (time.time(), value)
+
+    def get_record(self, kind, record_id):
+        with self._lock:
+            entry = self._records.get((kind, record_id))
+        return None if entry is None else entry[1]
+
+    def list_records(self, kind):
+        with self._lock:
+            entries = sorted(((u, v) for (k, _), (u, v) in self._records.items() if k == kind), key=lambda e: e[0])
+        return [v for _, v in entries]
+
+    def prune_records(self, kind, keep):
+        with self._lock:
+            entries = sorted((u, key) for key, (u, _) in self._records.items() if key[0] == kind)
+            for _, key in entries[:max(0, len(entries) - keep)]:
+                del self._records[key]
+
+    def close(self):
+        pass
+
+
+class SQLiteStore:
+    """
+    One connection per thread; writes run in BEGIN IMMEDIATE transactions,
+    so version numbers are handed out in commit order across processes.
+    """
+    shared = True
+
+    def __init__(self, path, timeout=5.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._db().executescript(SCHEMA)
+        with self._transaction() as db:
+            db.execute("INSERT OR IGNORE INTO meta VALUES ('version', '0'), ('instance_id', ?)",
+                       (uuid.uuid4().hex[:8],))
+            self.instance_id = db.execute("SELECT value FROM meta WHERE name = 'instance_id'").fetchone()[0]
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def put(self, topic, values):
+        encoded = {k: _dumps(v) for k, v in values.items()}
+        with self._transaction() as db:
+            current = dict(db.execute("SELECT key, value FROM state WHERE topic = ?", (topic,)))
+            changed = {k: values[k] for k, v in encoded.items() if current.get(k) != v}
+            if not changed:
+                return None, {}
+            version = int(db.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0]) + 1
+            db.execute("UPDATE meta SET value = ? WHERE name = 'version'", (str(version),))
+            db.executemany("INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?)",
+                           [(topic, k, version, encoded[k]) for k in changed])
+        return version, changed
+
+    def changes_since(self, version):
+        rows = self._db().execute(
+            "SELECT topic, key, version, value FROM state WHERE version > ? ORDER BY version", (version,))
+        return [(t, k, ver, json.loads(v)) for t, k, ver, v in rows]
+
+    def acquire_lease(self, name, owner, ttl):
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT owner, expires FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != owner and row[1] >= now:
+                return False
+            db.execute("INSERT OR REPLACE INTO leases VALUES (?, ?, ?)", (name, owner, now + ttl))
+            return True
+
+    def release_lease(self, name, owner):
+        with self._transaction() as db:
+            db.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def put_record(self, kind, record_id, value):
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)",
+                       (kind, record_id, time.time(), _dumps(value)))
+
+    def get_record(self, kind, record_id):
+        row = self._db().execute("SELECT value FROM records WHERE kind = ? AND id = ?", (kind, record_id)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def list_records(self, kind):
+        rows = self._db().execute("SELECT value FROM records WHERE kind = ? ORDER BY updated", (kind,))
+        return [json.loads(v) for v, in rows]
+
+    def prune_records(self, kind, keep):
+        with self._transaction() as db:
+            db.execute("DELETE FROM records WHERE kind = ? AND id NOT IN "
+                       "(SELECT id FROM records WHERE kind = ? ORDER BY updated DESC LIMIT ?)", (kind, kind, keep))
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+
+def open_store(url=None):
+    """
+    "memory" (default) or "sqlite:///path/to/state.db".
+    """
+    if not url or url == "memory":
+        return MemoryStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    raise ValueError(f"unsupported STATE_STORE {url!r}, expected memory or sqlite:///path")
+
+
+class Lease:
+    def __init__(self, store, name, ttl=10.0, owner=None, on_acquire=None, on_release=None):
+        self.store = store
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.on_acquire = on_acquire
+        self.on_release = on_release
+        self.held = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"lease-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self.held:
+            self._set(False)
+            self.store.release_lease(self.name, self.owner)
+
+    def _set(self, held):
+        if held == self.held:
+            return
+        self.held = held
+        callback = self.on_acquire if held else self.on_release
+        if callback is not None:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[lease {self.name}] callback failed: {e}")
+
+    def _run(self):
+        # renew at a third of the ttl, so one missed round does not lose the lease
+        while not self._stop.is_set():
+            try:
+                self._set(self.store.acquire_lease(self.name, self.owner, self.ttl))
+            except sqlite3.Error as e:
+                print(f"[lease {self.name}] renew failed: {e}")
+                self._set(False)
+            self._stop.wait(self.ttl / 3)
+
+    def stats(self):
+        return {"name": self.name, "owner": self.owner, "held": self.held, "ttl": self.ttl}
@@ -0,0 +1,315 @@
+"""
+server/state_hub.py
+Versioned live state shared between worker threads and async clients.
+
+Components publish flat dicts into named topics ("latest", "esp32", ...)
+from any thread. Every key remembers the global version at which its value
+last changed; publishing an identical value is a no-op, so a steady stream
+of unchanged stats wakes nobody. Readers ask for the changes since the
+version they last saw, which gives both delta pushes (/ws/stats, /events)
+and version ETags for plain GETs.
+
+Waiting is cheap per subscriber: all subscribers of the same topic set on
+one event loop share a single future, which a publisher resolves and
+replaces once per update through call_soon_threadsafe. An idle subscriber is
+one suspended coroutine; it costs nothing until its topics change or its
+heartbeat is due.
+
+With a shared store (server/shared_state.py) the hub is a per-process view
+of state kept in the store: update() commits there first, and a poller
+thread applies what other workers committed. Versions are handed out by the
+store, so they mean the same in every worker.
+
+Example usage:
+    hub = StateHub()                          # or StateHub(store=SQLiteStore(...)).start()
+    hub.update("esp32", {"objects": 3, "percent_plastic": 2.9})   # any thread
+    version, values = hub.snapshot("esp32")
+    async for version, changes in hub.watch(["esp32"], min_interval=0.5):
+        ...   # changes is None for a heartbeat
+"""
+
+import asyncio
+import copy
+import threading
+import time
+import uuid
+
+MEMO_SIZE = 256
+
+class _Signal:
+    """
+    Wake-up for the subscribers of one topic set on one event loop.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.subscribers = 0
+        self._pending = False
+
+    def notify(self):
+        # any thread; coalesces bursts into one callback on the loop
+        if self._pending:
+            return
+        self._pending = True
+        try:
+            self.loop.call_soon_threadsafe(self._fire)
+        except RuntimeError:
+            pass   # loop closed
+
+    def _fire(self):
+        self._pending = False
+        future, self.future = self.future, self.loop.create_future()
+        future.set_result(None)
+
+    async def wait(self, timeout):
+        # a shared future plus a timer per waiter; no task per waiter as with wait_for
+        future = self.future
+        if timeout <= 0:
+            return future.done()
+        waiter = self.loop.create_future()
+        wake = lambda _=None: waiter.done() or waiter.set_result(None)
+        timer = self.loop.call_later(timeout, wake)
+        future.add_done_callback(wake)
+        try:
+            await waiter
+        finally:
+            timer.cancel()
+            future.remove_done_callback(wake)
+        return future.done()
+
+
+class StateHub:
+    def __init__(self, store=None, poll_interval=0.05):
+        """
+        store: shared store to sync through (see shared_state.py); None keeps
+               the state in this process only.
+        poll_interval: seconds between polls for other workers' changes.
+        """
+        self.store = store
+        self.poll_interval = poll_interval
+        # ETags and SSE ids carry this so versions from another run (or store) never match
+        self.boot_id = store.instance_id if store is not None else uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._synced = 0
+        self._stop = threading.Event()
+        self._poller = None
+        self._version = 0
+        self._topics = {}          # topic -> {key: (version, value)}
+        self._topic_versions = {}  # topic -> version of its last change
+        self._signals = {}         # (loop, frozenset(topics) or None) -> _Signal
+        self._memo = {}            # (since, version, topics) -> changes
+        self._stats = {"updates": 0, "unchanged": 0}
+
+    # ------------------------------------------------------------------
+    # publishing
+    # ------------------------------------------------------------------
+    def update(self, topic, values):
+        """
+        Merge `values` into `topic`. Only keys whose value differs get a new
+        version. Returns the topic's version.
+        """
+        values = copy.deepcopy(values)
+        if self.store is not None:
+            version, changed = self.store.put(topic, values)
+            if not changed:
+                with self._lock:
+                    self._stats["unchanged"] += 1
+                    return self._topic_versions.get(topic, 0)
+            # pull everything up to our commit, other workers' earlier versions included
+            self.sync()
+            return version
+        with self._lock:
+            entries = self._topics.setdefault(topic, {})
+            changed = {k: v for k, v in values.items() if k not in entries or entries[k][1] != v}
+            if not changed:
+                self._stats["unchanged"] += 1
+                return self._topic_versions.get(topic, 0)
+            self._version += 1
+            for k, v in changed.items():
+                entries[k] = (self._version, v)
+            self._topic_versions[topic] = self._version
+            self._stats["updates"] += 1
+            signals = [s for (loop, topics), s in self._signals.items() if topics is None or topic in topics]
+        for s in signals:
+            s.notify()
+        return self._version
+
+    def setdefault(self, topic, values):
+        """
+        Publish only the keys `topic` does not have yet: initial values that
+        a (re)starting worker must not write over the shared state.
+        """
+        if self.store is not None:
+            self.sync()
+        with self._lock:
+            entries = self._topics.get(topic, {})
+            missing = {k: v for k, v in values.items() if k not in entries}
+        if missing:
+            self.update(topic, missing)
+        return self.snapshot(topic)[0]
+
+    # ------------------------------------------------------------------
+    # shared store
+    # ------------------------------------------------------------------
+    def sync(self):
+        """
+        Apply the store's changes since the last sync. Returns how many keys changed.
+        """
+        with self._sync_lock:
+            rows = self.store.changes_since(self._synced)
+            if not rows:
+                return 0
+            with self._lock:
+                touched = set()
+                for topic, key, version, value in rows:
+                    entries = self._topics.setdefault(topic, {})
+                    if key not in entries or entries[key][0] < version:
+                        entries[key] = (version, value)
+                        self._topic_versions[topic] = max(self._topic_versions.get(topic, 0), version)
+                        touched.add(topic)
+                self._version = max(self._version, rows[-1][2])
+                self._synced = rows[-1][2]
+                self._stats["updates"] += len(touched)
+                signals = [s for (loop, topics), s in self._signals.items()
+                           if topics is None or not touched.isdisjoint(topics)]
+        for s in signals:
+            s.notify()
+        return len(rows)
+
+    def start(self):
+        """
+        Start polling the shared store (no-op without one).
+        """
+        if self.store is None or self._poller is not None:
+            return self
+        self.sync()
+        self._stop.clear()
+        self._poller = threading.Thread(target=self._poll, name="state-hub-sync", daemon=True)
+        self._poller.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join(timeout=2)
+            self._poller = None
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"[state hub] sync failed: {e}")
+
+    # ------------------------------------------------------------------
+    # reading
+    # ------------------------------------------------------------------
+    def snapshot(self, topic):
+        """
+        (topic version, {key: value}) -- values are shared, do not mutate them.
+        """
+        with self._lock:
+            entries = self._topics.get(topic, {})
+            return self._topic_versions.get(topic, 0), {k: v for k, (_, v) in entries.items()}
+
+    def changes_since(self, since, topics=None):
+        """
+        (current version, {topic: {key: value}}) for keys changed after
+        version `since`; since=0 returns everything. The result is shared
+        between callers, do not mutate it.
+        """
+        topics = tuple(topics) if topics is not None else None
+        with self._lock:
+            # subscribers that were idle share `since`, so one fan-out computes each delta once
+            memo_key = (since, self._version, topics)
+            out = self._memo.get(memo_key)
+            if out is None:
+                out = {}
+                for topic in self._topics if topics is None else topics:
+                    if self._topic_versions.get(topic, 0) <= since:
+                        continue
+                    out[topic] = {k: v for k, (ver, v) in self._topics[topic].items() if ver > since}
+                if len(self._memo) >= MEMO_SIZE:
+                    self._memo.clear()
+                self._memo[memo_key] = out
+            return self._version, out
+
+    def version(self, *topics):
+        with self._lock:
+            if not topics:
+                return self._version
+            return max((self._topic_versions.get(t, 0) for t in topics), default=0)
+
+    def etag(self, *topics):
+        return f'"{self.boot_id}-{self.version(*topics)}"'
+
+    def parse_version(self, tag):
+        """
+        Version in an ETag / SSE id from this run, else 0.
+        """
+        boot, _, version = (tag or "").strip().strip('"').partition("-")
+        if boot != self.boot_id or not version.isdigit():
+            return 0
+        return int(version)
+
+    # ------------------------------------------------------------------
+    # subscribing
+    # ------------------------------------------------------------------
+    def _attach(self, topics):
+        key = (asyncio.get_running_loop(), frozenset(topics) if topics else None)
+        with self._lock:
+            signal = self._signals.get(key)
+            if signal is None:
+                signal = self._signals[key] = _Signal(key[0])
+            signal.subscribers += 1
+        return key, signal
+
+    def _detach(self, key, signal):
+        with self._lock:
+            signal.subscribers -= 1
+            if signal.subscribers <= 0 and self._signals.get(key) is signal:
+                del self._signals[key]
+
+    async def watch(self, topics=None, since=0, min_interval=0.0, heartbeat=15.0):
+        """
+        Async generator of (version, changes): the changes of `topics` (all
+        when None) since the last yield, at most once per `min_interval`
+        seconds. Updates arriving meanwhile are merged into the next yield.
+        Yields (version, None) after `heartbeat` seconds without output so
+        callers can keep the connection alive.
+        """
+        key, signal = self._attach(topics)
+        try:
+            last_out = last_sent = float("-inf")
+            while True:
+                version, changes = self.changes_since(since, topics)
+                now = time.monotonic()
+                if changes:
+                    due = last_sent + min_interval - now
+                    if due > 0:
+                        await asyncio.sleep(due)
+                        continue
+                    since = version
+                    last_out = last_sent = time.monotonic()
+                    yield version, changes
+                    continue
+                since = version
+                if last_out == float("-inf"):
+                    last_out = now
+                timeout = max(0.0, last_out + heartbeat - now)
+                if not await signal.wait(timeout):
+                    last_out = time.monotonic()
+                    yield version, None
+        finally:
+            self._detach(key, signal)
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["version"] = self._version
+            out["topics"] = dict(self._topic_versions)
+            out["subscribers"] = sum(s.subscribers for s in self._signals.values())
+        out["store"] = type(self.store).__name__ if self.store is not None else None
+        return out
@@ -0,0 +1,238 @@
+"""
+server/telemetry.py
+Buffered, rotating time-series store for live stats.
+
+Samples are appended to an in-memory buffer (no file I/O on the caller's
+thread) and a background thread flushes them in batches as fixed-width binary
+records, one file per day, rotated when a file exceeds `max_file_bytes`:
+
+    <dir>/2025-09-20.bin, <dir>/2025-09-20.1.bin, ...
+
+Every `csv_interval` seconds one sample is also appended to a CSV file
+(the original live_log.csv layout) for spreadsheets. History queries read
+the binary files with NumPy and downsample server-side.
+
+Example usage:
+    telemetry = TelemetryWriter("telemetry", csv_path="live_log.csv")
+    telemetry.start()
+    telemetry.record({"objects": 12, "grams_per_ml": 0.12, ...})
+    telemetry.query(t_from, t_to, step=60)   # one averaged point per minute
+"""
+
+import csv
+import datetime
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+RECORD_DTYPE = np.dtype([
+    ("ts", "<f8"),
+    ("objects", "<f4"),
+    ("grams_per_ml", "<f4"),
+    ("percent_plastic", "<f4"),
+    ("percent_water", "<f4"),
+    ("water_ml", "<f4"),
+])
+FIELDS = RECORD_DTYPE.names[1:]
+CSV_HEADER = ['timestamp', 'objects', 'grams_per_ml', 'percent_plastic', 'percent_water', 'water_ml']
+
+
+class TelemetryWriter:
+    def __init__(self, data_dir, csv_path=None, csv_interval=5.0, flush_interval=1.0, flush_size=1024,
+                 max_file_bytes=64 * 1024 * 1024, max_points=1000):
+        self.data_dir = Path(data_dir)
+        self.csv_path = Path(csv_path) if csv_path else None
+        self.csv_interval = csv_interval
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_file_bytes = max_file_bytes
+        self.max_points = max_points
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._buffer = []
+        self._last_csv_ts = 0.0
+        self._thread = None
+        self._running = False
+        self._stats = {"recorded": 0, "flushed": 0, "flushes": 0, "files": 0}
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # lifecycle
+    # ------------------------------------------------------------------
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    # ------------------------------------------------------------------
+    # writing
+    # ------------------------------------------------------------------
+    def record(self, stats, ts=None):
+        """
+        Buffer one sample (a dict with the FIELDS keys). Cheap: no I/O.
+        """
+        row = (time.time() if ts is None else ts,) + tuple(float(stats.get(k, 0.0) or 0.0) for k in FIELDS)
+        with self._lock:
+            self._buffer.append(row)
+            self._stats["recorded"] += 1
+            full = len(self._buffer) >= self.flush_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        records = np.array(rows, dtype=RECORD_DTYPE)
+        # split at day boundaries so each file holds a single day
+        days = [self._day(ts) for ts in (records["ts"][0], records["ts"][-1])]
+        if days[0] == days[1]:
+            self._append(days[0], records)
+        else:
+            labels = np.array([self._day(ts) for ts in records["ts"]])
+            for day in dict.fromkeys(labels):
+                self._append(day, records[labels == day])
+        self._write_csv(records)
+        with self._lock:
+            self._stats["flushed"] += len(records)
+            self._stats["flushes"] += 1
+        return len(records)
+
+    @staticmethod
+    def _day(ts):
+        return datetime.date.fromtimestamp(float(ts)).isoformat()
+
+    @staticmethod
+    def _part(path):
+        # <day>.bin, <day>.1.bin, ... -> (day, part number)
+        pieces = path.name.split(".")
+        return pieces[0], int(pieces[1]) if len(pieces) == 3 else 0
+
+    def _day_files(self, day):
+        return sorted(self.data_dir.glob(f"{day}*.bin"), key=self._part)
+
+    @staticmethod
+    def _day_bound(ts, default):
+        # timestamps outside what datetime can represent clamp to the first / last day
+        try:
+            return datetime.date.fromtimestamp(ts).isoformat()
+        except (OverflowError, ValueError, OSError):
+            return default.isoformat()
+
+    def _append(self, day, records):
+        files = self._day_files(day)
+        path = files[-1] if files else self.data_dir / f"{day}.bin"
+        if path.exists() and path.stat().st_size + records.nbytes > self.max_file_bytes:
+            path = self.data_dir / f"{day}.{len(files)}.bin"
+        if not path.exists():
+            with self._lock:
+                self._stats["files"] += 1
+        with open(path, "ab") as f:
+            f.write(records.tobytes())
+
+    def _write_csv(self, records):
+        if not self.csv_path:
+            return
+        rows = []
+        for rec in records:
+            if rec["ts"] - self._last_csv_ts >= self.csv_interval:
+                self._last_csv_ts = rec["ts"]
+                rows.append([datetime.datetime.fromtimestamp(rec["ts"]).strftime("%Y-%m-%d %H:%M:%S")]
+                            + [_fmt(k, rec[k]) for k in FIELDS])
+        if not rows:
+            return
+        new_file = not self.csv_path.exists()
+        with open(self.csv_path, mode='a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(CSV_HEADER)
+            writer.writerows(rows)
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(timeout=self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Telemetry flush error: {e}")
+
+    # ------------------------------------------------------------------
+    # reading
+    # ------------------------------------------------------------------
+    def load(self, t_from, t_to):
+        """
+        Return every record with t_from <= ts < t_to (flushed and buffered).
+        """
+        parts = []
+        first = self._day_bound(t_from, datetime.date.min)
+        last = self._day_bound(t_to, datetime.date.max)
+        # one directory listing, filtered by the day in the file name (ISO dates sort as strings)
+        files = sorted((p for p in self.data_dir.glob("*.bin") if first <= self._part(p)[0] <= last), key=self._part)
+        for path in files:
+            data = np.fromfile(path, dtype=RECORD_DTYPE)
+            parts.append(data[(data["ts"] >= t_from) & (data["ts"] < t_to)])
+        with self._lock:
+            pending = list(self._buffer)
+        if pending:
+            data = np.array(pending, dtype=RECORD_DTYPE)
+            parts.append(data[(data["ts"] >= t_from) & (data["ts"] < t_to)])
+        if not parts:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        out = np.concatenate(parts)
+        return out[np.argsort(out["ts"], kind="stable")]
+
+    def query(self, t_from, t_to, step=None):
+        """
+        Downsample [t_from, t_to) into buckets of `step` seconds (chosen so at
+        most max_points buckets are returned when omitted). Each point holds
+        the bucket mean of every field, the max object count and the number
+        of samples.
+        """
+        data = self.load(t_from, t_to)
+        span = max(t_to - t_from, 1e-9)
+        if not step or step <= 0:
+            step = span / self.max_points
+        step = max(step, span / self.max_points)
+        if len(data) == 0:
+            return {"from": t_from, "to": t_to, "step": step, "points": []}
+
+        bucket = ((data["ts"] - t_from) // step).astype(np.int64)
+        ids, inverse, counts = np.unique(bucket, return_inverse=True, return_counts=True)
+        points = {"ts": (t_from + ids * step).round(3).tolist(), "samples": counts.tolist()}
+        for k in FIELDS:
+            points[k] = (np.bincount(inverse, weights=data[k]) / counts).round(3).tolist()
+        objects_max = np.full(len(ids), -np.inf)
+        np.maximum.at(objects_max, inverse, data["objects"])
+        points["objects_max"] = objects_max.tolist()
+        rows = [dict(zip(points, vals)) for vals in zip(*points.values())]
+        return {"from": t_from, "to": t_to, "step": step, "points": rows}
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["buffered"] = len(self._buffer)
+        out["running"] = self._running
+        return out
+
+
+def _fmt(field, value):
+    value = float(value)
+    if field == "objects" or field == "water_ml":
+        return int(value)
+    return round(value, 3)